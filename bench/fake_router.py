@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+"""
+fake_router.py
+- A local stand-in for a RouterOS router: speaks the API protocol (login, print with
+  queries, .proplist, .tag and count-only, add/set/remove, certificate signing) on a local port.
+- Serves a synthetic configuration of configurable size: N firewall rules, N static routes
+  among M dynamic ones, N WireGuard peers, N interfaces, ...
+- Optional per-reply latency, and counters for sentences, records and bytes on the wire.
+  Like RouterOS, tagged commands run concurrently: their replies wait out the latency
+  in parallel, while untagged ones are answered one after the other.
+
+Standalone:
+    python3 fake_router.py --port 8728 --size firewall=5000 --size routes=2000 --latency 0.02
+"""
+import argparse
+import socketserver
+import sys
+import threading
+import time
+
+from librouteros.protocol import decode_length, determine_length, encode_sentence
+
+# Sizes of the synthetic configuration (override with --size name=N)
+DEFAULT_SIZES = {
+    "firewall": 200,  # /ip/firewall/filter rules (plus a few dynamic ones)
+    "nat": 20,
+    "routes": 200,  # static routes
+    "dynamic_routes": 2000,  # dynamic (e.g. BGP) routes the importers must not fetch
+    "routing_tables": 4,
+    "wg_peers": 100,
+    "interfaces": 48,  # ethernet ports
+    "vlans": 20,
+    "bridges": 2,
+    "bridge_vlans": 200,  # /interface/bridge/vlan entries
+    "address_list": 500,  # firewall address-list entries (plus as many dynamic ones, e.g. timeouts)
+    "mangle": 20,
+    "raw": 20,
+}
+
+
+def synthetic_config(sizes=None):
+    """RouterOS path -> list of entries (all values as the router sends them: strings)."""
+    n = dict(DEFAULT_SIZES, **(sizes or {}))
+    data = {}
+    ids = iter(range(1, 10**9))
+
+    def rid():
+        return f"*{next(ids):X}"
+
+    tables = [f"table{t}" for t in range(n["routing_tables"])]
+    data["/routing/table"] = [{".id": "*0", "name": "main", "fib": "", "dynamic": "true"}] + [
+        {".id": rid(), "name": t, "fib": "", "dynamic": "false"} for t in tables
+    ]
+    data["/routing/rule"] = [
+        {".id": rid(), "action": "lookup", "src-address": f"10.{i}.0.0/16", "table": t, "disabled": "false",
+         "comment": f"rule {t}"}
+        for i, t in enumerate(tables)
+    ]
+    routes = []
+    for i in range(n["routes"]):
+        routes.append({".id": rid(), "dst-address": f"10.{i // 256 % 256}.{i % 256}.0/24",
+                       "gateway": f"192.168.{i % 4}.1", "distance": "1",
+                       "routing-table": tables[i % len(tables)] if tables and i % 3 == 0 else "main",
+                       "dynamic": "false", "disabled": "false", "comment": f"static {i}"})
+    for i in range(n["dynamic_routes"]):
+        routes.append({".id": rid(), "dst-address": f"{1 + i // 65536 % 223}.{i // 256 % 256}.{i % 256}.0/24",
+                       "gateway": "172.16.0.1", "distance": "20", "routing-table": "main",
+                       "dynamic": "true", "active": "true", "bgp": "true"})
+    data["/ip/route"] = routes
+
+    chains = ["input", "forward", "output"]
+    data["/ip/firewall/filter"] = [
+        {".id": rid(), "chain": chains[i % 3], "action": "accept" if i % 4 else "drop", "protocol": "tcp",
+         "src-address": f"10.{i // 256 % 256}.{i % 256}.0/24", "dst-port": str(1000 + i % 60000),
+         "log": "false", "comment": f"rule {i}", "dynamic": "false", "bytes": str(i * 1500), "packets": str(i)}
+        for i in range(n["firewall"])
+    ] + [{".id": rid(), "chain": "forward", "action": "passthrough", "dynamic": "true", "comment": "dynamic"}]
+    data["/ip/firewall/nat"] = [
+        {".id": rid(), "chain": "srcnat" if i % 2 else "dstnat", "action": "masquerade" if i % 2 else "dst-nat",
+         "out-interface": "ether1", "to-addresses": f"192.168.88.{i % 250 + 2}", "comment": f"nat {i}"}
+        for i in range(n["nat"])
+    ]
+    data["/ip/firewall/address-list"] = [
+        {".id": rid(), "list": f"list{i % 5}", "address": f"100.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}",
+         "dynamic": "false", "disabled": "false", "comment": ""}
+        for i in range(n["address_list"])
+    ] + [
+        {".id": rid(), "list": "blocked", "address": f"198.18.{i // 256 % 256}.{i % 256}", "timeout": "1d",
+         "dynamic": "true", "disabled": "false"}
+        for i in range(n["address_list"])
+    ]
+    data["/ip/firewall/mangle"] = [
+        {".id": rid(), "chain": "prerouting", "action": "mark-routing", "src-address-list": f"list{i % 5}",
+         "new-routing-mark": tables[i % len(tables)] if tables else "main", "passthrough": "false",
+         "dynamic": "false", "comment": f"mangle {i}"}
+        for i in range(n["mangle"])
+    ]
+    data["/ip/firewall/raw"] = [
+        {".id": rid(), "chain": "prerouting", "action": "drop", "src-address-list": f"list{i % 5}",
+         "dynamic": "false", "comment": f"raw {i}"}
+        for i in range(n["raw"])
+    ]
+
+    ethers = [{".id": rid(), "name": f"ether{i + 1}", "type": "ether", "mtu": "1500",
+               "mac-address": f"02:00:00:00:{i // 256 % 256:02X}:{i % 256:02X}", "disabled": "false"}
+              for i in range(n["interfaces"])]
+    bridges = [{".id": rid(), "name": f"bridge{i + 1}", "type": "bridge", "mtu": "auto", "protocol-mode": "rstp",
+                "vlan-filtering": "true", "disabled": "false"} for i in range(n["bridges"])]
+    vlans = [{".id": rid(), "name": f"vlan{100 + i}", "type": "vlan", "vlan-id": str(100 + i),
+              "interface": "bridge1" if bridges else "ether1", "mtu": "1500", "disabled": "false"}
+             for i in range(n["vlans"])]
+    wgs = [{".id": rid(), "name": f"wg{i}", "type": "wg", "listen-port": str(13231 + i), "mtu": "1420",
+            "private-key": f"key{i}=", "disabled": "false"} for i in range(max(1, n["wg_peers"] // 100))]
+    data["/interface/ethernet"] = ethers
+    data["/interface/bridge"] = bridges
+    data["/interface/vlan"] = vlans
+    data["/interface/wireguard"] = wgs
+    data["/interface"] = ethers + bridges + vlans + wgs + [
+        {".id": rid(), "name": "pppoe-dyn", "type": "pppoe-in", "dynamic": "true"}
+    ]
+    data["/interface/bridge/port"] = [
+        {".id": rid(), "interface": e["name"], "bridge": bridges[i % len(bridges)]["name"], "disabled": "false",
+         "path-cost": "10", "priority": "0x80", "pvid": str(100 + i % max(1, n["vlans"]))}
+        for i, e in enumerate(ethers[1:])
+    ] if bridges else []
+    # One entry per VLAN ID, in a few distinct port sets (trunks, plus an access port every 10th)
+    data["/interface/bridge/vlan"] = [
+        {".id": rid(), "bridge": "bridge1", "vlan-ids": str(100 + i),
+         "tagged": "bridge1,ether2" + (",ether3" if i // 50 % 2 else ""),
+         "untagged": f"ether{4 + i // 10 % 4}" if i % 10 == 0 else "", "dynamic": "false"}
+        for i in range(n["bridge_vlans"])
+    ] + [
+        {".id": rid(), "bridge": "bridge1", "vlan-ids": "1", "current-untagged": "bridge1", "dynamic": "true"}
+    ] if bridges else []
+    data["/interface/wireguard/peers"] = [
+        {".id": rid(), "interface": wgs[i % len(wgs)]["name"], "public-key": f"peer{i}=",
+         "allowed-address": f"10.200.{i // 256 % 256}.{i % 256}/32", "persistent-keepalive": "25s",
+         "comment": f"peer {i}"}
+        for i in range(n["wg_peers"])
+    ]
+    data["/interface/list"] = [{".id": rid(), "name": "LAN"}, {".id": rid(), "name": "WAN"}]
+    data["/interface/list/member"] = [
+        {".id": rid(), "list": "LAN" if i else "WAN", "interface": e["name"], "dynamic": "false"}
+        for i, e in enumerate(ethers)
+    ]
+    for path in ("/interface/bonding", "/interface/macvlan", "/interface/pppoe-client",
+                 "/interface/pppoe-server/server", "/interface/sstp-client",
+                 "/ip/ipsec/proposal", "/ip/ipsec/peer", "/ip/ipsec/policy", "/ip/ipsec/identity",
+                 "/routing/ospf/interface-template", "/routing/ospf/neighbor", "/certificate"):
+        data[path] = []
+    data["/interface/sstp-server/server"] = [{"enabled": "false", "port": "443", "authentication": "mschap2"}]
+    data["/ip/ipsec/profile"] = [{".id": rid(), "name": "default", "dh-group": "modp2048,modp1024"}]
+    data["/routing/ospf/instance"] = [{".id": rid(), "name": "default-v2", "router-id": "10.255.0.1"}]
+    data["/routing/ospf/area"] = [{".id": rid(), "name": "backbone", "area-id": "0.0.0.0",
+                                   "instance": "default-v2"}]
+    data["/ip/dhcp-client"] = [{".id": rid(), "interface": "ether1", "add-default-route": "yes",
+                                "use-peer-dns": "yes"}]
+    data["/ppp/profile"] = [{".id": "*0", "name": "default"}, {".id": "*FFFFFFFE", "name": "default-encryption"}]
+    data["/ip/pool"] = [{".id": rid(), "name": "dhcp", "ranges": "192.168.88.10-192.168.88.254"}]
+    data["/tool/romon"] = [{"enabled": "false", "id": "00:00:00:00:00:00"}]
+    data["/system/history"] = [{".id": "*1", "action": "route added", "by": "admin", "policy": "write"}]
+    data["/system/package"] = [{".id": "*1", "name": "routeros", "version": "7.15.3", "disabled": "false"}]
+    data["/system/identity"] = [{"name": "fake-router"}]
+    data["/ip/service"] = [
+        {".id": rid(), "name": name, "port": port, "address": "", "disabled": "false"}
+        for name, port in (("telnet", "23"), ("ftp", "21"), ("www", "80"), ("ssh", "22"),
+                           ("www-ssl", "443"), ("api", "8728"), ("winbox", "8291"), ("api-ssl", "8729"))
+    ]
+    return data
+
+
+def read_sentence(stream):
+    """One API sentence as a list of words, or None at EOF."""
+    words = []
+    while True:
+        first = stream.read(1)
+        if not first:
+            return None
+        if first == b"\x00":
+            return words
+        raw = first + stream.read(determine_length(first))
+        words.append(stream.read(decode_length(raw)).decode("utf-8", errors="replace"))
+
+
+def matches(entry, queries):
+    """Evaluate API query words (?name=value, ?-name, ?name, ?#|, ?#&, ?#!) against one entry."""
+    if not queries:
+        return True
+    stack = []
+    for q in queries:
+        if q == "?#|":
+            b, a = stack.pop(), stack.pop()
+            stack.append(a or b)
+        elif q == "?#&":
+            b, a = stack.pop(), stack.pop()
+            stack.append(a and b)
+        elif q == "?#!":
+            stack.append(not stack.pop())
+        elif q.startswith("?-"):
+            stack.append(q[2:] not in entry)
+        elif "=" in q[1:].lstrip("="):
+            key, value = q[1:].lstrip("=").split("=", 1)
+            stack.append(entry.get(key) == value)
+        else:
+            stack.append(q[1:] in entry)
+    return all(stack)
+
+
+class FakeRouter:
+    """A threaded fake RouterOS API server around a path -> entries dict."""
+
+    def __init__(self, data=None, host="127.0.0.1", port=0, latency=0.0, user=None, password=None, sign_seconds=1.0):
+        self.data = synthetic_config() if data is None else data
+        self.latency = latency
+        self.sign_seconds = sign_seconds
+        self.user = user
+        self.password = password
+        self.lock = threading.Lock()
+        self.next_id = 0x100000
+        self.reset_counters()
+        router = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                router.serve_connection(self.rfile, self.wfile)
+
+        class Server(socketserver.ThreadingMixIn, socketserver.TCPServer):
+            allow_reuse_address = True
+            daemon_threads = True
+
+        self.server = Server((host, port), Handler)
+        self.host, self.port = self.server.server_address[:2]
+        self.thread = None
+
+    def reset_counters(self):
+        self.counters = {"connections": 0, "commands": 0, "records": 0, "bytes_in": 0, "bytes_out": 0}
+
+    def count(self, **amounts):
+        with self.lock:
+            for key, value in amounts.items():
+                self.counters[key] += value
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # ---- protocol ----
+    def serve_connection(self, rfile, wfile):
+        self.count(connections=1)
+        write_lock = threading.Lock()
+
+        def reply_later(out):
+            time.sleep(self.latency)
+            with write_lock:
+                wfile.write(out)
+                wfile.flush()
+
+        while True:
+            words = read_sentence(rfile)
+            if words is None:
+                return
+            if not words:
+                continue
+            self.count(commands=1, bytes_in=sum(len(w.encode()) + 1 for w in words) + 1)
+            command, args = words[0], words[1:]
+            tag = [w for w in args if w.startswith(".tag=")][:1]
+            reply, records = self.execute(command, args)
+            out = b"".join(encode_sentence(reply_word, *attrs, *tag, encoding="utf-8")
+                           for reply_word, attrs in reply)
+            self.count(records=records, bytes_out=len(out))
+            if self.latency and tag:
+                threading.Thread(target=reply_later, args=(out,), daemon=True).start()
+                continue
+            if self.latency:
+                time.sleep(self.latency)
+            with write_lock:
+                wfile.write(out)
+            if command == "/quit":
+                return
+
+    def execute(self, command, args):
+        """Returns ([(reply word, attribute words)], number of !re records)."""
+        attrs = dict(w[1:].split("=", 1) for w in args if w.startswith("=") and "=" in w[1:])
+        done = [("!done", [])]
+        if command == "/login":
+            if self.user is not None and (attrs.get("name"), attrs.get("password")) != (self.user, self.password):
+                return [("!trap", ["=message=invalid user name or password (6)"]), ("!done", [])], 0
+            return done, 0
+        if command in ("/cancel", "/quit"):
+            return done, 0
+        path, _, verb = command.rpartition("/")
+        entries = self.data.get(path)
+        if entries is None:
+            return [("!trap", ["=message=no such command prefix"]), ("!done", [])], 0
+        if verb == "print":
+            props = attrs[".proplist"].split(",") if ".proplist" in attrs else None
+            queries = [w for w in args if w.startswith("?")]
+            with self.lock:
+                selected = [e for e in entries if matches(e, queries)]
+            if "count-only" in attrs:
+                return [("!done", [f"=ret={len(selected)}"])], 0
+            reply = [("!re", [f"={k}={v}" for k, v in e.items() if props is None or k in props]) for e in selected]
+            return reply + done, len(selected)
+        with self.lock:
+            if verb == "add":
+                self.next_id += 1
+                entry = {".id": f"*{self.next_id:X}", **attrs}
+                entries.append(entry)
+                return [("!done", [f"=ret={entry['.id']}"])], 0
+            targets = (attrs.pop(".id", None) or attrs.pop("numbers", "")).split(",")
+            found = [e for e in entries if e.get(".id") in targets or e.get("name") in targets]
+            if verb in ("set", "remove", "enable", "disable") and targets != [""] and not found:
+                return [("!trap", ["=message=no such item"]), ("!done", [])], 0
+            if verb == "set":
+                for e in found or entries[:1]:
+                    e.update(attrs)
+            elif verb == "remove":
+                for e in found:
+                    entries.remove(e)
+            elif verb in ("enable", "disable"):
+                for e in found:
+                    e["disabled"] = "true" if verb == "disable" else "false"
+            elif verb == "sign" and path == "/certificate":
+                # Key generation takes a while; the fingerprint appears once it is done
+                for e in found:
+                    threading.Timer(self.sign_seconds, self.signed, args=(e, attrs.get("ca"))).start()
+            else:
+                return [("!trap", [f"=message=unknown command {verb}"]), ("!done", [])], 0
+        return done, 0
+
+    def signed(self, entry, ca=None):
+        with self.lock:
+            entry["fingerprint"] = f"{abs(hash(entry['name'])):064x}"
+            entry["issuer"] = f"CN={ca or entry.get('common-name', '')}"
+
+
+def parse_sizes(items):
+    """['firewall=1000', 'routes=50'] -> {'firewall': 1000, 'routes': 50}."""
+    sizes = {}
+    for item in items or ():
+        name, _, value = item.partition("=")
+        if name not in DEFAULT_SIZES:
+            raise SystemExit(f"unknown size {name!r} (known: {', '.join(DEFAULT_SIZES)})")
+        sizes[name] = int(value)
+    return sizes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a synthetic RouterOS configuration over the API protocol.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8728)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds to wait before every reply")
+    parser.add_argument("--sign-seconds", type=float, default=1.0, help="seconds a /certificate/sign takes (default: %(default)s)")
+    parser.add_argument("--size", action="append", metavar="NAME=N",
+                        help=f"configuration size, repeatable (default: {DEFAULT_SIZES})")
+    args = parser.parse_args()
+
+    router = FakeRouter(synthetic_config(parse_sizes(args.size)), args.host, args.port, args.latency,
+                        sign_seconds=args.sign_seconds)
+    records = sum(len(v) for v in router.data.values())
+    print(f"🧪 Fake RouterOS API on {router.host}:{router.port} ({records} records, {args.latency}s latency)")
+    try:
+        router.server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\n📊 {router.counters}")
+        sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
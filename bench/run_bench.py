@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+run_bench.py
+- Starts a FakeRouter with a synthetic configuration and runs every importer against it
+  in fleet mode (one router), each in its own process.
+- Reports wall time, records/s, peak memory (max RSS of the importer process) and bytes
+  on the wire per importer; --json saves the results, --baseline compares against saved
+  results and fails on regressions.
+
+    python3 bench/run_bench.py --scale 10 --latency 0.005 --json bench.json
+    python3 bench/run_bench.py --scale 10 --baseline bench.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from fake_router import DEFAULT_SIZES, FakeRouter, parse_sizes, synthetic_config  # noqa: E402
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# ---- Importers: benchmark name -> script ----
+IMPORTERS = {
+    "routes": "routes/import_route.py",
+    "firewall": "firewall/import_firewall.py",
+    "vpn": "vpn/import.vpn.py",
+    "misc": "misc/import_misc.py",
+    "ospf": "ospf/import_ospf.py",
+    "bridge": "bridge/import_bridge.py",
+    "interfaces": "interfaces/import_interface.py",
+    "interface_list": "interface_list/import_list_member.py",
+    "all": "import_all.py",
+}
+# Relative slowdown that counts as a regression against --baseline
+THRESHOLD = 0.2
+COMPARED = ("wall_s", "peak_rss_kb", "bytes_out")
+
+
+def run_importer(router, script, work_dir, extra_args=()):
+    """Run one importer against the fake router; returns its measurements."""
+    inventory = os.path.join(work_dir, "inventory.csv")
+    with open(inventory, "w") as f:
+        f.write(f"host,port,name\n{router.host},{router.port},bench\n")
+    log = open(os.path.join(work_dir, "output.log"), "w")
+    router.reset_counters()
+    start = time.monotonic()
+    proc = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, script), "--inventory", inventory, "--out-dir",
+         os.path.join(work_dir, "out"), *extra_args],
+        cwd=work_dir,
+        stdout=log,
+        stderr=subprocess.STDOUT,
+    )
+    _, status, usage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    wall = time.monotonic() - start
+    log.close()
+    counters = dict(router.counters)
+    return {
+        "ok": proc.returncode == 0,
+        "wall_s": round(wall, 3),
+        "records": counters["records"],
+        "records_per_s": round(counters["records"] / wall, 1) if wall else 0,
+        "peak_rss_kb": usage.ru_maxrss,
+        "bytes_out": counters["bytes_out"],
+        "bytes_in": counters["bytes_in"],
+        "commands": counters["commands"],
+        "connections": counters["connections"],
+    }
+
+
+def compare(results, baseline, threshold=THRESHOLD):
+    """Lines describing every measurement that got worse than the baseline by more than threshold."""
+    regressions = []
+    for name, result in results.items():
+        old = baseline.get(name)
+        if not old:
+            continue
+        for key in COMPARED:
+            if old.get(key) and result[key] > old[key] * (1 + threshold):
+                regressions.append(f"{name}: {key} {old[key]} -> {result[key]} (+{result[key] / old[key] - 1:.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the importers against a local fake RouterOS router.")
+    parser.add_argument("--only", default=",".join(IMPORTERS), help="comma-separated importers (default: all)")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply every default size (default: 1)")
+    parser.add_argument("--size", action="append", metavar="NAME=N", help="override one size, repeatable")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds the fake router waits before every reply")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per importer; the fastest is reported")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--baseline", help="results of an earlier --json run to compare against")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD, help="allowed regression (default: 0.2)")
+    parser.add_argument("args", nargs=argparse.REMAINDER, help="extra arguments for every importer, after --")
+    args = parser.parse_args()
+
+    sizes = {name: int(value * args.scale) for name, value in DEFAULT_SIZES.items()}
+    sizes.update(parse_sizes(args.size))
+    extra = [a for a in args.args if a != "--"]
+    router = FakeRouter(synthetic_config(sizes), latency=args.latency).start()
+    print(f"🧪 Fake router on {router.host}:{router.port}, sizes {sizes}, latency {args.latency}s")
+
+    results = {}
+    print(f"{'importer':<16}{'wall s':>9}{'records':>10}{'rec/s':>11}{'peak MB':>9}{'bytes out':>12}{'cmds':>6}")
+    for name in args.only.split(","):
+        runs = []
+        for _ in range(max(1, args.repeat)):
+            with tempfile.TemporaryDirectory(prefix=f"bench-{name}-") as work_dir:
+                runs.append(run_importer(router, IMPORTERS[name], work_dir, extra))
+        result = min(runs, key=lambda r: r["wall_s"])
+        results[name] = result
+        status = "" if result["ok"] else "  ❌ failed"
+        print(f"{name:<16}{result['wall_s']:>9.2f}{result['records']:>10}{result['records_per_s']:>11.0f}"
+              f"{result['peak_rss_kb'] / 1024:>9.1f}{result['bytes_out']:>12}{result['commands']:>6}{status}")
+    router.stop()
+
+    report = {"sizes": sizes, "latency": args.latency, "results": results}
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Results written to {args.json}")
+
+    failed = [name for name, r in results.items() if not r["ok"]]
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f)["results"], args.threshold)
+        for line in regressions:
+            print(f"🐢 {line}")
+        if not regressions:
+            print(f"✅ No regressions against {args.baseline}")
+    sys.exit(1 if failed or regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
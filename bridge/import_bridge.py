@@ -1,99 +1,252 @@
 #!/usr/bin/env python3
 from librouteros import connect
+from functools import partial
+import argparse
+import hashlib
+import os
 import socket
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.aioclient import add_backend_arguments, configure_backend  # noqa: E402
+from common.drift import add_drift_arguments, configure_drift  # noqa: E402
+from common.fleet import add_fleet_arguments, load_inventory, run_fleet  # noqa: E402
+from common.hcl import Template, sanitize  # noqa: E402
+from common.metrics import add_metrics_arguments, configure_metrics, stage, write_report  # noqa: E402
+from common.profiling import add_profile_arguments, configure_profile, profiled  # noqa: E402
+from common.query import iter_select  # noqa: E402
+from common.refs import INTERFACE, SymbolTable  # noqa: E402
+from common.session import RouterSession  # noqa: E402
+from common.snapshot import add_snapshot_arguments, configure_snapshot, with_snapshots  # noqa: E402
+from common.tfimport import add_import_arguments, configure_imports  # noqa: E402
+from common.writer import TfWriter, add_output_arguments, configure_output  # noqa: E402
 
 # ====== MikroTik API Config ======
 HOST = "192.168.62.1"
 USER = "terraform"
 PASS = "terraform"
+PORT = 8728
+
+# ====== Output Files ======
+BRIDGES_FILE = "bridges.tf"
+PORTS_FILE = "bridge_ports.tf"
+VLANS_FILE = "bridge_vlans.tf"
+IMPORT_TF_FILE = "import_all.tf"
+IMPORT_FILE = "import_all.sh"
+# RouterOS script removing the bridge VLAN entries merged into another entry's resource
+MERGE_FILE = "bridge_vlan_merge.rsc"
+
+# ====== Properties requested from the router ======
+BRIDGE_PROPS = [".id", "name", "mtu", "protocol-mode", "disabled", "comment"]
+PORT_PROPS = [".id", "interface", "bridge", "path-cost", "priority", "disabled", "comment"]
+VLAN_PROPS = [".id", "bridge", "vlan-ids", "tagged", "untagged", "disabled", "comment"]
+
+# ====== Blocks (numbers and booleans unquoted) ======
+BRIDGE = Template("routeros_interface_bridge", ["name", "mtu", "protocol-mode", "disabled", "comment"],
+                  typed=("mtu", "disabled"), defaults={"disabled": False})
+PORT = Template("routeros_interface_bridge_port",
+                ["interface", "bridge", "disabled", "path-cost", "priority", "comment"],
+                typed=("disabled", "path-cost", "priority"), defaults={"disabled": False})
+VLAN = Template("routeros_interface_bridge_vlan", ["bridge", "vlan-ids", "tagged", "untagged", "disabled", "comment"],
+                typed=("disabled",), defaults={"disabled": False})
+# Port attributes naming a bridge or interface exported here become references
+PORT_LINKS = {"bridge": INTERFACE, "interface": INTERFACE}
+VLAN_LINKS = {"bridge": INTERFACE}
+
 
 # ====== Connect with fallback ======
-try:
-    api = connect(username=USER, password=PASS, host=HOST, port=8728, timeout=10)
-    print("✅ Connected via API (8728)")
-except (socket.timeout, OSError):
-    print("⚠️ Port 8728 failed, trying API-SSL (8729)...")
-    api = connect(username=USER, password=PASS, host=HOST, port=8729, plaintext_login=True, timeout=10)
-    print("✅ Connected via API-SSL (8729)")
+def connect_mikrotik(host=HOST, user=USER, password=PASS, port=PORT):
+    try:
+        api = connect(username=user, password=password, host=host, port=port, timeout=10)
+        print(f"✅ Connected via API ({port})")
+    except (socket.timeout, OSError):
+        print(f"⚠️ Port {port} failed, trying API-SSL (8729)...")
+        api = connect(username=user, password=password, host=host, port=8729, plaintext_login=True, timeout=10)
+        print("✅ Connected via API-SSL (8729)")
+    return api
 
 def safe_name(name: str) -> str:
     """Make Terraform-safe resource names."""
     return name.replace("-", "_").replace(" ", "_").replace(".", "_")
 
-# ====== Fetch Bridges ======
-bridges = list(api(cmd="/interface/bridge/print"))
-print(f"🔍 Found {len(bridges)} bridges")
-
-# ====== Fetch Bridge Ports ======
-ports = list(api(cmd="/interface/bridge/port/print"))
-print(f"🔍 Found {len(ports)} bridge ports")
-
-# ====== Create Output Files ======
-tf_bridges = open("bridges.tf", "w")
-tf_ports = open("bridge_ports.tf", "w")
-imp_all = open("import_all.sh", "w")
-
-# ====== Process Bridges ======
-for b in bridges:
-    name = b.get("name")
-    if not name:
-        continue
-    rid = b.get(".id")
-    mtu = b.get("mtu")
-    protocol_mode = b.get("protocol-mode")
-    disabled = str(b.get("disabled", "false")).lower()
-    comment = b.get("comment", "")
-    resource_name = safe_name(name)
-
-    tf_bridges.write(f'resource "routeros_interface_bridge" "{resource_name}" {{\n')
-    tf_bridges.write(f'  name = "{name}"\n')
-    if mtu:
-        tf_bridges.write(f'  mtu  = {mtu}\n')
-    if protocol_mode:
-        tf_bridges.write(f'  protocol_mode = "{protocol_mode}"\n')
-    tf_bridges.write(f'  disabled = {disabled}\n')
-    if comment:
-        tf_bridges.write(f'  comment = "{comment}"\n')
-    tf_bridges.write("}\n\n")
-
-    imp_all.write(f'terraform import routeros_interface_bridge.{resource_name} "*{rid}"\n')
-
-# ====== Process Bridge Ports ======
-for p in ports:
-    iface = p.get("interface")
-    bridge = p.get("bridge")
-    if not iface or not bridge:
-        continue
-    rid = p.get(".id")
-    path_cost = p.get("path-cost")
-    priority = p.get("priority")
-    disabled = str(p.get("disabled", "false")).lower()
-    comment = p.get("comment", "")
-    resource_name = safe_name(f"{bridge}_{iface}")
-
-    tf_ports.write(f'resource "routeros_interface_bridge_port" "{resource_name}" {{\n')
-    tf_ports.write(f'  interface = "{iface}"\n')
-    tf_ports.write(f'  bridge    = "{bridge}"\n')
-    tf_ports.write(f'  disabled  = {disabled}\n')
-    if path_cost:
-        tf_ports.write(f'  path_cost = {path_cost}\n')
-    if priority:
-        tf_ports.write(f'  priority  = {priority}\n')
-    if comment:
-        tf_ports.write(f'  comment   = "{comment}"\n')
-    tf_ports.write("}\n\n")
-
-    imp_all.write(f'terraform import routeros_interface_bridge_port.{resource_name} "*{rid}"\n')
-
-# ====== Close Files ======
-tf_bridges.close()
-tf_ports.close()
-imp_all.close()
-
-print("\n✅ Generated files:")
-print("  - bridges.tf")
-print("  - bridge_ports.tf")
-print("  - import_all.sh")
-print("\nRun to import everything:")
-print("  chmod +x import_all.sh && ./import_all.sh")
+def bridge_resources(api, merged=None):
+    """Yield (block, address, id, tf_file) for every bridge, bridge port and bridge VLAN group.
+
+    With merged (a list), bridge VLAN entries with the same bridge, ports and settings become
+    one resource, and the .ids of the entries merged into another entry's resource are added
+    to merged; without (--no-merge-vlans), every entry is its own resource.
+    """
+    symbols = SymbolTable()
+    # ====== Process Bridges (dynamic ones cannot be imported) ======
+    for b in iter_select(api, "/interface/bridge", BRIDGE_PROPS, exclude_dynamic=True):
+        name = b.get("name")
+        if not name:
+            continue
+        resource_name = safe_name(name)
+        block = BRIDGE.render(resource_name, b)
+        address = f"routeros_interface_bridge.{resource_name}"
+        symbols.define(INTERFACE, name, address)
+
+        yield block, address, b.get(".id"), BRIDGES_FILE
+
+    # ====== Process Bridge Ports ======
+    for p in iter_select(api, "/interface/bridge/port", PORT_PROPS, exclude_dynamic=True):
+        iface = p.get("interface")
+        bridge = p.get("bridge")
+        if not iface or not bridge:
+            continue
+        resource_name = safe_name(f"{bridge}_{iface}")
+        address = f"routeros_interface_bridge_port.{resource_name}"
+        block = PORT.render(resource_name, symbols.link(p, PORT_LINKS, address))
+
+        yield block, address, p.get(".id"), PORTS_FILE
+
+    # ====== Process Bridge VLANs (dynamic ones are added by the bridge itself) ======
+    # Entries with the same bridge, ports and settings become one resource for all their VLAN IDs
+    # (with --no-merge-vlans every entry is its own)
+    groups = {}
+    entries = 0
+    for v in iter_select(api, "/interface/bridge/vlan", VLAN_PROPS, exclude_dynamic=True):
+        ids = vlan_ids(v.get("vlan-ids"))
+        bridge = v.get("bridge")
+        if not ids or not bridge:
+            continue
+        entries += 1
+        signature = (bridge, port_set(v.get("tagged")), port_set(v.get("untagged")),
+                     v.get("disabled", False), v.get("comment"))
+        if merged is None:
+            ranges = vlan_ranges(ids)
+            # The entry's own VLAN IDs keep the name apart from the bridge's other entries
+            resource_name = sanitize(f"{bridge}_vlan_{'_'.join(ranges)}")
+            yield vlan_block(resource_name, signature, ranges, symbols) + (v.get(".id"), VLANS_FILE)
+            continue
+        group = groups.get(signature)
+        if group is None:
+            group = groups[signature] = [set(), []]
+        group[0].update(ids)
+        group[1].append((min(ids), v.get(".id")))
+
+    for signature, (ids, members) in groups.items():
+        block, address = vlan_block(group_name(*signature), signature, vlan_ranges(ids), symbols)
+        # The resource is imported from the entry with its lowest VLAN ID; the others are merged
+        members.sort()
+        merged.extend(rid for _, rid in members[1:])
+
+        yield block, address, members[0][1], VLANS_FILE
+    if groups:
+        print(f"📦 {entries} bridge VLAN entries as {len(groups)} resources")
+
+def vlan_block(resource_name, signature, ranges, symbols):
+    """The block and address of a bridge VLAN resource for ranges of VLAN IDs."""
+    bridge, tagged, untagged, disabled, comment = signature
+    address = f"routeros_interface_bridge_vlan.{resource_name}"
+    record = {"bridge": bridge, "vlan-ids": ranges, "tagged": tagged or None, "untagged": untagged or None,
+              "disabled": disabled, "comment": comment}
+    return VLAN.render(resource_name, symbols.link(record, VLAN_LINKS, address)), address
+
+def group_name(bridge, tagged, untagged, disabled, comment):
+    """A merged bridge VLAN resource's name, from its bridge and ports so it survives VLAN ID changes.
+
+    Groups that only differ in disabled or comment get a digest of those on top.
+    """
+    name = f"{bridge}_vlans_tagged_{'_'.join(tagged) or 'none'}_untagged_{'_'.join(untagged) or 'none'}"
+    if disabled or comment:
+        name += "_" + hashlib.sha1(repr((disabled, comment)).encode()).hexdigest()[:8]
+    return sanitize(name)
+
+def vlan_ids(value):
+    """The VLAN IDs of a vlan-ids value: 100, "100,200" or "100-199,300"."""
+    ids = set()
+    for part in str(value or "").split(","):
+        first, _, last = part.strip().partition("-")
+        if first:
+            ids.update(range(int(first), int(last or first) + 1))
+    return ids
+
+def vlan_ranges(ids):
+    """Sorted VLAN IDs run-length compacted: {100, ..., 199, 300} -> ("100-199", "300")."""
+    ranges = []
+    start = previous = None
+    for vid in sorted(ids):
+        if previous is not None and vid == previous + 1:
+            previous = vid
+            continue
+        if start is not None:
+            ranges.append(str(start) if start == previous else f"{start}-{previous}")
+        start = previous = vid
+    ranges.append(str(start) if start == previous else f"{start}-{previous}")
+    return tuple(ranges)
+
+def port_set(value):
+    """A tagged/untagged port list as a sorted tuple, so the order the router lists them in does not matter."""
+    return tuple(sorted(p for p in str(value or "").split(",") if p))
+
+def write_merge_script(out_dir, merged):
+    """List the merged bridge VLAN entries for removal before the first apply (or drop a stale list)."""
+    path = os.path.join(out_dir, MERGE_FILE)
+    if not merged:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    with open(path, "w") as f:
+        f.write("# Generated by import_bridge.py\n")
+        f.write("# Bridge VLAN entries whose VLAN IDs are now managed by another entry's resource\n")
+        f.write("# (same bridge and ports). Remove them before the first terraform apply.\n")
+        f.write("".join(f"/interface bridge vlan remove [find where .id={rid}]\n" for rid in merged))
+    print(f"⚠️ {len(merged)} bridge VLAN entries merged into other resources, see {path}")
+
+def export_router(api, out_dir=".", import_script=False, merge_vlans=True):
+    """Stream bridges, bridge ports, bridge VLANs and their import blocks into out_dir."""
+    merged = [] if merge_vlans else None
+    with TfWriter(out_dir, BRIDGES_FILE, IMPORT_TF_FILE, trailer="\n", tf_files=[PORTS_FILE, VLANS_FILE],
+                  import_script=import_script and IMPORT_FILE) as writer:
+        writer.write_all(bridge_resources(api, merged))
+    if not writer.drift:
+        write_merge_script(out_dir, merged or ())
+    return writer.imported
+
+def main():
+    parser = argparse.ArgumentParser(description="Export bridges, bridge ports and bridge VLANs to Terraform.")
+    add_fleet_arguments(parser)
+    parser.add_argument("--no-merge-vlans", dest="merge_vlans", action="store_false",
+                        help="one resource per bridge VLAN entry instead of one per bridge and ports, so no "
+                             f"entries have to be removed on the router ({MERGE_FILE})")
+    add_backend_arguments(parser)
+    add_import_arguments(parser)
+    add_output_arguments(parser)
+    add_drift_arguments(parser)
+    add_snapshot_arguments(parser)
+    add_metrics_arguments(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    configure_backend(args)
+    configure_imports(args)
+    configure_output(args)
+    configure_drift(args)
+    configure_snapshot(args)
+    configure_metrics(args)
+    configure_profile(args)
+    export = partial(export_router, import_script=args.import_script, merge_vlans=args.merge_vlans)
+
+    if args.inventory:
+        routers = load_inventory(args.inventory, USER, PASS, PORT)
+        failures = run_fleet(routers, connect_mikrotik, export, args.workers, args.out_dir, args.skip_unchanged)
+        sys.exit(1 if failures else 0)
+
+    connect_router = with_snapshots(connect_mikrotik)
+    with profiled():
+        with stage("connect", host=HOST):
+            api = RouterSession(connect_router())
+        export(api)
+
+    print("\n✅ Generated files:")
+    print("  - bridges.tf")
+    print("  - bridge_ports.tf")
+    print("  - bridge_vlans.tf")
+    print("  - import_all.tf")
+    print("\nRun to import everything:")
+    print("  terraform plan && terraform apply")
+    write_report()
 
+if __name__ == "__main__":
+    main()
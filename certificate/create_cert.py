@@ -1,5 +1,34 @@
 #!/usr/bin/env python3
-import librouteros
+"""
+create_cert.py
+- Issues a CA and a www-ssl server certificate on a router, brings its IP services to the
+  hardened state below and writes routeros_certificate.tf / import_cert.tf for the
+  certificates and IP services.
+- With --inventory, issues on every router of the inventory concurrently, one output
+  directory per router (like the importers' fleet mode).
+- Every router runs as a task on the shared asyncio loop (common.aioclient): while one
+  router generates keys, the others keep going, and a slow one holds no thread.
+- A router's certificates are listed once into a name -> .id index, which the adds keep
+  current from their returned ids; certificates that already exist, or are already signed
+  or trusted, are reused, so a re-run only issues what is missing.
+- /certificate/sign is sent as a tagged command and the certificate is polled for its
+  fingerprint alongside it, so key generation that outlasts the API timeout is still seen
+  through to the end.
+- The desired IP service state is computed once; each router's services are printed once,
+  and only what differs is pushed, in one /ip/service/set per distinct change (sent
+  together). Routers already hardened get no set at all.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+from librouteros.exceptions import TrapError
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.aioclient import AsyncRouter, run  # noqa: E402
+from common.fleet import DEFAULT_OUT_DIR, DEFAULT_WORKERS, load_inventory, router_dir  # noqa: E402
 
 # -----------------------------
 # Router and Certificate Details
@@ -7,11 +36,12 @@ import librouteros
 ROUTER_HOST = '192.168.62.1'
 ROUTER_USER = 'terraform'
 ROUTER_PASSWORD = 'terraform'
+ROUTER_PORT = 8728
 
 CA_NAME = "sysad-ca-cert"
 CA_CN = "ca"
 WEBFIG_NAME = "webfig"
-WEBFIG_CN = "192.168.62.1"
+WEBFIG_CN = "192.168.62.1"  # in fleet mode, each router's own host
 
 # Certificate validity in days
 CA_DAYS = 3650          # 10 years
@@ -24,81 +54,184 @@ ORGANIZATION = "Digital"
 DISABLED_SERVICES = { "ftp": 21, "telnet": 23, "www": 80, "ssh": 22 }
 ENABLED_SERVICES = { "winbox": 8291 }
 SSL_SERVICES = { "api": 8728, "api-ssl": 8729, "www-ssl": 443 }
+# Of those, the ones that take a certificate and TLS version (plain api has neither)
+TLS_SERVICES = ( "api-ssl", "www-ssl" )
+TLS_VERSION = "only-1.2"
+
+# Signing is polled every POLL_INTERVAL seconds, doubling up to POLL_MAX, for up to SIGN_TIMEOUT
+POLL_INTERVAL = 0.5
+POLL_MAX = 5.0
+SIGN_TIMEOUT = 600
+
+TF_FILE = "routeros_certificate.tf"
+IMPORT_TF_FILE = "import_cert.tf"
 
 # -----------------------------
-# Connect to MikroTik API
+# Certificate Index
 # -----------------------------
-def connect_api():
-    api = librouteros.connect(
-        host=ROUTER_HOST,
-        username=ROUTER_USER,
-        password=ROUTER_PASSWORD,
-        use_ssl=False
-    )
-    return api
+class CertIndex:
+    """name -> .id of a router's certificates, listed once and kept current by add()."""
+
+    PROPS = [".id", "name", "fingerprint", "trusted"]
+
+    def __init__(self, router):
+        self.router = router
+        self.ids = {}
+        self.signed = set()
+        self.trusted = set()
+
+    async def load(self):
+        for cert in await self.router.print("/certificate", [f"=.proplist={','.join(self.PROPS)}"]):
+            self._update(cert)
+        return self
+
+    def _update(self, cert):
+        self.ids[cert["name"]] = cert[".id"]
+        if cert.get("fingerprint"):
+            self.signed.add(cert["name"])
+        if cert.get("trusted") in (True, "true", "yes"):
+            self.trusted.add(cert["name"])
+
+    def get(self, name):
+        if name not in self.ids:
+            raise ValueError(f"Certificate '{name}' not found")
+        return self.ids[name]
+
+    async def add(self, **properties):
+        """Add a certificate template unless one of that name exists; returns its .id."""
+        name = properties["name"]
+        if name not in self.ids:
+            replies = await self.router.command("/certificate/add", **properties)
+            ret = next((r["ret"] for r in replies if "ret" in r), None)
+            if ret is None:
+                # RouterOS always returns the new .id; refresh the index if it did not
+                await self.load()
+            else:
+                self.ids[name] = ret
+        return self.get(name)
+
+    async def trust(self, name):
+        """Mark a certificate trusted unless it already is; returns whether a set was sent."""
+        if name in self.trusted:
+            return False
+        await self.router.command("/certificate/set", **{'.id': self.get(name), 'trusted': 'yes'})
+        self.trusted.add(name)
+        return True
+
+    async def poll(self, names):
+        """Refresh the signed state of names with one print; returns those still unsigned."""
+        queries = [f"?name={name}" for name in names] + ["?#|"] * (len(names) - 1)
+        for cert in await self.router.print("/certificate", [f"=.proplist={','.join(self.PROPS)}", *queries]):
+            self._update(cert)
+        return [name for name in names if name not in self.signed]
+
+    async def sign(self, name, ca=None):
+        """Sign a certificate (self-signed without ca) and wait until the router has finished."""
+        if name in self.signed:
+            return False
+        properties = {".id": self.get(name)}
+        if ca:
+            properties["ca"] = ca
+        signing = asyncio.ensure_future(self.router.command("/certificate/sign", **properties))
+        deadline = time.monotonic() + SIGN_TIMEOUT
+        interval = POLL_INTERVAL
+        try:
+            while True:
+                await asyncio.wait([signing], timeout=interval)
+                if signing.done() and isinstance(signing.exception(), TrapError):
+                    raise signing.exception()
+                if not await self.poll([name]):
+                    return True
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"Certificate '{name}' not signed after {SIGN_TIMEOUT}s")
+                interval = min(2 * interval, POLL_MAX)
+        finally:
+            # the sign command may time out on the API while the key is still generated
+            if not signing.done():
+                signing.cancel()
+            elif not signing.cancelled():
+                signing.exception()
 
 # -----------------------------
-# Certificate Utility Functions
+# Issuance
 # -----------------------------
-def get_cert_id(api, name):
-    certs = list(api('/certificate/print'))
-    cert = next((c for c in certs if c['name'] == name), None)
-    if not cert:
-        raise ValueError(f"Certificate '{name}' not found")
-    return cert['.id']
-
-def create_ca(api):
-    cmd = {
-        "name": CA_NAME,
-        "common-name": CA_CN,
-        "key-usage": "key-cert-sign",
-        "subject-alt-name": "",
-        "country": COUNTRY,
-        "locality": LOCALITY,
-        "organization": ORGANIZATION,
-        "days-valid": CA_DAYS
-    }
-    list(api('/certificate/add', **cmd))
-    ca_id = get_cert_id(api, CA_NAME)
-    list(api('/certificate/set', **{'.id': ca_id, 'trusted': 'yes'}))
-    print(f"✅ CA '{CA_NAME}' created and trusted with ID {ca_id}")
-    return ca_id
-
-def self_sign_ca(api, ca_name):
-    ca_id = get_cert_id(api, ca_name)
-    list(api('/certificate/sign', **{'.id': ca_id}))
-    print(f"✅ CA '{ca_name}' self-signed")
-
-def create_request(api, name, cn, days=365):
-    cmd = {
+def certificate(name, cn, key_usage, days):
+    return {
         "name": name,
         "common-name": cn,
-        "key-usage": "tls-server",
+        "key-usage": key_usage,
         "subject-alt-name": "",
         "country": COUNTRY,
         "locality": LOCALITY,
         "organization": ORGANIZATION,
         "days-valid": days
     }
-    list(api('/certificate/add', **cmd))
-    req_id = get_cert_id(api, name)
-    print(f"✅ Certificate request '{name}' created with ID {req_id}")
-    return req_id
 
-def sign_certificate(api, cert_name, ca_name):
-    cert_id = get_cert_id(api, cert_name)
-    list(api('/certificate/sign', **{'.id': cert_id, 'ca': ca_name}))
-    print(f"✅ Certificate '{cert_name}' signed by CA '{ca_name}'")
-    return cert_id
+async def issue(router, index, webfig_cn, label=""):
+    """CA and server certificate on one router."""
+    # Both templates are added at once; keys are only generated when signing
+    ca_id, req_id = await asyncio.gather(
+        index.add(**certificate(CA_NAME, CA_CN, "key-cert-sign", CA_DAYS)),
+        index.add(**certificate(WEBFIG_NAME, webfig_cn, "tls-server", WEBFIG_DAYS)),
+    )
+    trusted = await index.trust(CA_NAME)
+    print(f"✅ {label}CA '{CA_NAME}' ({ca_id}) and request '{WEBFIG_NAME}' ({req_id}) ready, "
+          f"CA {'trusted' if trusted else 'already trusted'}")
 
-def bind_www_ssl(api, cert_name):
-    list(api('/ip/service/set', numbers='www-ssl', certificate=cert_name))
-    print(f"✅ Certificate '{cert_name}' bound to www-ssl")
+    if await index.sign(CA_NAME):
+        print(f"✅ {label}CA '{CA_NAME}' self-signed")
+    if await index.sign(WEBFIG_NAME, ca=CA_NAME):
+        print(f"✅ {label}Certificate '{WEBFIG_NAME}' signed by CA '{CA_NAME}'")
+
+# -----------------------------
+# IP Service Hardening
+# -----------------------------
+def desired_services():
+    """name -> the properties every router's IP service must have."""
+    desired = {}
+    for name, port in DISABLED_SERVICES.items():
+        desired[name] = {"port": port, "disabled": True}
+    for name, port in ENABLED_SERVICES.items():
+        desired[name] = {"port": port, "disabled": False}
+    for name, port in SSL_SERVICES.items():
+        if name in TLS_SERVICES:
+            desired[name] = {"port": port, "tls-version": TLS_VERSION, "certificate": WEBFIG_NAME}
+        else:
+            desired[name] = {"port": port, "disabled": False}
+    return desired
+
+DESIRED_SERVICES = desired_services()
+
+def service_changes(services, desired=DESIRED_SERVICES):
+    """The /ip/service/set calls that bring services to desired: one per distinct set of changes."""
+    by_name = {svc['name']: svc for svc in services}
+    batches = {}
+    for name, wanted in desired.items():
+        current = by_name.get(name)
+        if current is None:
+            # not on this router
+            continue
+        changes = tuple(sorted((k, v) for k, v in wanted.items() if current.get(k) != v))
+        if changes:
+            batches.setdefault(changes, []).append(name)
+    return [dict(changes, numbers=",".join(names)) for changes, names in batches.items()]
+
+async def push_services(router, services, label=""):
+    """Send the service changes a router needs, all at once; services is updated to match."""
+    sets = service_changes(services)
+    if not sets:
+        print(f"💤 {label}IP services already hardened")
+        return 0
+    await asyncio.gather(*(router.command("/ip/service/set", **properties) for properties in sets))
+    for svc in services:
+        svc.update(DESIRED_SERVICES.get(svc['name'], {}))
+    print(f"✅ {label}IP services hardened with {len(sets)} set call(s)")
+    return len(sets)
 
 # -----------------------------
 # Terraform File Generation (Static)
 # -----------------------------
-def generate_terraform_files(api):
+def terraform_resources():
     tf_lines = []
 
     # Certificates
@@ -123,23 +256,26 @@ def generate_terraform_files(api):
 
     # IP Services - SSL
     for name, port in SSL_SERVICES.items():
+        if name not in TLS_SERVICES:
+            tf_lines.append(f'resource "routeros_ip_service" "ssl_{name}" {{\n'
+                            f'  numbers  = "{name}"\n'
+                            f'  port     = {port}\n'
+                            f'  disabled = false\n'
+                            f'}}')
+            continue
         tf_lines.append(f'resource "routeros_ip_service" "ssl_{name}" {{\n'
                         f'  numbers     = "{name}"\n'
                         f'  port        = {port}\n'
-                        f'  tls_version = "only-1.2"\n'
+                        f'  tls_version = "{TLS_VERSION}"\n'
                         f'  certificate = routeros_system_certificate.webfig.name\n'
                         f'}}')
+    return tf_lines
 
-    with open("routeros_certificate.tf", "w") as f:
-        f.write("\n\n".join(tf_lines) + "\n")
-    print("✅ routeros_certificate.tf written (static resources)")
-
-    # -----------------------------
-    # Import File Generation (Static, Duplicate-Free)
-    # -----------------------------
+def import_blocks(index, services):
+    """Import blocks (static, duplicate-free) for the certificates and IP services."""
     import_lines = [
-        f'import {{\n  to = routeros_system_certificate.ca-cert\n  id = "{get_cert_id(api, CA_NAME)}"\n}}',
-        f'import {{\n  to = routeros_system_certificate.webfig\n  id = "{get_cert_id(api, WEBFIG_NAME)}"\n}}'
+        f'import {{\n  to = routeros_system_certificate.ca-cert\n  id = "{index.get(CA_NAME)}"\n}}',
+        f'import {{\n  to = routeros_system_certificate.webfig\n  id = "{index.get(WEBFIG_NAME)}"\n}}'
     ]
 
     # Map static resource names
@@ -151,7 +287,6 @@ def generate_terraform_files(api):
     for name in SSL_SERVICES:
         static_map[f'ssl_{name}'] = name
 
-    services = list(api('/ip/service/print'))
     added = set()
     for svc in services:
         flags = svc.get('flags', '')
@@ -167,23 +302,76 @@ def generate_terraform_files(api):
                 import_lines.append(f'import {{\n  to = routeros_ip_service.{tf_resource}\n  id = "{svc[".id"]}"\n}}')
                 added.add(tf_resource)
                 break
+    return import_lines
 
-    with open("import_cert.tf", "w") as f:
-        f.write("\n".join(import_lines) + "\n")
-    print("✅ import_cert.tf written (static, duplicate-free)")
+def generate_terraform_files(index, services, out_dir="."):
+    with open(os.path.join(out_dir, TF_FILE), "w") as f:
+        f.write("\n\n".join(terraform_resources()) + "\n")
+    print(f"✅ {os.path.join(out_dir, TF_FILE)} written (static resources)")
+
+    with open(os.path.join(out_dir, IMPORT_TF_FILE), "w") as f:
+        f.write("\n".join(import_blocks(index, services)) + "\n")
+    print(f"✅ {os.path.join(out_dir, IMPORT_TF_FILE)} written (static, duplicate-free)")
+
+# -----------------------------
+# One Router / The Fleet
+# -----------------------------
+async def issue_router(target, out_dir=".", webfig_cn=WEBFIG_CN, label="", services_only=False):
+    """Connect, issue, harden the IP services and write the Terraform files of one router."""
+    router = await AsyncRouter.connect(target["host"], target["user"], target["password"], target["port"])
+    print(f"✅ {label}Connected to {target['host']}:{target['port']}")
+    try:
+        index, services = await asyncio.gather(CertIndex(router).load(), router.print("/ip/service"))
+        if not services_only:
+            await issue(router, index, webfig_cn, label)
+        await push_services(router, services, label)
+        os.makedirs(out_dir, exist_ok=True)
+        generate_terraform_files(index, services, out_dir)
+    finally:
+        await router.close()
+
+async def issue_fleet(routers, workers=DEFAULT_WORKERS, out_root=DEFAULT_OUT_DIR, services_only=False):
+    """Issue on every router, at most workers at a time. Returns the list of (router, error) that failed."""
+    print(f"🚚 Fleet mode: {len(routers)} routers, {workers} at a time, output in {out_root}/")
+    slots = asyncio.Semaphore(max(1, workers))
+
+    async def one(target):
+        async with slots:
+            start = time.monotonic()
+            try:
+                await issue_router(target, router_dir(out_root, target), target["host"], f"{target['name']}: ",
+                                   services_only)
+            except Exception as e:
+                print(f"❌ {target['name']} failed after {time.monotonic() - start:.1f}s: {e!r}")
+                return target, e
+            print(f"✅ {target['name']} issued in {time.monotonic() - start:.1f}s")
+            return target, None
+
+    results = await asyncio.gather(*(one(target) for target in routers))
+    failures = [(target, error) for target, error in results if error is not None]
+    print(f"🎉 Fleet done: {len(routers) - len(failures)} ok, {len(failures)} failed")
+    return failures
 
 # -----------------------------
 # Main Script
 # -----------------------------
 def main():
-    api = connect_api()
-    create_ca(api)
-    self_sign_ca(api, CA_NAME)
-    create_request(api, WEBFIG_NAME, WEBFIG_CN, days=WEBFIG_DAYS)
-    sign_certificate(api, WEBFIG_NAME, CA_NAME)
-    bind_www_ssl(api, WEBFIG_NAME)
-    generate_terraform_files(api)
+    parser = argparse.ArgumentParser(description="Issue the CA and www-ssl certificates and write their Terraform files.")
+    group = parser.add_argument_group("fleet mode")
+    group.add_argument("--inventory", help="CSV or JSON file of routers to issue on instead of ROUTER_HOST")
+    group.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="routers issued at a time (default: %(default)s)")
+    group.add_argument("--out-dir", default=DEFAULT_OUT_DIR, help="root of the per-router output directories (default: %(default)s)")
+    parser.add_argument("--services-only", action="store_true",
+                        help="only push the IP service hardening (the certificates must already exist)")
+    args = parser.parse_args()
+
+    if args.inventory:
+        routers = load_inventory(args.inventory, ROUTER_USER, ROUTER_PASSWORD, ROUTER_PORT)
+        failures = run(issue_fleet(routers, args.workers, args.out_dir, args.services_only))
+        sys.exit(1 if failures else 0)
+
+    target = {"host": ROUTER_HOST, "user": ROUTER_USER, "password": ROUTER_PASSWORD, "port": ROUTER_PORT}
+    run(issue_router(target, services_only=args.services_only))
 
 if __name__ == "__main__":
     main()
-
@@ -0,0 +1,6 @@
+"""
+Shared helpers for the MikroTik -> Terraform importers.
+
+The importers are plain scripts run from their own directory, so each one puts
+the repository root on sys.path before importing from this package.
+"""
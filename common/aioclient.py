@@ -0,0 +1,313 @@
+"""
+aioclient.py
+- An asyncio RouterOS API client: every command carries a .tag, so many prints can be in
+  flight on one connection and their replies are routed back by tag as they arrive.
+- All routers share one event loop, run in a single background thread, so a fleet export
+  holds thousands of connections without a thread per router.
+- BlockingRouter puts the client behind the interface RouterSession and the query helpers
+  already use (read_print, api(cmd=...), close), so the collectors run unchanged; prefetch()
+  pipelines its paths over the session's own connection instead of opening extra ones.
+- --api asyncio switches fleet mode to it; librouteros' blocking client stays the default.
+
+Login and the connection itself come from librouteros.async_connect; replies after login
+are decoded with common.decoder, to read replies of interleaved commands.
+"""
+import asyncio
+import itertools
+import queue
+import threading
+import time
+
+from librouteros import async_connect
+from librouteros.exceptions import ConnectionClosed, FatalError, MultiTrapError, TrapError
+from librouteros.protocol import compose_word, encode_sentence
+
+from common.decoder import Decoder
+from common.query import NOT_DYNAMIC, path_key
+
+# Set from --api by configure_backend()
+API = "librouteros"
+BACKENDS = ("librouteros", "asyncio")
+TIMEOUT = 10
+# Bytes read from the socket at a time
+READ_SIZE = 1 << 16
+# Batches of a streamed print buffered ahead of the caller (a batch is what one read delivered)
+BACKLOG = 64
+
+_loop = None
+_loop_lock = threading.Lock()
+_END = object()
+
+
+def configure_backend(args):
+    """Apply the parsed --api option."""
+    global API
+    API = args.api
+
+
+def add_backend_arguments(parser):
+    """Add --api to an importer's argument parser."""
+    parser.add_argument(
+        "--api",
+        choices=BACKENDS,
+        default=API,
+        help="RouterOS client for fleet mode: one blocking connection per router, or asyncio with "
+        "pipelined tagged commands on a shared event loop (default: %(default)s)",
+    )
+
+
+def event_loop():
+    """The event loop every router connection runs on, started on first use."""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="routeros-asyncio", daemon=True).start()
+    return _loop
+
+
+def run(coro, timeout=None):
+    """Run a coroutine on the shared loop from a blocking thread and wait for its result."""
+    return asyncio.run_coroutine_threadsafe(coro, event_loop()).result(timeout)
+
+
+class AsyncRouter:
+    """One logged-in connection; commands are multiplexed over it by .tag."""
+
+    def __init__(self, api, timeout=TIMEOUT):
+        transport = api.protocol.transport
+        self.reader = transport.reader
+        self.writer = transport.writer
+        self.encoding = api.protocol.encoding
+        self.timeout = timeout
+        self.tags = itertools.count(1)
+        self.decoder = Decoder(self.encoding)
+        self.pending = {}  # tag -> asyncio.Queue of (reply word, attributes, bytes) or an exception
+        self.reading = asyncio.ensure_future(self._read_replies())
+
+    @classmethod
+    async def connect(cls, host, user, password, port=8728, timeout=TIMEOUT):
+        api = await async_connect(host, username=user, password=password, port=port, timeout=timeout)
+        return cls(api, timeout)
+
+    async def _read_replies(self):
+        """Read whatever has arrived and route each complete sentence to the command with its tag."""
+        decoder = self.decoder
+        pending = self.pending
+        try:
+            while True:
+                data = await self.reader.read(READ_SIZE)
+                if not data:
+                    raise ConnectionResetError("closed by the router")
+                decoder.feed(data)
+                for reply_word, attrs, tag, nbytes in decoder.sentences():
+                    replies = pending.get(tag)
+                    if replies is not None:
+                        replies.put_nowait((reply_word, attrs, nbytes))
+        except (ConnectionError, OSError, FatalError) as e:
+            error = ConnectionClosed(f"Connection closed: {e!r}")
+        except asyncio.CancelledError:
+            error = ConnectionClosed("Connection closed")
+        for replies in self.pending.values():
+            replies.put_nowait(error)
+
+    async def _send(self, command, *words):
+        """Send one tagged command; returns its tag and the queue its replies arrive on."""
+        if self.reading.done():
+            raise ConnectionClosed("Connection closed")
+        tag = str(next(self.tags))
+        replies = self.pending[tag] = asyncio.Queue()
+        self.writer.write(encode_sentence(command, *words, f".tag={tag}", encoding=self.encoding))
+        await self.writer.drain()
+        return tag, replies
+
+    async def talk(self, command, *words):
+        """Yield lists of (reply word, attributes, bytes), as many sentences as have arrived, up to !done.
+
+        Traps are raised once !done has been read.
+        """
+        tag, replies = await self._send(command, *words)
+        traps = []
+        reply_word = None
+        try:
+            while reply_word != "!done":
+                arrived = [await asyncio.wait_for(replies.get(), self.timeout)]
+                while not replies.empty():
+                    arrived.append(replies.get_nowait())
+                batch = []
+                for reply in arrived:
+                    if isinstance(reply, Exception):
+                        raise reply
+                    reply_word, entry, _ = reply
+                    if reply_word == "!trap":
+                        traps.append(TrapError(**entry))
+                    batch.append(reply)
+                    if reply_word == "!done":
+                        break
+                yield batch
+        finally:
+            self.pending.pop(tag, None)
+        if len(traps) > 1:
+            raise MultiTrapError(*traps)
+        if traps:
+            raise traps[0]
+
+    async def print_batches(self, path, words=(), totals=None):
+        """Yield the records of one print in lists as they arrive.
+
+        totals, if given, is filled with the records, reply bytes and traps of the print,
+        and "finished" once it has been read to the end.
+        """
+        totals = {} if totals is None else totals
+        totals.update(records=0, bytes=0, errors=0)
+        try:
+            async for batch in self.talk(path_key(path) + "/print", *words):
+                entries = [entry for reply_word, entry, _ in batch if reply_word == "!re"]
+                totals["bytes"] += sum(size for _, _, size in batch)
+                totals["records"] += len(entries)
+                if entries:
+                    yield entries
+        except TrapError:
+            totals.update(errors=1, finished=True)
+            raise
+        totals["finished"] = True
+
+    async def record(self, stats, path, words, totals, seconds):
+        """Add a finished print to stats, counting the dynamic entries it filtered out if stats asks for them."""
+        if not totals.get("finished"):
+            # abandoned half-way, as with query.read_print()
+            return
+        dynamic = None
+        if stats.count_dynamic and not totals["errors"] and NOT_DYNAMIC[0] in words:
+            dynamic = await self.count(path, "?dynamic=true")
+        stats.add(path_key(path), totals["records"], totals["bytes"], seconds, errors=totals["errors"], dynamic=dynamic)
+
+    async def iter_print(self, path, words=()):
+        """Yield the records of one print one by one."""
+        async for entries in self.print_batches(path, words):
+            for entry in entries:
+                yield entry
+
+    async def print(self, path, words=(), stats=None):
+        """All records of one print, counted in stats like query.read_print()."""
+        started = time.monotonic()
+        totals = {}
+        try:
+            return [entry async for entries in self.print_batches(path, words, totals) for entry in entries]
+        finally:
+            if stats is not None:
+                await self.record(stats, path, words, totals, time.monotonic() - started)
+
+    async def count(self, path, *queries):
+        """Number of entries matching queries, from one count-only print (None if unsupported)."""
+        try:
+            async for batch in self.talk(path_key(path) + "/print", "=count-only=", *queries):
+                for _, entry, _ in batch:
+                    if "ret" in entry:
+                        return int(entry["ret"])
+        except TrapError:
+            return None
+        return None
+
+    async def command(self, command, **kwargs):
+        """Any other command (add, set, remove, ...); returns its !re records and the !done one
+        if it has attributes (the new .id of an add), like librouteros."""
+        words = [compose_word(k, v) for k, v in kwargs.items()]
+        return [entry async for batch in self.talk(command, *words) for reply_word, entry, _ in batch
+                if reply_word == "!re" or (reply_word == "!done" and entry)]
+
+    async def close(self):
+        self.reading.cancel()
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except OSError:
+            pass
+
+
+class BlockingRouter:
+    """An AsyncRouter on the shared loop, usable from the blocking collectors like a librouteros Api."""
+
+    def __init__(self, router):
+        self.router = router
+
+    def read_print(self, path, words=(), stats=None):
+        """Yield the records of one print as the loop receives them (see query.read_print).
+
+        Records cross over from the loop in the batches they arrived in; with BACKLOG
+        batches waiting for the caller, the loop stops reading this print until it catches
+        up. Closing the generator early cancels the print.
+        """
+        batches = queue.Queue(BACKLOG)
+        abandoned = threading.Event()
+
+        def put(item):
+            while not abandoned.is_set():
+                try:
+                    batches.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    pass
+
+        async def send(item):
+            try:
+                batches.put_nowait(item)
+            except queue.Full:
+                await asyncio.to_thread(put, item)
+
+        async def pump():
+            try:
+                async for entries in self.router.print_batches(path, words, totals):
+                    await send(entries)
+            except Exception as e:
+                await send(e)
+            else:
+                await send(_END)
+
+        totals = {}
+        waited = 0.0  # fetch time is the time the caller waits, as with query.read_print()
+        future = asyncio.run_coroutine_threadsafe(pump(), event_loop())
+        try:
+            while True:
+                started = time.monotonic()
+                entries = batches.get()
+                waited += time.monotonic() - started
+                if entries is _END or isinstance(entries, Exception):
+                    break
+                yield from entries
+        finally:
+            abandoned.set()
+            future.cancel()
+        if stats is not None:
+            run(self.router.record(stats, path, words, totals, waited))
+        if entries is not _END:
+            raise entries
+
+    def select_many(self, prints, stats=None):
+        """Run (path, words) prints concurrently on the one connection; entries or the exception, in order."""
+
+        async def gather():
+            return await asyncio.gather(*(self.router.print(path, words, stats) for path, words in prints),
+                                        return_exceptions=True)
+
+        return run(gather())
+
+    def __call__(self, cmd, **kwargs):
+        if cmd.endswith("/print") and not kwargs:
+            return iter(list(self.read_print(cmd)))
+        return iter(run(self.router.command(cmd, **kwargs)))
+
+    def close(self):
+        run(self.router.close())
+
+
+def connect(host, user, password, port=8728):
+    """Log in to a router on the shared loop; same signature as the importers' connect_mikrotik()."""
+    router = run(AsyncRouter.connect(host, user, password, port))
+    print(f"✅ Connected to {host}:{port} (asyncio)")
+    return BlockingRouter(router)
+
+
+def connector(connect_mikrotik):
+    """The connect function fleet mode uses: the importer's own, or connect() with --api asyncio."""
+    return connect if API == "asyncio" else connect_mikrotik
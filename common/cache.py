@@ -0,0 +1,62 @@
+"""
+cache.py
+- RecordCache remembers, per output directory (one router, one collector), the .id and a
+  content hash of every resource written by the previous run.
+- The next run compares against it and writes a changelog of added, removed and modified
+  resources, so a nightly drift job only has to look at what actually changed.
+
+The hash is taken over the rendered block rather than the raw record: it covers exactly
+the properties that reach Terraform, so counters and other unexported fields that change
+on every print do not show up as modifications. Blocks are not reused from the cache: a
+hash of the raw record would cost about as much as rendering the block again.
+"""
+import hashlib
+import json
+import os
+
+CACHE_FILE = ".export_cache.json"
+CHANGELOG_FILE = "changelog.json"
+
+
+def content_hash(block):
+    return hashlib.sha1(block.encode()).hexdigest()
+
+
+class RecordCache:
+    """address -> (.id, content hash) of the previous and the current run."""
+
+    def __init__(self, out_dir):
+        self.path = os.path.join(out_dir, CACHE_FILE)
+        self.changelog_path = os.path.join(out_dir, CHANGELOG_FILE)
+        self.previous = {}
+        self.current = {}
+        try:
+            with open(self.path) as f:
+                self.previous = {address: tuple(entry) for address, entry in json.load(f).items()}
+        except (OSError, ValueError):
+            pass
+
+    def record(self, address, rid, block):
+        self.current[address] = (rid, content_hash(block))
+
+    def changes(self):
+        """Added, modified and removed addresses since the previous run."""
+        added = [a for a in self.current if a not in self.previous]
+        modified = [a for a in self.current if a in self.previous and self.previous[a] != self.current[a]]
+        removed = [a for a in self.previous if a not in self.current]
+        return {"added": added, "modified": modified, "removed": removed}
+
+    def save(self):
+        """Write the changelog and replace the cache with this run's records."""
+        changes = self.changes()
+        with open(self.changelog_path, "w") as f:
+            json.dump(changes, f, indent=2)
+            f.write("\n")
+        with open(self.path, "w") as f:
+            json.dump(self.current, f, separators=(",", ":"))
+        if self.previous:
+            print(
+                f"🔁 Since last export: {len(changes['added'])} added, {len(changes['modified'])} modified, "
+                f"{len(changes['removed'])} removed ({self.changelog_path})"
+            )
+        return changes
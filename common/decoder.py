@@ -0,0 +1,189 @@
+"""
+decoder.py
+- Decodes RouterOS API replies straight out of one reusable receive buffer per connection:
+  the socket is read with recv_into() through a memoryview of the buffer in large chunks,
+  instead of librouteros' three recv() calls and bytes objects per word.
+- Each received chunk is decoded to text once; words are located by their length prefixes
+  and sliced out of it, so no bytes object is made per word.
+- Attribute words go straight into the record ("=dst-address=10.0.0.0/8" -> "dst-address"),
+  converted like librouteros.protocol.parse_word (yes/true -> True, digits -> int).
+- Keys and values are interned: thousands of records of a route or address-list print share
+  one str for "dst-address", "main" or "ether1", which is looked up by its bytes and converted
+  only the first time it is seen.
+- Sentences are yielded one by one, so records still stream to the fetch helpers.
+
+Replies are read for one command at a time, up to its !done, so the buffer never holds
+bytes of a later reply that librouteros itself would have to read. The connection's encoding
+must be ASCII-compatible (librouteros' default ASCII, or utf-8).
+"""
+import weakref
+
+from librouteros.exceptions import ConnectionClosed, FatalError
+from librouteros.protocol import decode_length, determine_length
+
+# Initial receive buffer; it grows for sentences that do not fit
+READ_SIZE = 1 << 18
+# Interned keys/values are dropped past this many, so unique comments cannot grow them unbounded
+CACHE_LIMIT = 200_000
+CONVERSIONS = {"yes": True, "true": True, "no": False, "false": False}
+EQUALS = ord("=")
+
+_decoders = weakref.WeakKeyDictionary()
+
+
+def convert(value):
+    """A decoded value as librouteros.protocol.parse_word would return it.
+
+    int() is only tried on what could be a number: most values are not, and a failed int()
+    costs more than decoding the word.
+    """
+    first = value[:1]
+    if first.isdigit() or first in ("-", "+") or first.isspace():
+        try:
+            return int(value)
+        except ValueError:
+            pass
+    return CONVERSIONS.get(value, value)
+
+
+class Decoder:
+    """Sentences of one connection, decoded from a reusable buffer."""
+
+    def __init__(self, encoding="ASCII", size=READ_SIZE):
+        self.encoding = encoding
+        self.buf = bytearray(size)
+        self.view = memoryview(self.buf)
+        self.start = 0  # first byte not decoded yet
+        self.end = 0  # end of the received bytes
+        self.keys = {}  # key -> the one str used for it
+        self.values = {}  # value -> the one converted value used for it
+
+    @staticmethod
+    def _add(table, text, value):
+        """Remember the interned value of a decoded word part."""
+        if len(table) >= CACHE_LIMIT:
+            table.clear()
+        table[text] = value
+        return value
+
+    def feed(self, data):
+        """Append received bytes (from a stream that cannot read into the buffer itself)."""
+        n = len(data)
+        self.reserve(n)
+        self.buf[self.end:self.end + n] = data
+        self.end += n
+
+    def reserve(self, n):
+        """Make room for n more bytes after end: move the undecoded tail to the front, or grow."""
+        if self.end + n <= len(self.buf):
+            return
+        pending = self.end - self.start
+        if pending + n > len(self.buf):
+            grown = bytearray(max(2 * len(self.buf), pending + n))
+            grown[:pending] = self.buf[self.start:self.end]
+            self.buf = grown
+            self.view = memoryview(grown)
+        else:
+            self.buf[:pending] = self.buf[self.start:self.end]
+        self.start, self.end = 0, pending
+
+    def recv(self, sock):
+        """Read whatever the socket has into the buffer; raises ConnectionClosed at EOF."""
+        self.reserve(READ_SIZE // 4)
+        n = sock.recv_into(self.view[self.end:])
+        if not n:
+            raise ConnectionClosed("Connection unexpectedly closed.")
+        self.end += n
+
+    def _redecode(self, text):
+        """A word sliced from a chunk with non-ASCII bytes, decoded with the connection's encoding."""
+        return text if text.isascii() else text.encode("latin-1").decode(self.encoding, "ignore")
+
+    def sentences(self):
+        """Yield (reply word, attributes, tag, bytes on the wire) for every complete sentence received."""
+        buf = self.buf
+        keys = self.keys
+        values = self.values
+        add = self._add
+        pos = self.start
+        end = self.end
+        # The received bytes are decoded once, as latin-1, so byte offsets are string offsets
+        # and every word is a str slice; only chunks with non-ASCII bytes need words redecoded.
+        chunk = buf[pos:end]
+        exact = chunk.isascii()
+        redecode = self._redecode
+        text = chunk.decode("latin-1")
+        base = pos
+        while True:
+            start = pos
+            reply_word = None
+            attrs = {}
+            tag = other = None
+            while pos < end:
+                first = buf[pos]
+                if first == 0:
+                    break
+                if first < 0x80:
+                    head, length = 1, first
+                elif first < 0xC0:
+                    if pos + 2 > end:
+                        return
+                    head, length = 2, (first & 0x3F) << 8 | buf[pos + 1]
+                else:
+                    head = determine_length(bytes((first,))) + 1
+                    if pos + head > end:
+                        return
+                    length = decode_length(bytes(buf[pos:pos + head]))
+                word = pos + head - base
+                pos += head + length
+                if pos > end:
+                    return
+                stop = pos - base
+                if reply_word is None:
+                    reply_word = text[word:stop]
+                elif buf[word + base] == EQUALS:
+                    split = text.find("=", word + 1, stop)
+                    if split < 0:
+                        # "=key" without a value; parse_word would fail on it too
+                        continue
+                    key = text[word + 1:split]
+                    value = text[split + 1:stop]
+                    if not exact:
+                        key, value = redecode(key), redecode(value)
+                    interned = keys.get(key)
+                    if interned is None:
+                        interned = add(keys, key, key)
+                    converted = values.get(value)
+                    if converted is None:
+                        converted = add(values, value, convert(value))
+                    attrs[interned] = converted
+                else:
+                    other = text[word:stop] if exact else redecode(text[word:stop])
+                    if other.startswith(".tag="):
+                        tag = other[5:]
+            if pos >= end:
+                return
+            pos += 1
+            self.start = pos
+            if reply_word is None:
+                continue
+            if reply_word == "!fatal":
+                raise FatalError(other)
+            yield reply_word, attrs, tag, pos - start
+
+    def read_reply(self, sock):
+        """Yield the sentences of one reply from a blocking socket, up to and including !done."""
+        while True:
+            for sentence in self.sentences():
+                yield sentence
+                if sentence[0] == "!done":
+                    return
+            self.recv(sock)
+
+
+def decoder(protocol):
+    """The Decoder of a librouteros connection, created on first use."""
+    found = _decoders.get(protocol)
+    if found is None:
+        found = _decoders[protocol] = Decoder(protocol.encoding)
+    return found
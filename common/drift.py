@@ -0,0 +1,163 @@
+"""
+drift.py
+- --drift checks live routers against the previously generated .tf without `terraform plan`:
+  the collectors fetch and render exactly as in a normal export, but instead of writing
+  files every rendered block is compared with the last export of the same directory.
+- The baseline is the export's record cache (.export_cache.json, see common.cache); where
+  there is none, the resource blocks of the generated .tf files are parsed and hashed.
+- Differences are keyed by resource address and written next to the .tf files:
+  drift.json (modified, renamed, removed, and new on the router) and drift_targets.txt, one
+  -target= per drifted resource Terraform manages, for a targeted plan or apply:
+      terraform plan $(cat drift_targets.txt)
+- Nothing else is written and terraform is never run; the cache keeps the last export.
+"""
+import json
+import os
+import re
+import threading
+
+from common.cache import content_hash
+
+DRIFT_FILE = "drift.json"
+TARGETS_FILE = "drift_targets.txt"
+SUMMARY_FILE = "drift_summary.json"
+RESOURCE_RE = re.compile(r'resource "([^"]+)" "([^"]+)" \{$')
+
+# Set from --drift by configure_drift()
+DRIFT = False
+
+_lock = threading.Lock()
+_drifted = {}  # out_dir -> counts, for the fleet summary
+
+
+def configure_drift(args):
+    """Apply the parsed --drift option."""
+    global DRIFT
+    DRIFT = args.drift
+
+
+def add_drift_arguments(parser):
+    """Add --drift to an importer's argument parser."""
+    parser.add_argument(
+        "--drift",
+        action="store_true",
+        help="compare the router with the last export instead of writing files; writes drift.json and "
+        "drift_targets.txt (-target= per drifted resource)",
+    )
+
+
+def _tf_files(out_dir, names=()):
+    """The .tf files of the last export: those it listed, or every .tf in out_dir."""
+    names = [name for name in names if name.endswith(".tf")]
+    if not names:
+        names = sorted(name for name in os.listdir(out_dir) if name.endswith(".tf"))
+    return [name for name in names if os.path.isfile(os.path.join(out_dir, name))]
+
+
+def parse_tf(out_dir, names=()):
+    """address -> (None, content hash) of every resource block in the generated .tf files.
+
+    Blocks are taken from their `resource` line to the closing `}` line, which is exactly
+    what the collectors render, so an unchanged resource hashes like its cache entry.
+    Files in a sub-directory belong to the child module of that name (--modules).
+    """
+    resources = {}
+    for name in _tf_files(out_dir, names):
+        module = os.path.dirname(name)
+        prefix = f"module.{module}." if module else ""
+        block = address = None
+        with open(os.path.join(out_dir, name)) as f:
+            for line in f:
+                if block is None:
+                    match = RESOURCE_RE.match(line)
+                    if match:
+                        address = f"{prefix}{match.group(1)}.{match.group(2)}"
+                        block = [line]
+                    continue
+                block.append(line)
+                if line == "}\n":
+                    resources[address] = (None, content_hash("".join(block)))
+                    block = None
+    return resources
+
+
+def baseline(cache, out_dir, names=()):
+    """The last export of out_dir: its record cache, else its parsed .tf files."""
+    return cache.previous or parse_tf(out_dir, names)
+
+
+def compare(previous, current):
+    """Addresses that differ between the last export and the router, by kind.
+
+    A resource whose name is derived from a changed property (a firewall rule's comment)
+    gets a new address for the same .id; with a record cache as baseline it is reported
+    as renamed rather than as removed plus new.
+    """
+    modified = []
+    for address, (rid, digest) in current.items():
+        if address not in previous:
+            continue
+        old_rid, old_digest = previous[address]
+        if old_digest != digest or (old_rid is not None and old_rid != rid):
+            modified.append(address)
+    removed = [a for a in previous if a not in current]
+    added = [a for a in current if a not in previous]
+    by_id = {previous[a][0]: a for a in removed if previous[a][0] is not None}
+    renamed = {by_id.pop(current[a][0]): a for a in added if current[a][0] in by_id}
+    return {
+        "modified": modified,
+        "renamed": renamed,
+        "removed": [a for a in removed if a not in renamed],
+        "added": [a for a in added if a not in renamed.values()],
+    }
+
+
+def report(out_dir, cache, names=()):
+    """Compare a collector's rendered records with its last export and write the drift files.
+
+    names are the files the last export wrote (its manifest), if known.
+    """
+    previous = baseline(cache, out_dir, names)
+    if not previous:
+        print(f"⚠️ No previous export in {out_dir} to check for drift; run a normal export first")
+        return None
+    changes = compare(previous, cache.current)
+    write(out_dir, changes)
+    return changes
+
+
+def write(out_dir, changes):
+    """drift.json and drift_targets.txt; targets cover the addresses Terraform manages (not the new ones)."""
+    targets = [f"-target={address}" for address in [*changes["modified"], *changes["renamed"], *changes["removed"]]]
+    with open(os.path.join(out_dir, DRIFT_FILE), "w") as f:
+        json.dump(changes, f, indent=2)
+        f.write("\n")
+    with open(os.path.join(out_dir, TARGETS_FILE), "w") as f:
+        f.write("".join(target + "\n" for target in targets))
+    counts = {kind: len(addresses) for kind, addresses in changes.items()}
+    if any(counts.values()):
+        with _lock:
+            _drifted[out_dir] = counts
+        print(
+            f"🧭 Drift in {out_dir}: {counts['modified']} modified, {counts['renamed']} renamed, "
+            f"{counts['removed']} removed, {counts['added']} new on the router ({len(targets)} targets in {TARGETS_FILE})"
+        )
+    else:
+        print(f"🧭 No drift in {out_dir}")
+
+
+def clear(out_dir):
+    """Reset the drift files under out_dir (a router found unchanged since its last export)."""
+    for root, _, names in os.walk(out_dir):
+        if DRIFT_FILE in names:
+            write(root, {"modified": [], "renamed": {}, "removed": [], "added": []})
+
+
+def write_summary(out_root):
+    """<out_root>/drift_summary.json: drift counts of every directory that drifted in this run."""
+    with _lock:
+        drifted = dict(sorted(_drifted.items()))
+    with open(os.path.join(out_root, SUMMARY_FILE), "w") as f:
+        json.dump(drifted, f, indent=2)
+        f.write("\n")
+    print(f"🧭 {len(drifted)} directories drifted ({os.path.join(out_root, SUMMARY_FILE)})")
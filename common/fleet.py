@@ -0,0 +1,132 @@
+"""
+fleet.py
+- Reads an inventory of routers (CSV or JSON) with their API credentials.
+- Runs an importer's connect + build + write pipeline against every router
+  with a bounded worker pool, one output directory per router.
+- A router that is slow, unreachable or fails mid-export only fails its own job.
+- With --skip-unchanged a cheap probe (common.probe) runs first, and routers whose
+  configuration did not change since their last export keep their previous files
+  (and, with --drift, are reported without drift).
+"""
+import csv
+import json
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import partial
+
+from common import aioclient, drift, metrics, probe, profiling, snapshot
+from common.session import RouterSession
+
+DEFAULT_WORKERS = 8
+DEFAULT_OUT_DIR = "fleet"
+
+
+def load_inventory(path, user=None, password=None, port=8728):
+    """Load routers from a CSV (host,user,password,port,name) or JSON list of objects.
+
+    Missing user/password/port columns fall back to the importer's defaults.
+    Blank lines and lines starting with '#' are ignored in CSV files.
+    """
+    with open(path, newline="") as f:
+        if path.endswith(".json"):
+            rows = json.load(f)
+        else:
+            lines = [line for line in f if line.strip() and not line.lstrip().startswith("#")]
+            rows = list(csv.DictReader(lines))
+
+    routers = []
+    for row in rows:
+        host = (row.get("host") or "").strip()
+        if not host:
+            continue
+        routers.append({
+            "host": host,
+            "user": row.get("user") or user,
+            "password": row.get("password") or password,
+            "port": int(row.get("port") or port),
+            "name": row.get("name") or host,
+        })
+    return routers
+
+
+def router_dir(out_root, router):
+    """Output directory for one router, safe to use as a path component."""
+    return os.path.join(out_root, re.sub(r"[^A-Za-z0-9_.-]", "_", router["name"]))
+
+
+def export_host(router, connect, export, out_root, skip_unchanged=False):
+    """Connect to one router and run the export into its own directory. Never raises.
+
+    Returns (router, error, elapsed, skipped).
+    """
+    out_dir = router_dir(out_root, router)
+    os.makedirs(out_dir, exist_ok=True)
+    start = time.monotonic()
+    metrics.begin(router["name"])
+    try:
+        with profiling.profiled(out_dir):
+            connect_router = snapshot.with_snapshots(
+                partial(connect, router["host"], router["user"], router["password"], router["port"]), out_dir
+            )
+            with metrics.stage("connect", host=router["host"]):
+                api = RouterSession(connect_router())
+            try:
+                fingerprint = None
+                if skip_unchanged:
+                    with metrics.stage("probe"):
+                        same, fingerprint = probe.unchanged(api, out_dir, getattr(export, "keywords", None))
+                    if same:
+                        if drift.DRIFT:
+                            drift.clear(out_dir)
+                        return router, None, time.monotonic() - start, True
+                export(api, out_dir)
+                if not drift.DRIFT:
+                    probe.remember(out_dir, fingerprint)
+            finally:
+                api.close()
+        return router, None, time.monotonic() - start, False
+    except (Exception, SystemExit) as e:
+        # connect_mikrotik() in some importers calls sys.exit() on failure
+        metrics.current().fail(e)
+        return router, e, time.monotonic() - start, False
+
+
+def run_fleet(routers, connect, export, workers=DEFAULT_WORKERS, out_root=DEFAULT_OUT_DIR, skip_unchanged=False):
+    """Export every router concurrently. Returns the list of (router, error) that failed."""
+    print(f"🚚 Fleet mode: {len(routers)} routers, {workers} workers, output in {out_root}/")
+    connect = aioclient.connector(connect)
+    failures = []
+    unchanged = 0
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        jobs = [pool.submit(export_host, r, connect, export, out_root, skip_unchanged) for r in routers]
+        for job in as_completed(jobs):
+            router, error, elapsed, skipped = job.result()
+            if skipped:
+                print(f"💤 {router['name']} unchanged since its last export ({elapsed:.1f}s), keeping previous files")
+                unchanged += 1
+            elif error is None:
+                print(f"✅ {router['name']} exported in {elapsed:.1f}s")
+            else:
+                print(f"❌ {router['name']} failed after {elapsed:.1f}s: {error!r}")
+                failures.append((router, error))
+    print(f"🎉 Fleet done: {len(routers) - len(failures)} ok ({unchanged} unchanged), {len(failures)} failed")
+    if drift.DRIFT:
+        drift.write_summary(out_root)
+    metrics.write_report()
+    return failures
+
+
+def add_fleet_arguments(parser):
+    """Add --inventory/--workers/--out-dir/--skip-unchanged to an importer's argument parser."""
+    group = parser.add_argument_group("fleet mode")
+    group.add_argument("--inventory", help="CSV or JSON file of routers to export instead of the built-in HOST")
+    group.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="concurrent routers (default: %(default)s)")
+    group.add_argument("--out-dir", default=DEFAULT_OUT_DIR, help="root of the per-router output directories (default: %(default)s)")
+    group.add_argument(
+        "--skip-unchanged",
+        action="store_true",
+        help="probe /system/history first and keep the previous output of routers that did not change",
+    )
+    return group
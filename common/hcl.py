@@ -0,0 +1,237 @@
+"""
+hcl.py
+- The HCL emitter every importer renders its resource blocks with.
+- A Template is prepared once per resource type: the block header and the `  attr = `
+  prefix of every attribute are built up front, so rendering a record only looks up and
+  joins its values.
+- RouterOS repeats the same few values ("true", "1500", "ether1") across thousands of
+  records, so whether a value is rendered bare or quoted is decided once per value and
+  remembered; quoting only escapes values that need it.
+- Name sanitizing uses a precompiled pattern.
+
+Two renderings: string() quotes everything but booleans (the importers' historical output for
+most resources); literal() leaves booleans and numbers bare and quotes everything else. A
+Reference is always rendered bare, and a tuple as a list of strings. Python booleans are bare
+`true`/`false` in either rendering, as the provider rejects "True"/"False".
+
+A Template can also give a record as a row (Template.row): the writer either renders it as
+its own block or, with --for-each, adds its values to the JSON data of one `for_each` resource
+for the whole collection (Template.each).
+"""
+import re
+
+NAME_RE = re.compile(r"[^A-Za-z0-9_]")
+NUMBER_RE = re.compile(r"-?[0-9]+(?:\.[0-9]+)?\Z")
+# Values omitted from a block unless a template is given its own skip set
+EMPTY = frozenset((None, ""))
+# ... and additionally False (and 0)
+FALSY = EMPTY | {False}
+# Remembered renderings are dropped past this many, so a run over unique comments stays bounded
+CACHE_LIMIT = 200_000
+
+
+class Reference(str):
+    """An expression rendered as is, e.g. routeros_interface_bridge.bridge1.name (see common.refs).
+
+    value is the plain name it stands for, used where no expression can go (for_each data).
+    """
+
+    def __new__(cls, expression, value=None):
+        ref = super().__new__(cls, expression)
+        ref.value = value
+        return ref
+
+
+def _quote(value):
+    s = str(value)
+    if "\\" in s or '"' in s:
+        s = s.replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{s}"'
+
+
+def _literal(value):
+    if value is True or value is False:
+        return "true" if value else "false"
+    s = str(value)
+    lowered = s.lower()
+    if lowered in ("true", "false"):
+        return lowered
+    if NUMBER_RE.match(s):
+        return s
+    return _quote(s)
+
+
+class _Literals(dict):
+    """str value -> literal(), decided on first use.
+
+    Only str keys go in: True == 1 would otherwise share a slot.
+    """
+
+    def __missing__(self, value):
+        if len(self) >= CACHE_LIMIT:
+            self.clear()
+        rendered = self[value] = _literal(value)
+        return rendered
+
+
+_literals = _Literals()
+
+
+def string(value):
+    """A value as a quoted HCL string; booleans stay bare."""
+    if value.__class__ is str and '"' not in value and "\\" not in value:
+        return f'"{value}"'
+    if value is True or value is False:
+        return "true" if value else "false"
+    return _quote(value)
+
+
+def literal(value):
+    """A value as HCL: booleans and numbers bare, anything else a quoted string."""
+    return _literals[value] if value.__class__ is str else _literal(value)
+
+
+def attribute_name(key):
+    """A RouterOS property as a Terraform attribute name (dst-address -> dst_address)."""
+    return key.replace("-", "_")
+
+
+def sanitize(name, replacement="_"):
+    """Replace everything but letters, digits and underscores."""
+    return NAME_RE.sub(replacement, name)
+
+
+class Template:
+    """Renders `resource` blocks of one type.
+
+    With keys, only those properties are rendered, in that order, with missing ones taken
+    from defaults; without, every property of the record except the ones starting with "."
+    (.id, .nextid). Values in skip are left out. Properties in typed (or all, with typed=True)
+    are rendered with literal(), the rest with string().
+
+    Rows of a template with each_key are always written as one for_each resource per
+    collection, keyed by that property (e.g. an address-list entry's address).
+
+    Booleans are bare whether typed or not (python3 -m doctest common/hcl.py):
+
+    >>> print(Template("routeros_ip_firewall_filter", ["log", "mtu", "tagged"], typed=("mtu",))
+    ...       .render("rule", {"log": False, "mtu": 1500, "tagged": ("ether1", True)}), end="")
+    resource "routeros_ip_firewall_filter" "rule" {
+      log = false
+      mtu = 1500
+      tagged = ["ether1", true]
+    }
+    >>> Template("routeros_ip_firewall_filter", ["log"]).values({"log": True})
+    {'log': True}
+    """
+
+    def __init__(self, resource_type, keys=None, typed=(), skip=EMPTY, defaults=None, each_key=None):
+        self.resource_type = resource_type
+        self.head = f'resource "{resource_type}" "'
+        self.typed = typed
+        self.skip = skip
+        self.each_key = each_key
+        self.fields = {}
+        self.keys = None
+        if keys is not None:
+            defaults = defaults or {}
+            self.keys = [(key, defaults.get(key), *self._field(key)) for key in keys]
+            self.attributes = [(key, defaults.get(key), attribute_name(key), typed) for key, _, _, typed in self.keys
+                               if key != each_key]
+
+    def _field(self, key):
+        """(prefix, typed) of one property."""
+        field = self.fields[key] = (f"  {attribute_name(key)} = ", self.typed is True or key in self.typed)
+        return field
+
+    def render(self, name, record):
+        """The block for one record, ending in a newline."""
+        if self.keys is not None:
+            get = record.get
+            values = [(get(key, default), prefix, typed) for key, default, prefix, typed in self.keys]
+        else:
+            known = self.fields
+            values = [(value, *(known.get(key) or self._field(key))) for key, value in record.items()
+                      if key[0] != "."]
+        skip = self.skip
+        lines = [f'{self.head}{name}" {{']
+        append = lines.append
+        for value, prefix, typed in values:
+            if value in skip:
+                continue
+            if value.__class__ is str:
+                if typed:
+                    append(prefix + _literals[value])
+                elif '"' in value or "\\" in value:
+                    append(prefix + _quote(value))
+                else:
+                    append(f'{prefix}"{value}"')
+            elif value.__class__ is Reference:
+                append(prefix + value)
+            elif value.__class__ is tuple:
+                append(f"{prefix}[{', '.join(map(string, value))}]")
+            elif value is True or value is False:
+                # librouteros parses "true"/"false" (and numbers) already
+                append(prefix + ("true" if value else "false"))
+            elif not typed:
+                append(prefix + _quote(value))
+            else:
+                append(prefix + _literal(value))
+        append("}\n")
+        return "\n".join(lines)
+
+    def row(self, name, record):
+        """record as a Row of this template (templates with keys only); name is the key with each_key."""
+        return Row(self, name, record)
+
+    def values(self, record):
+        """The attributes render() would write for record, as JSON values.
+
+        Booleans and typed numbers stay JSON booleans and numbers, a tuple becomes a list and a
+        Reference is replaced by the name it stands for.
+        """
+        get = record.get
+        skip = self.skip
+        values = {}
+        for key, default, attribute, typed in self.attributes:
+            value = get(key, default)
+            if value in skip:
+                continue
+            if value.__class__ is Reference:
+                value = value.value
+            elif value.__class__ not in (str, tuple, bool) and not (typed and value.__class__ in (int, float)):
+                value = str(value)
+            values[attribute] = value
+        return values
+
+    def each(self, name, source):
+        """One `resource` block with for_each over the JSON object in the file source."""
+        lines = [f'{self.head}{name}" {{', f'  for_each = jsondecode(file("${{path.module}}/{source}"))']
+        if self.each_key:
+            lines.append(f"  {attribute_name(self.each_key)} = each.key")
+        lines.extend(f'  {attribute} = lookup(each.value, "{attribute}", null)'
+                     for _, _, attribute, _ in self.attributes)
+        lines.append("}\n")
+        return "\n".join(lines)
+
+
+class Row:
+    """One record of a Template, rendered by the writer as a block or a for_each entry."""
+
+    __slots__ = ("template", "name", "record")
+
+    def __init__(self, template, name, record):
+        self.template = template
+        self.name = name
+        self.record = record
+
+    def render(self):
+        return self.template.render(self.name, self.record)
+
+    def values(self):
+        return self.template.values(self.record)
+
+
+def resource(resource_type, name, attrs, typed=(), skip=EMPTY):
+    """One-off `resource` block; see Template."""
+    return Template(resource_type, typed=typed, skip=skip).render(name, attrs)
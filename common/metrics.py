@@ -0,0 +1,183 @@
+"""
+metrics.py
+- Structured timing and volume metrics for every export run: connect, each path fetch,
+  rendering, file writes and Terraform execution, per router.
+- Path fetches come from the session's FetchStats (records, bytes on the wire, read time,
+  traps, dynamic entries filtered by the router); stages are timed with stage().
+- --metrics writes a JSON report and --prometheus a node_exporter textfile at the end of the run.
+
+Each fleet worker thread exports one router at a time, so the router a stage belongs to
+is tracked per thread; single-router runs report as "local".
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Set from --metrics / --prometheus by configure_metrics()
+METRICS_FILE = None
+PROMETHEUS_FILE = None
+PREFIX = "mikrotik_export"
+
+_routers = {}
+_lock = threading.Lock()
+_local = threading.local()
+
+
+def enabled():
+    return bool(METRICS_FILE or PROMETHEUS_FILE)
+
+
+def configure_metrics(args):
+    """Apply the parsed --metrics/--prometheus options."""
+    global METRICS_FILE, PROMETHEUS_FILE
+    METRICS_FILE = args.metrics
+    PROMETHEUS_FILE = args.prometheus
+
+
+def add_metrics_arguments(parser):
+    """Add --metrics/--prometheus to an importer's argument parser."""
+    group = parser.add_argument_group("metrics")
+    group.add_argument("--metrics", metavar="FILE", help="write per-router stage and path metrics as JSON")
+    group.add_argument("--prometheus", metavar="FILE", help="write the same metrics as a Prometheus textfile (.prom)")
+    return group
+
+
+class RouterMetrics:
+    """Stages and path fetches of one router."""
+
+    def __init__(self, name):
+        self.name = name
+        self.started = time.time()
+        self.stages = []
+        self.stats = None  # FetchStats of the router's session
+        self.ok = True
+        self.error = None
+
+    def add_stage(self, stage, seconds, **fields):
+        with _lock:
+            self.stages.append({"stage": stage, "seconds": round(seconds, 6), **fields})
+
+    def fail(self, error):
+        self.ok = False
+        self.error = repr(error)
+
+    def to_dict(self):
+        totals = {}
+        for s in self.stages:
+            totals[s["stage"]] = round(totals.get(s["stage"], 0.0) + s["seconds"], 6)
+        paths = {}
+        if self.stats is not None:
+            with self.stats.lock:
+                paths = {p: dict(v, seconds=round(v["seconds"], 6)) for p, v in self.stats.paths.items()}
+        return {
+            "started": self.started,
+            "ok": self.ok,
+            "error": self.error,
+            "stage_seconds": totals,
+            "stages": self.stages,
+            "paths": paths,
+        }
+
+
+def begin(name, stats=None):
+    """Start collecting metrics for a router in the calling thread."""
+    router = RouterMetrics(name)
+    router.stats = stats
+    with _lock:
+        _routers[name] = router
+    _local.current = router
+    return router
+
+
+def current():
+    """Metrics of the router exported by the calling thread."""
+    router = getattr(_local, "current", None)
+    if router is None:
+        with _lock:
+            router = _routers.get("local")
+        router = router or begin("local")
+        _local.current = router
+    return router
+
+
+def attach(stats):
+    """Use a session's FetchStats as the path metrics of the current router."""
+    current().stats = stats
+
+
+@contextmanager
+def stage(name, **fields):
+    """Time a stage of the current router; exceptions are counted as errors and re-raised."""
+    router = current()
+    start = time.monotonic()
+    try:
+        yield fields
+    except BaseException as e:
+        fields["errors"] = fields.get("errors", 0) + 1
+        fields["error"] = repr(e)
+        raise
+    finally:
+        router.add_stage(name, time.monotonic() - start, **fields)
+
+
+def report():
+    with _lock:
+        routers = dict(_routers)
+    return {"generated": time.time(), "routers": {name: r.to_dict() for name, r in routers.items()}}
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def prometheus_text(data):
+    """The report in the Prometheus text exposition format."""
+    lines = []
+
+    def metric(name, kind, help_text, samples):
+        lines.append(f"# HELP {PREFIX}_{name} {help_text}")
+        lines.append(f"# TYPE {PREFIX}_{name} {kind}")
+        for labels, value in samples:
+            rendered = ",".join(f'{k}="{_label(v)}"' for k, v in labels.items())
+            lines.append(f"{PREFIX}_{name}{{{rendered}}} {value}")
+
+    routers = data["routers"]
+    metric("success", "gauge", "1 if the last export of the router succeeded.",
+           [({"router": n}, int(r["ok"])) for n, r in routers.items()])
+    metric("last_run_timestamp_seconds", "gauge", "Start of the last export.",
+           [({"router": n}, r["started"]) for n, r in routers.items()])
+    metric("stage_seconds", "gauge", "Time spent per stage.",
+           [({"router": n, "stage": s}, v) for n, r in routers.items() for s, v in r["stage_seconds"].items()])
+    metric("bytes_written", "gauge", "Bytes of generated files.",
+           [({"router": n}, sum(s.get("bytes_written", 0) for s in r["stages"])) for n, r in routers.items()])
+    for key, kind, help_text in (
+        ("seconds", "gauge", "Time spent reading the path from the router."),
+        ("records", "gauge", "Records fetched from the path."),
+        ("bytes", "gauge", "Reply bytes on the wire for the path."),
+        ("dynamic_filtered", "gauge", "Dynamic entries filtered out of the path."),
+        ("errors", "gauge", "Traps returned for the path."),
+    ):
+        metric(f"path_{key}", kind, help_text,
+               [({"router": n, "path": p}, v[key]) for n, r in routers.items() for p, v in r["paths"].items()])
+    return "\n".join(lines) + "\n"
+
+
+def write_report():
+    """Write the JSON report and/or the Prometheus textfile, if asked for."""
+    if not enabled():
+        return
+    data = report()
+    if METRICS_FILE:
+        with open(METRICS_FILE, "w") as f:
+            json.dump(data, f, indent=2)
+            f.write("\n")
+        print(f"📈 Metrics written to {METRICS_FILE}")
+    if PROMETHEUS_FILE:
+        # node_exporter may read the file at any time: write it under another name and rename
+        tmp = PROMETHEUS_FILE + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(prometheus_text(data))
+        os.replace(tmp, PROMETHEUS_FILE)
+        print(f"📈 Prometheus metrics written to {PROMETHEUS_FILE}")
@@ -0,0 +1,126 @@
+"""
+probe.py
+- A cheap "has anything changed?" check run before a full export.
+- The fingerprint is a digest of /system/history (the router's undo history, which gets
+  a new entry for every configuration change) and the installed package versions
+  (an upgrade changes defaults and therefore the export).
+- Fingerprints are stored per output directory and importer, and only after an export
+  succeeded; a router whose fingerprint still matches keeps its previous files.
+- Everything else that changes what an export writes is part of the fingerprint, so an
+  unchanged router is still re-exported after a change to any of it: the output layout
+  (--shard, --max-blocks, --modules, --for-each), the importer's own options (--import-script,
+  --only, --no-merge-vlans, ...), the state the imports are checked against (--state, the
+  directory's terraform.tfstate and import journal) and the exporter code itself.
+
+Routers whose /system/history cannot be read, or is empty after a reboot, always get
+a full export; so does every router with --terraform-show, whose remote state cannot be
+checked for changes without running terraform.
+"""
+import functools
+import hashlib
+import json
+import os
+import sys
+
+from common import tfimport, writer
+from common.query import select
+from common.tfstate import JOURNAL_FILE
+
+PROBE_FILE = ".export_probe.json"
+# (path, proplist) of the small paths the fingerprint is taken over
+PROBE_PATHS = [
+    ("/system/history", None),
+    ("/system/package", [".id", "name", "version", "disabled"]),
+]
+# The exporter's code: the importer scripts and common/, hashed once per run
+CODE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def fingerprint(api, out_dir=".", options=None):
+    """Digest of the probe paths and the export settings, or None if the router cannot be probed.
+
+    options are the importer's own export options (the keywords its export function is called with).
+    """
+    if tfimport.TERRAFORM_SHOW:
+        return None
+    digest = hashlib.sha1()
+    for path, proplist in PROBE_PATHS:
+        try:
+            entries = select(api, path, proplist)
+        except Exception:
+            return None
+        if path == "/system/history" and not entries:
+            # an empty history (fresh boot) cannot tell changes apart
+            return None
+        digest.update(json.dumps([path, entries], sort_keys=True, default=str).encode())
+    digest.update(json.dumps(["settings", _settings(out_dir, options)], sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+
+def _settings(out_dir, options):
+    """Everything besides the router's configuration that changes what an export writes."""
+    state = [tfimport.STATE_PATH or os.path.join(out_dir, "terraform.tfstate"), os.path.join(out_dir, JOURNAL_FILE)]
+    return {
+        "layout": {"shard": writer.SHARD, "max_blocks": writer.MAX_BLOCKS, "modules": writer.MODULES,
+                   "for_each": writer.FOR_EACH},
+        "options": options or {},
+        "state": {path: _stat(path) for path in state},
+        "code": code_stamp(),
+    }
+
+
+def _stat(path):
+    """(size, mtime) of a file, or None if it does not exist."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+
+@functools.lru_cache(maxsize=None)
+def code_stamp():
+    """Digest of the exporter's Python files, so an upgraded exporter re-exports every router."""
+    digest = hashlib.sha1()
+    # Importers live one level down (routes/, firewall/, ...), so output trees are not walked
+    tops = [""] + sorted(d for d in os.listdir(CODE_ROOT) if os.path.isdir(os.path.join(CODE_ROOT, d))
+                         and not d.startswith((".", "_")) and d != "bench")
+    for top in tops:
+        for name in sorted(os.listdir(os.path.join(CODE_ROOT, top))):
+            if name.endswith(".py"):
+                path = os.path.join(top, name)
+                digest.update(path.encode())
+                with open(os.path.join(CODE_ROOT, path), "rb") as f:
+                    digest.update(f.read())
+    return digest.hexdigest()
+
+
+def _importer():
+    return os.path.basename(sys.argv[0])
+
+
+def _load(out_dir):
+    try:
+        with open(os.path.join(out_dir, PROBE_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def unchanged(api, out_dir, options=None):
+    """Probe the router; returns (unchanged since the last export, fingerprint)."""
+    current = fingerprint(api, out_dir, options)
+    if current is None:
+        return False, None
+    return _load(out_dir).get(_importer()) == current, current
+
+
+def remember(out_dir, current):
+    """Store the fingerprint of a successful export."""
+    if current is None:
+        return
+    probes = _load(out_dir)
+    probes[_importer()] = current
+    with open(os.path.join(out_dir, PROBE_FILE), "w") as f:
+        json.dump(probes, f, indent=2)
+        f.write("\n")
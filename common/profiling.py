@@ -0,0 +1,108 @@
+"""
+profiling.py
+- --profile runs an export under cProfile and tracemalloc and writes the results next to
+  the generated .tf files: profile.pstats (load with pstats or snakeviz), profile.tracemalloc
+  (a tracemalloc.Snapshot dump) and profile.txt, a plain-text summary of both.
+- In fleet mode every router is profiled in its own worker thread and output directory.
+
+tracemalloc is process-wide, so with several workers a router's snapshot also holds what the
+other workers allocated at the time; use --workers 1 for clean per-router allocations.
+Python 3.12+ allows only one active cProfile at a time: with several workers, routers that
+cannot get the profiler are exported unprofiled (with a warning).
+"""
+import cProfile
+import io
+import os
+import pstats
+import threading
+import tracemalloc
+from contextlib import contextmanager
+
+# Set from --profile by configure_profile()
+PROFILE = False
+PSTATS_FILE = "profile.pstats"
+SNAPSHOT_FILE = "profile.tracemalloc"
+SUMMARY_FILE = "profile.txt"
+# Lines of the text summary
+TOP = 30
+
+_lock = threading.Lock()
+_tracing = 0
+
+
+def configure_profile(args):
+    """Apply the parsed --profile option."""
+    global PROFILE
+    PROFILE = args.profile
+
+
+def add_profile_arguments(parser):
+    """Add --profile to an importer's argument parser."""
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="run under cProfile and tracemalloc; writes profile.pstats/.tracemalloc/.txt next to the .tf files",
+    )
+
+
+def _start_tracing():
+    global _tracing
+    with _lock:
+        if _tracing == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        _tracing += 1
+
+
+def _stop_tracing():
+    global _tracing
+    with _lock:
+        _tracing -= 1
+        if _tracing == 0:
+            tracemalloc.stop()
+
+
+def summary(stats, snapshot, peak):
+    """Top functions by cumulative time and top allocation sites, as text."""
+    out = io.StringIO()
+    if stats is not None:
+        out.write(f"# cProfile: top {TOP} by cumulative time\n")
+        stats.stream = out
+        stats.sort_stats("cumulative").print_stats(TOP)
+    out.write(f"# tracemalloc: peak {peak / 1024 / 1024:.1f} MiB, top {TOP} live allocation sites at the end\n")
+    for stat in snapshot.statistics("lineno")[:TOP]:
+        out.write(f"{stat}\n")
+    return out.getvalue()
+
+
+@contextmanager
+def profiled(out_dir="."):
+    """Profile the enclosed block into out_dir if --profile is set."""
+    if not PROFILE:
+        yield
+        return
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError as e:
+        # another thread holds the profiler (Python 3.12+)
+        print(f"⚠️ cProfile unavailable for {out_dir} ({e}), recording allocations only")
+        profiler = None
+    _start_tracing()
+    tracemalloc.reset_peak()
+    try:
+        yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        _stop_tracing()
+        os.makedirs(out_dir, exist_ok=True)
+        stats = None
+        if profiler is not None:
+            profiler.dump_stats(os.path.join(out_dir, PSTATS_FILE))
+            stats = pstats.Stats(profiler)
+        snapshot.dump(os.path.join(out_dir, SNAPSHOT_FILE))
+        with open(os.path.join(out_dir, SUMMARY_FILE), "w") as f:
+            f.write(summary(stats, snapshot, peak))
+        print(f"🔬 Profile written to {os.path.join(out_dir, SUMMARY_FILE)} (+ {PSTATS_FILE}, {SNAPSHOT_FILE})")
@@ -0,0 +1,205 @@
+"""
+query.py
+- Prints RouterOS paths with the filtering pushed down to the router: dynamic entries are
+  dropped by an API query and only the properties a resource emits are requested (.proplist).
+- Counts the records and reply bytes of every print, so the savings are visible per path.
+- iter_select() streams a print record by record for tables too large to hold in memory.
+- read_prints() pipelines several prints over one connection, tagged, in a single round trip.
+- FetchStats also keeps the time spent reading each path, traps, and (with --metrics) how
+  many dynamic entries the router filtered out, for common.metrics.
+- Replies are decoded by common.decoder from a per-connection receive buffer.
+"""
+import threading
+import time
+
+from librouteros.exceptions import MultiTrapError, TrapError
+
+from common.decoder import decoder
+
+# Entries that are not dynamic: dynamic=false, or no dynamic property at all
+NOT_DYNAMIC = ("?dynamic=false", "?-dynamic", "?#|")
+
+
+def path_key(path):
+    """Normalize 'interface/bridge', '/interface/bridge' and '/interface/bridge/print'."""
+    path = "/" + "/".join(p for p in str(path).split("/") if p)
+    if path.endswith("/print"):
+        path = path[: -len("/print")]
+    return path
+
+
+def print_words(proplist=None, exclude_dynamic=False):
+    """API words for a print with an optional property list and dynamic filter."""
+    words = []
+    if proplist:
+        words.append("=.proplist=" + ",".join(proplist))
+    if exclude_dynamic:
+        words.extend(NOT_DYNAMIC)
+    return words
+
+
+def is_dynamic(entry):
+    """librouteros parses dynamic=true to True; older code compared against 'true'."""
+    return entry.get("dynamic") in (True, "true", "yes")
+
+
+def read_print(api, path, words=(), stats=None):
+    """Send one print and yield its records as they are read, counting reply bytes.
+
+    The whole reply is always read up to !done, so the connection stays usable even if
+    the router returns a trap or the caller stops before the last record. Only the time
+    spent reading counts as fetch time, not the time the caller spends between records.
+    Clients with their own reader (common.aioclient) provide read_print() themselves.
+    """
+    if hasattr(api, "read_print"):
+        yield from api.read_print(path, words, stats)
+        return
+    protocol = api.protocol
+    sock = protocol.transport.sock
+    started = time.monotonic()
+    protocol.writeSentence(path_key(path) + "/print", *words)
+    records = 0
+    nbytes = 0
+    seconds = 0.0
+    traps = []
+    reply = decoder(protocol).read_reply(sock)
+    try:
+        for reply_word, entry, _, size in reply:
+            nbytes += size
+            if reply_word == "!trap":
+                traps.append(TrapError(**entry))
+            elif reply_word == "!re":
+                records += 1
+                seconds += time.monotonic() - started
+                yield entry
+                started = time.monotonic()
+    finally:
+        # A caller that stops early (closed generator, exception while consuming) would leave
+        # the rest of the reply on the socket for the next command to read as its own.
+        for _ in reply:
+            pass
+    seconds += time.monotonic() - started
+    if stats is not None:
+        dynamic = None
+        if stats.count_dynamic and not traps and NOT_DYNAMIC[0] in words:
+            dynamic = count_dynamic(api, path)
+        stats.add(path, records, nbytes, seconds, errors=len(traps), dynamic=dynamic)
+    if len(traps) > 1:
+        raise MultiTrapError(*traps)
+    if traps:
+        raise traps[0]
+
+
+def read_prints(api, prints, stats=None):
+    """Send several (path, words) prints at once, tagged, and read their interleaved replies.
+
+    Returns the entries of each print, or the trap it raised, in order (like
+    common.aioclient's select_many()), after one round trip instead of one per print.
+    """
+    protocol = api.protocol
+    sock = protocol.transport.sock
+    reader = decoder(protocol)
+    started = time.monotonic()
+    for tag, (path, words) in enumerate(prints):
+        protocol.writeSentence(path_key(path) + "/print", *words, f".tag={tag}")
+    replies = [{"entries": [], "traps": [], "bytes": 0, "seconds": 0.0} for _ in prints]
+    pending = len(prints)
+    while pending:
+        for reply_word, entry, tag, size in reader.sentences():
+            reply = replies[int(tag)]
+            reply["bytes"] += size
+            if reply_word == "!re":
+                reply["entries"].append(entry)
+            elif reply_word == "!trap":
+                reply["traps"].append(TrapError(**entry))
+            elif reply_word == "!done":
+                reply["seconds"] = time.monotonic() - started
+                pending -= 1
+        if pending:
+            reader.recv(sock)
+    results = []
+    for (path, words), reply in zip(prints, replies):
+        traps = reply["traps"]
+        if stats is not None:
+            dynamic = None
+            if stats.count_dynamic and not traps and NOT_DYNAMIC[0] in words:
+                dynamic = count_dynamic(api, path)
+            stats.add(path, len(reply["entries"]), reply["bytes"], reply["seconds"], errors=len(traps),
+                      dynamic=dynamic)
+        if len(traps) > 1:
+            results.append(MultiTrapError(*traps))
+        elif traps:
+            results.append(traps[0])
+        else:
+            results.append(reply["entries"])
+    return results
+
+
+def count_dynamic(api, path):
+    """Number of dynamic entries of a path, from a single count-only reply (None if unsupported)."""
+    protocol = api.protocol
+    protocol.writeSentence(path_key(path) + "/print", "=count-only=", "?dynamic=true")
+    count = None
+    for _, entry, _, _ in decoder(protocol).read_reply(protocol.transport.sock):
+        if "ret" in entry:
+            count = int(entry["ret"])
+    return count
+
+
+class FetchStats:
+    """Records, reply bytes, read time, traps and filtered dynamic entries per path."""
+
+    def __init__(self, count_dynamic=False):
+        self.paths = {}
+        self.count_dynamic = count_dynamic
+        self.lock = threading.Lock()
+
+    def _totals(self, path):
+        return self.paths.setdefault(
+            path_key(path), {"records": 0, "bytes": 0, "seconds": 0.0, "errors": 0, "dynamic_filtered": 0}
+        )
+
+    def add(self, path, records, nbytes, seconds=0.0, errors=0, dynamic=None):
+        with self.lock:
+            totals = self._totals(path)
+            totals["records"] += records
+            totals["bytes"] += nbytes
+            totals["seconds"] += seconds
+            totals["errors"] += errors
+            totals["dynamic_filtered"] += dynamic or 0
+        print(f"📦 {path_key(path)}: {records} records, {nbytes} bytes")
+
+    def filtered(self, path, dynamic):
+        """Dynamic entries dropped locally from a cached print."""
+        if dynamic:
+            with self.lock:
+                self._totals(path)["dynamic_filtered"] += dynamic
+
+    def fetch_seconds(self):
+        with self.lock:
+            return sum(p["seconds"] for p in self.paths.values())
+
+    def report(self):
+        total_records = sum(p["records"] for p in self.paths.values())
+        total_bytes = sum(p["bytes"] for p in self.paths.values())
+        print(f"📊 {len(self.paths)} paths, {total_records} records, {total_bytes} bytes on the wire")
+
+
+def select(api, path, proplist=None, exclude_dynamic=False):
+    """Entries of a path with the dynamic filter and property list applied by the router.
+
+    Goes through the session cache when api is a RouterSession.
+    """
+    if hasattr(api, "select"):
+        return api.select(path, proplist, exclude_dynamic)
+    return list(read_print(api, path, print_words(proplist, exclude_dynamic), FetchStats()))
+
+
+def iter_select(api, path, proplist=None, exclude_dynamic=False):
+    """Like select(), but yields records as they arrive instead of building a list.
+
+    The generator must be exhausted before the next command is sent on the same connection.
+    """
+    if hasattr(api, "iter_select"):
+        return api.iter_select(path, proplist, exclude_dynamic)
+    return read_print(api, path, print_words(proplist, exclude_dynamic), FetchStats())
@@ -0,0 +1,56 @@
+"""
+refs.py
+- A symbol table from RouterOS object names to the addresses of the resources generated for
+  them, so an attribute naming another object (a bridge port's bridge, a WireGuard peer's
+  interface, a list member's list) is rendered as a reference,
+  `bridge = routeros_interface_bridge.bridge1.name`, and Terraform orders (and
+  parallelizes) applies by the real dependencies.
+- One table per Terraform root, i.e. per collector output directory: only objects exported
+  into the same root can be referenced; anything else stays a string literal.
+- With --modules every section is its own child module, so a reference is only made between
+  resources of the same section.
+"""
+from common import writer
+from common.hcl import Reference
+
+# Kinds of names: interface names are unique across interface types
+INTERFACE = "interface"
+INTERFACE_LIST = "interface-list"
+
+
+def module_of(address):
+    """The child module a resource is written to under --modules, else None."""
+    return writer.TfWriter._section(address, None) if writer.MODULES else None
+
+
+class SymbolTable:
+    """(kind, RouterOS name) -> address of the resource exported for it."""
+
+    def __init__(self):
+        self.addresses = {}
+
+    def define(self, kind, name, address):
+        """Record that the object name of a kind is exported as address."""
+        if name:
+            self.addresses.setdefault((kind, name), address)
+
+    def reference(self, kind, name, referrer=None):
+        """`<address>.name` of an exported object, or name itself if it was not exported here."""
+        address = self.addresses.get((kind, name))
+        if address is None or (referrer and module_of(address) != module_of(referrer)):
+            return name
+        return Reference(f"{address}.name", name)
+
+    def link(self, record, fields, referrer=None):
+        """record with the attributes in fields ({attribute: kind}) turned into references."""
+        linked = None
+        for key, kind in fields.items():
+            value = record.get(key)
+            if value.__class__ is not str:
+                continue
+            target = self.reference(kind, value, referrer)
+            if target is not value:
+                if linked is None:
+                    linked = dict(record)
+                linked[key] = target
+        return linked or record
@@ -0,0 +1,133 @@
+"""
+session.py
+- RouterSession wraps one authenticated librouteros connection for a whole run.
+- Every RouterOS path is printed at most once per session: api.path("interface/bridge")
+  and api(cmd="/interface/bridge/print") share one cached result, and a narrower
+  select() (fewer properties, dynamic entries dropped) is served from a wider cached print.
+- The session's FetchStats are the path metrics of the router being exported (common.metrics).
+- iter_select() streams large tables (routes, firewall rules) without caching them.
+- Anything that is not a plain print (add/set/remove, prints with arguments) goes
+  straight to the router.
+- prefetch() pipelines several independent paths over the session's own connection as
+  tagged prints (query.read_prints, or the client's select_many() with common.aioclient),
+  so the run still logs in once; callers still iterate their own path order, so output
+  stays deterministic.
+"""
+from common import metrics
+from common.query import FetchStats, is_dynamic, path_key, print_words, read_print, read_prints
+
+
+def _project(entries, proplist, exclude_dynamic):
+    if exclude_dynamic:
+        entries = [e for e in entries if not is_dynamic(e)]
+    if proplist:
+        wanted = set(proplist)
+        entries = [{k: v for k, v in e.items() if k in wanted} for e in entries]
+    return entries
+
+
+class RouterSession:
+    """A librouteros Api with a per-run cache of printed paths."""
+
+    def __init__(self, api):
+        self.api = api
+        self.cache = {}  # (path, proplist or None, exclude_dynamic) -> entries
+        self.stats = FetchStats(count_dynamic=metrics.enabled())
+        metrics.attach(self.stats)
+        self.fetches = 0
+        self.reused = 0
+
+    def _cached(self, key, proplist, exclude_dynamic):
+        """Entries for a request derived from an equal or wider cached print, or None."""
+        wanted = set(proplist) if proplist else None
+        for (path, props, dynamic_dropped), entries in self.cache.items():
+            if path != key:
+                continue
+            if props is not None and (wanted is None or not wanted <= set(props)):
+                continue
+            if dynamic_dropped != exclude_dynamic and (dynamic_dropped or props is not None):
+                continue
+            projected = _project(entries, proplist, exclude_dynamic and not dynamic_dropped)
+            self.stats.filtered(key, len(entries) - len(projected))
+            return projected
+        return None
+
+    def select(self, path, proplist=None, exclude_dynamic=False):
+        """Entries of a path, fetched from the router only if no cached print covers them."""
+        key = path_key(path)
+        entries = self._cached(key, proplist, exclude_dynamic)
+        if entries is not None:
+            self.reused += 1
+            return entries
+        words = print_words(proplist, exclude_dynamic)
+        entries = list(read_print(self.api, key, words, self.stats))
+        self.cache[(key, tuple(proplist) if proplist else None, exclude_dynamic)] = entries
+        self.fetches += 1
+        return entries
+
+    def iter_select(self, path, proplist=None, exclude_dynamic=False):
+        """Stream the entries of a path; a covering cached print is reused, a new one is not cached."""
+        key = path_key(path)
+        entries = self._cached(key, proplist, exclude_dynamic)
+        if entries is not None:
+            self.reused += 1
+            return iter(entries)
+        self.fetches += 1
+        return read_print(self.api, key, print_words(proplist, exclude_dynamic), self.stats)
+
+    def print_path(self, path):
+        """All entries of a path, fetched from the router only the first time."""
+        return self.select(path)
+
+    def prefetch(self, paths, exclude_dynamic=False):
+        """Fetch independent paths into the cache in one pipelined round trip on the session's connection.
+
+        Each item is a path or a (path, proplist) pair. Paths that fail here (missing
+        package, ...) are left to the normal serial fetch, which reports the error the
+        same way as before.
+        """
+        specs = []
+        for item in paths:
+            path, proplist = (item, None) if isinstance(item, str) else item
+            key = path_key(path)
+            if self._cached(key, proplist, exclude_dynamic) is None:
+                specs.append((key, tuple(proplist) if proplist else None))
+        specs = list(dict.fromkeys(specs))
+        if len(specs) < 2:
+            return
+        prints = [(key, print_words(proplist, exclude_dynamic)) for key, proplist in specs]
+        if hasattr(self.api, "select_many"):
+            results = self.api.select_many(prints, self.stats)
+        elif hasattr(self.api, "protocol"):
+            results = read_prints(self.api, prints, self.stats)
+        else:
+            # snapshot recorders and replayers read one print at a time
+            return
+        self._store(zip(specs, results), exclude_dynamic)
+
+    def _store(self, results, exclude_dynamic):
+        """Cache prefetched ((path, proplist), entries) pairs; failed ones are left to the serial fetch."""
+        for (key, proplist), entries in results:
+            if isinstance(entries, list):
+                self.cache[(key, proplist, exclude_dynamic)] = entries
+                self.fetches += 1
+
+    def path(self, *path):
+        return self.print_path("/".join(path))
+
+    def __call__(self, cmd, **kwargs):
+        if cmd.endswith("/print") and not kwargs:
+            return iter(self.print_path(cmd))
+        return self.api(cmd=cmd, **kwargs)
+
+    def close(self):
+        self.api.close()
+
+    def __getattr__(self, name):
+        return getattr(self.api, name)
+
+
+def prefetch(api, paths, exclude_dynamic=False):
+    """Warm the session cache for paths a collector is about to read, if api is a RouterSession."""
+    if isinstance(api, RouterSession):
+        api.prefetch(paths, exclude_dynamic)
@@ -0,0 +1,267 @@
+"""
+snapshot.py
+- --capture appends every print the collectors make (api.path(), select(), api(cmd=...)) to
+  a compressed snapshot per router: snapshot.jsonl.gz next to the generated files.
+- --replay runs the collectors against that snapshot instead of the router: no connection
+  is made, so a changed output format or a naming fix can be re-rendered for the whole
+  fleet offline.
+- Every print is one gzip member (a JSON header line, then one JSON line per record), so the
+  file is append-only and `zcat snapshot.jsonl.gz` shows all of it. snapshot.idx, also
+  append-only, has one JSON line per member with its offset; the newest capture of a
+  print wins.
+- Replay memory-maps the snapshot and decompresses only the member it needs, streaming its
+  records, so a multi-gigabyte capture never has to fit in memory.
+
+A print that was never captured as such (a narrower one the session cache served from a
+wider print, e.g. under import_all.py) is answered from a captured print of the same path
+that covers it, like RouterSession does.
+"""
+import json
+import mmap
+import os
+import shutil
+import tempfile
+import threading
+import time
+import zlib
+
+from librouteros.exceptions import MultiTrapError, TrapError
+
+from common.query import NOT_DYNAMIC, is_dynamic, path_key
+from common.query import read_print as query_read_print
+
+SNAPSHOT_FILE = "snapshot.jsonl.gz"
+INDEX_FILE = "snapshot.idx"
+COMPRESS_LEVEL = 6
+# Compressed bytes handed to the decompressor at a time, and records spooled in memory while capturing
+CHUNK_SIZE = 1 << 18
+SPOOL_SIZE = 16 << 20
+
+# Set from --capture / --replay by configure_snapshot()
+CAPTURE = False
+REPLAY = False
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+def configure_snapshot(args):
+    """Apply the parsed --capture/--replay options."""
+    global CAPTURE, REPLAY
+    CAPTURE = args.capture
+    REPLAY = args.replay
+
+
+def add_snapshot_arguments(parser):
+    """Add --capture/--replay to an importer's argument parser."""
+    group = parser.add_argument_group("snapshots")
+    modes = group.add_mutually_exclusive_group()
+    modes.add_argument("--capture", action="store_true",
+                       help=f"also append everything fetched from the router to {SNAPSHOT_FILE}")
+    modes.add_argument("--replay", action="store_true",
+                       help=f"render from {SNAPSHOT_FILE} instead of connecting to the router")
+    return group
+
+
+def _words(words):
+    """(proplist or None, dynamic entries excluded) of print words, or None for other queries."""
+    proplist = None
+    rest = list(words)
+    for word in words:
+        if word.startswith("=.proplist="):
+            proplist = word[len("=.proplist="):].split(",")
+            rest.remove(word)
+    exclude_dynamic = all(w in rest for w in NOT_DYNAMIC)
+    if exclude_dynamic:
+        rest = [w for w in rest if w not in NOT_DYNAMIC]
+    return None if rest else (proplist, exclude_dynamic)
+
+
+class SnapshotWriter:
+    """Appends captured prints of one router to its snapshot; shared by all of its connections."""
+
+    def __init__(self, out_dir):
+        os.makedirs(out_dir, exist_ok=True)
+        self.path = os.path.join(out_dir, SNAPSHOT_FILE)
+        self.index_path = os.path.join(out_dir, INDEX_FILE)
+        self.lock = threading.Lock()
+        self.members = 0
+
+    def capture(self, command, words, entries):
+        """Yield entries while compressing them; the print is appended once it completed.
+
+        A print the caller abandons half-way is not stored. Traps are stored with the print,
+        so a replay fails the same way.
+        """
+        spool = tempfile.SpooledTemporaryFile(SPOOL_SIZE)
+        compressor = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        header = {"command": command, "words": list(words), "time": time.time()}
+        spool.write(compressor.compress(json.dumps(header).encode() + b"\n"))
+        records = 0
+        traps = None  # set once the print has been read to its end
+        try:
+            for entry in entries:
+                spool.write(compressor.compress(json.dumps(entry, separators=(",", ":")).encode() + b"\n"))
+                records += 1
+                yield entry
+            traps = []
+        except (TrapError, MultiTrapError) as e:
+            traps = [vars(trap) for trap in getattr(e, "traps", [e])]
+            raise
+        finally:
+            if traps is not None:
+                spool.write(compressor.flush())
+                self._append(spool, dict(header, records=records, traps=traps))
+            spool.close()
+
+    def _append(self, spool, entry):
+        length = spool.tell()
+        spool.seek(0)
+        with self.lock:
+            with open(self.path, "ab") as f:
+                offset = f.tell()
+                shutil.copyfileobj(spool, f, CHUNK_SIZE)
+            with open(self.index_path, "a") as f:
+                f.write(json.dumps(dict(entry, offset=offset, length=length)) + "\n")
+            self.members += 1
+
+
+class Recorder:
+    """A connection whose prints and commands are also captured into a SnapshotWriter."""
+
+    def __init__(self, api, writer):
+        self.api = api
+        self.writer = writer
+
+    def read_print(self, path, words=(), stats=None):
+        entries = query_read_print(self.api, path, words, stats)
+        return self.writer.capture(path_key(path) + "/print", words, entries)
+
+    def __call__(self, cmd, **kwargs):
+        words = [f"={k}={v}" for k, v in kwargs.items()]
+        return iter(list(self.writer.capture(cmd, words, self.api(cmd=cmd, **kwargs))))
+
+    def close(self):
+        self.api.close()
+
+
+class Replayer:
+    """Serves prints and commands from a snapshot, like a connection to the router it was taken from."""
+
+    def __init__(self, out_dir):
+        self.path = os.path.join(out_dir, SNAPSHOT_FILE)
+        self.members = {}  # (command, words) -> index entry of its newest capture
+        with open(os.path.join(out_dir, INDEX_FILE)) as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    key = (entry["command"], tuple(entry["words"]))
+                    self.members.pop(key, None)
+                    self.members[key] = entry
+        self.file = open(self.path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _member(self, command, words):
+        """Index entry of a captured print, and what to drop from it to answer this one."""
+        words = tuple(words)
+        entry = self.members.get((command, words))
+        if entry is not None:
+            return entry, None, False
+        wanted = _words(words)
+        if wanted is None or not command.endswith("/print"):
+            return None, None, False
+        proplist, exclude_dynamic = wanted
+        for (captured_command, captured_words), entry in reversed(self.members.items()):
+            captured = _words(captured_words)
+            if captured_command != command or captured is None or entry["traps"]:
+                continue
+            props, dynamic_dropped = captured
+            if props is not None and (proplist is None or not set(proplist) <= set(props)):
+                continue
+            if dynamic_dropped != exclude_dynamic and (dynamic_dropped or props is not None):
+                continue
+            return entry, proplist, exclude_dynamic and not dynamic_dropped
+        return None, None, False
+
+    def records(self, entry):
+        """Stream the records of one member out of the memory-mapped snapshot."""
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        view = memoryview(self.map)[entry["offset"]:entry["offset"] + entry["length"]]
+        pending = b""
+        header = True
+        try:
+            for start in range(0, len(view), CHUNK_SIZE):
+                lines = (pending + decompressor.decompress(view[start:start + CHUNK_SIZE])).split(b"\n")
+                pending = lines.pop()
+                for line in lines:
+                    if header:
+                        header = False
+                        continue
+                    yield json.loads(line)
+            if pending + decompressor.flush():
+                raise ValueError(f"{self.path}: truncated record at offset {entry['offset']}")
+        finally:
+            view.release()
+
+    def replay(self, command, words=()):
+        """Records of a captured print or command; raises its traps like the router did."""
+        entry, proplist, drop_dynamic = self._member(command, words)
+        if entry is None:
+            raise LookupError(f"{command} {' '.join(words)} is not in the snapshot {self.path}")
+        wanted = set(proplist) if proplist else None
+        for record in self.records(entry):
+            if drop_dynamic and is_dynamic(record):
+                continue
+            yield {k: v for k, v in record.items() if k in wanted} if wanted else record
+        traps = [TrapError(**t) for t in entry["traps"]]
+        if len(traps) > 1:
+            raise MultiTrapError(*traps)
+        if traps:
+            raise traps[0]
+
+    def read_print(self, path, words=(), stats=None):
+        started = time.monotonic()
+        records = 0
+        try:
+            for record in self.replay(path_key(path) + "/print", words):
+                records += 1
+                yield record
+        except (TrapError, MultiTrapError):
+            if stats is not None:
+                stats.add(path, records, 0, time.monotonic() - started, errors=1)
+            raise
+        if stats is not None:
+            stats.add(path, records, 0, time.monotonic() - started)
+
+    def __call__(self, cmd, **kwargs):
+        return iter(list(self.replay(cmd, [f"={k}={v}" for k, v in kwargs.items()])))
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+
+def writer(out_dir):
+    """The SnapshotWriter of a router's output directory, shared by its connections."""
+    key = os.path.abspath(out_dir)
+    with _writers_lock:
+        if key not in _writers:
+            _writers[key] = SnapshotWriter(out_dir)
+        return _writers[key]
+
+
+def with_snapshots(connect, out_dir="."):
+    """The connect function for a router exported into out_dir, honouring --capture/--replay.
+
+    With --replay no connection is made; with --capture every connection (including the
+    session's extra prefetch connections) records into the same snapshot.
+    """
+    if REPLAY:
+        def replay():
+            print(f"📼 Replaying {os.path.join(out_dir, SNAPSHOT_FILE)}")
+            return Replayer(out_dir)
+        return replay
+    if CAPTURE:
+        snapshot = writer(out_dir)
+        return lambda: Recorder(connect(), snapshot)
+    return connect
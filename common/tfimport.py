@@ -0,0 +1,134 @@
+"""
+tfimport.py
+- Renders Terraform `import {}` blocks (Terraform >= 1.5) so that one
+  `terraform plan` / `terraform apply` imports every exported resource.
+- Keeps the legacy shell script with one `terraform import` per resource
+  behind --import-script, for Terraform versions without import blocks.
+- The files themselves are streamed by common.writer.TfWriter.
+
+An import is an (address, id) tuple, e.g. ("routeros_ip_route.default", "*80000001").
+Imports already tracked in terraform.tfstate or the import journal are dropped before writing.
+"""
+import os
+import shutil
+import subprocess
+
+from common import drift
+from common.hcl import string
+from common.metrics import stage
+from common.tfstate import JOURNAL_FILE, load_index, skip_imported
+
+# Set from --state / --terraform-show by configure_imports()
+STATE_PATH = None
+TERRAFORM_SHOW = False
+_indexes = {}
+
+
+def configure_imports(args):
+    """Apply the parsed --state/--terraform-show options.
+
+    One --state file cannot serve a fleet: every router has its own state (and the same
+    .ids), so in fleet mode each output directory's terraform.tfstate is used instead.
+    """
+    global STATE_PATH, TERRAFORM_SHOW
+    if args.state and getattr(args, "inventory", None):
+        raise SystemExit("❌ --state cannot be combined with --inventory: each router's state is read from "
+                         "terraform.tfstate in its own output directory (or use --terraform-show)")
+    STATE_PATH = args.state
+    TERRAFORM_SHOW = args.terraform_show
+
+
+def state_index(out_dir="."):
+    """The state index of one output directory, loaded once per run."""
+    key = os.path.abspath(out_dir)
+    if key not in _indexes:
+        _indexes[key] = load_index(out_dir, STATE_PATH, TERRAFORM_SHOW)
+    return _indexes[key]
+
+
+def pending_imports(imports, out_dir=".", quiet=False):
+    """Imports not yet in Terraform state or the import journal."""
+    return skip_imported(imports, state_index(out_dir), quiet)
+
+
+def import_block(address, rid):
+    """One `import {}` block for an existing RouterOS object."""
+    return f"import {{\n  to = {address}\n  id = {string(rid)}\n}}\n"
+
+
+def import_each(address, source):
+    """One `import {}` block (Terraform >= 1.7) for every key -> id of the JSON object in the file source."""
+    return (f'import {{\n  for_each = jsondecode(file("${{path.module}}/{source}"))\n'
+            f"  to = {address}[each.key]\n  id = each.value\n}}\n")
+
+
+def script_prologue(header=None):
+    """Start of the legacy bash script with one `terraform import` per pending resource.
+
+    Every successful import is appended to the journal, and imports already in the
+    journal are skipped, so the script can simply be re-run after a failure.
+    """
+    lines = ["#!/bin/bash"]
+    if header:
+        lines.append(header)
+    lines += [
+        "",
+        f'JOURNAL="$(dirname "$0")/{JOURNAL_FILE}"',
+        "imp() {",
+        "  grep -qxF \"$1\"$'\\t'\"$2\" \"$JOURNAL\" 2>/dev/null && return 0",
+        "  terraform import \"$1\" \"$2\" && echo \"$1\"$'\\t'\"$2\" >> \"$JOURNAL\"",
+        "}",
+        "",
+        "",
+    ]
+    return "\n".join(lines)
+
+
+def run_terraform_plan(out_dir="."):
+    """Run a single `terraform plan` over the generated import blocks, if terraform exists."""
+    if drift.DRIFT:
+        return
+    terraform_path = shutil.which("terraform")
+    if not terraform_path:
+        print("⚠️ terraform not found in PATH — run `terraform plan` and `terraform apply` to import.")
+        return
+    print(f"🚀 Planning all imports with one terraform run (terraform at {terraform_path})")
+    with stage("terraform", command="plan") as fields:
+        fields["returncode"] = subprocess.run([terraform_path, "plan"], cwd=out_dir, check=False).returncode
+    print("ℹ️ Review the plan, then run `terraform apply` to import everything into state.")
+
+
+def run_import_script(path):
+    """Legacy mode: run the generated import script once, if terraform exists.
+
+    The script journals each import itself, so an interrupted run can be repeated.
+    """
+    if drift.DRIFT:
+        return
+    terraform_path = shutil.which("terraform")
+    if not terraform_path:
+        print(f"⚠️ terraform not found in PATH — not executing imports. To run manually:\n    {path}")
+        return
+    print(f"🚀 Executing {path} (terraform at {terraform_path})")
+    with stage("terraform", command="import") as fields:
+        result = subprocess.run(["bash", os.path.basename(path)], cwd=os.path.dirname(path) or ".", check=False)
+        fields["returncode"] = result.returncode
+
+
+def add_import_arguments(parser):
+    """Add --import-script/--state/--terraform-show to an importer's argument parser."""
+    parser.add_argument(
+        "--import-script",
+        action="store_true",
+        help="also write the legacy per-resource `terraform import` shell script (and run it instead of a plan)",
+    )
+    parser.add_argument(
+        "--state",
+        help="terraform.tfstate or saved `terraform show -json` output whose resources are not imported again "
+        "(default: terraform.tfstate in the output directory, if present; not with --inventory)",
+    )
+    parser.add_argument(
+        "--terraform-show",
+        action="store_true",
+        help="read the current state once with `terraform show -json` (for remote backends)",
+    )
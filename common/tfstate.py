@@ -0,0 +1,124 @@
+"""
+tfstate.py
+- Indexes the resources Terraform already manages, by address and by (type, RouterOS .id),
+  from terraform.tfstate, `terraform show -json` output, or a live `terraform show -json`.
+- Reads the import journal (.import_journal) that the generated import script appends every
+  completed import to, so an interrupted run can resume without repeating finished imports.
+"""
+import json
+import os
+import shutil
+import subprocess
+
+STATE_FILE = "terraform.tfstate"
+JOURNAL_FILE = ".import_journal"
+
+
+class StateIndex:
+    """Addresses and (resource type, id) pairs already tracked by Terraform."""
+
+    def __init__(self):
+        self.addresses = set()
+        self.ids = set()
+
+    def add(self, address, rid):
+        self.addresses.add(address)
+        if rid:
+            self.ids.add((resource_type(address), str(rid)))
+
+    def __contains__(self, item):
+        address, rid = item
+        return address in self.addresses or (resource_type(address), str(rid)) in self.ids
+
+    def __len__(self):
+        return len(self.addresses)
+
+
+def resource_type(address):
+    """routeros_ip_route.x / module.m.routeros_ip_route.x["k"] -> routeros_ip_route."""
+    if address.endswith("]"):
+        address = address[:address.rindex("[")]
+    return address.split(".")[-2] if "." in address else address
+
+
+def _index_tfstate(index, state):
+    """terraform.tfstate (format version 4)."""
+    for res in state.get("resources", []):
+        if res.get("mode", "managed") != "managed":
+            continue
+        base = f'{res["type"]}.{res["name"]}'
+        if res.get("module"):
+            base = f'{res["module"]}.{base}'
+        for inst in res.get("instances", []):
+            key = inst.get("index_key")
+            address = base if key is None else f"{base}[{json.dumps(key)}]"
+            index.add(address, inst.get("attributes", {}).get("id"))
+
+
+def _index_show_json(index, module):
+    """`terraform show -json` values.root_module and its child modules."""
+    for res in module.get("resources", []):
+        if res.get("mode", "managed") == "managed":
+            index.add(res["address"], res.get("values", {}).get("id"))
+    for child in module.get("child_modules", []):
+        _index_show_json(index, child)
+
+
+def index_state(state, index=None):
+    """Add one parsed state document (either format) to an index."""
+    if index is None:
+        index = StateIndex()
+    if "values" in state:
+        _index_show_json(index, state["values"].get("root_module", {}))
+    else:
+        _index_tfstate(index, state)
+    return index
+
+
+def terraform_show_json(work_dir="."):
+    """Run `terraform show -json` once and return the parsed state, or None."""
+    terraform_path = shutil.which("terraform")
+    if not terraform_path:
+        print("⚠️ terraform not found in PATH — cannot read state with terraform show.")
+        return None
+    out = subprocess.run([terraform_path, "show", "-json"], cwd=work_dir, capture_output=True, text=True)
+    if out.returncode != 0:
+        print(f"⚠️ terraform show -json failed: {out.stderr.strip()}")
+        return None
+    return json.loads(out.stdout)
+
+
+def read_journal(index, path):
+    """Add completed imports recorded in the journal to the index."""
+    if not os.path.exists(path):
+        return index
+    with open(path) as f:
+        for line in f:
+            address, _, rid = line.rstrip("\n").partition("\t")
+            if address:
+                index.add(address, rid)
+    return index
+
+
+def load_index(work_dir=".", state_path=None, terraform_show=False):
+    """Index the state (file or terraform show) and the import journal of one output directory."""
+    index = StateIndex()
+    state_path = state_path or os.path.join(work_dir, STATE_FILE)
+    if terraform_show:
+        state = terraform_show_json(work_dir)
+        if state:
+            index_state(state, index)
+    elif os.path.exists(state_path):
+        with open(state_path) as f:
+            index_state(json.load(f), index)
+    read_journal(index, os.path.join(work_dir, JOURNAL_FILE))
+    return index
+
+
+def skip_imported(imports, index, quiet=False):
+    """Drop imports whose address or (type, .id) is already tracked."""
+    pending = [(address, rid) for address, rid in imports if (address, rid) not in index]
+    skipped = len(imports) - len(pending)
+    if skipped and not quiet:
+        print(f"⏭️ Skipping {skipped} resources already in Terraform state or the import journal")
+    return pending
@@ -0,0 +1,438 @@
+"""
+writer.py
+- TfWriter streams resource blocks, import blocks and (optionally) the legacy import
+  script to disk as collectors produce them, so nothing is held until the end of a run.
+- Collectors yield (block, address, id) tuples, plus the target .tf file for collectors
+  that write several; address/id are None for blocks that have nothing to import.
+- Files are written next to their target and only moved into place when the content
+  changed, so an unchanged export leaves the files (and their mtimes) alone; a collector
+  that fails halfway leaves the previous files in place.
+- Every resource is recorded in the directory's RecordCache, which writes the changelog
+  against the previous run.
+- With --drift (common.drift) nothing is written: the recorded resources are compared with
+  the previous run instead.
+- --shard splits the resources into one file per section (resource type by default; a
+  collector can pass its own, e.g. the firewall chain or routing table), --max-blocks caps
+  the blocks per file and --modules turns every section into a child module that can be
+  planned on its own with -target=module.<section>.
+- With --for-each a collector's rows (hcl.Row: routes, firewall rules, list members) are not
+  written as blocks: every collection (section) becomes one `for_each` resource over a JSON
+  data file next to it, imported by one `for_each` import block over a JSON map of ids.
+  Rows of a template with an each_key (address-list entries) are always written this way.
+"""
+import filecmp
+import hashlib
+import json
+import os
+import re
+import time
+
+from common import drift, metrics
+from common.cache import RecordCache
+from common.hcl import Row
+from common.tfimport import import_block, import_each, pending_imports, script_prologue
+from common.tfstate import resource_type
+
+MANIFEST_FILE = ".export_files"
+# Write buffer per output file: blocks are small, so they reach the disk in large batches
+BUFFER_SIZE = 1 << 20
+# ... smaller for the data files of for_each collections, which are open side by side (one per
+# address list, chain or routing table) until the end of the run
+COLLECTION_BUFFER_SIZE = 1 << 16
+MODULES_FILE = "modules.tf"
+VERSIONS_TF = """terraform {
+  required_providers {
+    routeros = {
+      source = "terraform-routeros/routeros"
+    }
+  }
+}
+"""
+
+# Set from --shard / --max-blocks / --modules / --for-each by configure_output()
+SHARD = False
+MAX_BLOCKS = 0
+MODULES = False
+FOR_EACH = False
+
+
+def configure_output(args):
+    """Apply the parsed --shard/--max-blocks/--modules/--for-each options."""
+    global SHARD, MAX_BLOCKS, MODULES, FOR_EACH
+    MODULES = args.modules
+    SHARD = args.shard or args.modules
+    MAX_BLOCKS = args.max_blocks
+    FOR_EACH = args.for_each
+
+
+def add_output_arguments(parser):
+    """Add --shard/--max-blocks/--modules/--for-each to an importer's argument parser."""
+    group = parser.add_argument_group("output layout")
+    group.add_argument(
+        "--shard",
+        action="store_true",
+        help="one .tf file per section (resource type, firewall chain, routing table) instead of one per importer",
+    )
+    group.add_argument("--max-blocks", type=int, default=0, help="start a new .tf file after this many blocks")
+    group.add_argument(
+        "--modules",
+        action="store_true",
+        help="write every section as a child module (implies --shard), so it can be planned on its own",
+    )
+    group.add_argument(
+        "--for-each",
+        action="store_true",
+        help="one for_each resource over a JSON data file per collection of routes, rules or list members "
+        "(needs Terraform >= 1.7 for the imports)",
+    )
+    return group
+
+
+def section_name(section):
+    """A section as a file name part and module name."""
+    section = re.sub(r"[^A-Za-z0-9_]", "_", str(section)).strip("_") or "default"
+    return section if section[0].isalpha() else "s_" + section
+
+
+def collection_name(section):
+    """A section as the name of a for_each collection.
+
+    Unlike section_name(), distinct sections never share a name: a name that had to be changed
+    (address lists block-list and block_list) gets a digest of the section appended.
+    """
+    name = section_name(section)
+    if name != str(section):
+        name = f"{name}_{hashlib.sha1(str(section).encode()).hexdigest()[:8]}"
+    return name
+
+
+class TfWriter:
+    """Writes one or more .tf files plus their imports, one block at a time."""
+
+    def __init__(self, out_dir, tf_file, import_tf_file, header=None, separator="\n", trailer="",
+                 import_script=None, tf_files=(), import_header=None):
+        self.out_dir = out_dir
+        self.tf_file = tf_file
+        self.header = header
+        self.separator = separator
+        self.trailer = trailer
+        self.tf_files = (tf_file, *tf_files)
+        self.files = {}
+        self.shards = {}  # (tf_file, section) -> [entry, number of files]
+        self.modules = []
+        self.collections = {}  # (tf_file, resource type, collection) -> [data, keys or None, address, imports]
+        self.sections = {}  # (tf_file, resource type, section) -> collection
+        self.written = set()
+        self.cache = RecordCache(out_dir)
+        self.blocks = 0
+        self.imported = 0
+        self.skipped = 0
+        self.write_seconds = 0.0
+        self.drift = drift.DRIFT
+        if self.drift:
+            return
+        if not (SHARD or MAX_BLOCKS):
+            for name in self.tf_files:
+                self._open(name)
+        import_header = import_header or header
+        self.imports = self._start(import_tf_file, import_header and import_header + "\n\n")
+        self.script = None
+        if import_script:
+            self.script = self._start(import_script, script_prologue(import_header))
+            os.chmod(self.script[0].name, 0o755)
+
+    def _start(self, name, prologue=None, buffering=BUFFER_SIZE):
+        path = os.path.join(self.out_dir, name)
+        self.written.add(name)
+        f = open(path + ".tmp", "w", buffering=buffering)
+        if prologue:
+            f.write(prologue)
+        return [f, 0, path]
+
+    @staticmethod
+    def _finish(entry, commit=True):
+        """Close a file and move it into place; returns False if the old file was identical."""
+        f, _, path = entry
+        f.close()
+        if not commit:
+            os.remove(f.name)
+            return False
+        if os.path.exists(path) and filecmp.cmp(f.name, path, shallow=False):
+            os.remove(f.name)
+            return False
+        os.replace(f.name, path)
+        return True
+
+    def _open(self, name):
+        self.files[name] = self._start(name, self.header and self.header + "\n\n")
+        return self.files[name]
+
+    @staticmethod
+    def _section(address, section):
+        """The section a block is sharded into."""
+        if not SHARD:
+            return None
+        return section_name(section or (address and resource_type(address).replace("routeros_", "", 1)))
+
+    def _shard(self, tf_file, address, section):
+        """The file a block goes to when sharding or capping the blocks per file."""
+        section = self._section(address, section)
+        key = (tf_file, section)
+        shard = self.shards.get(key)
+        if shard and not (MAX_BLOCKS and shard[0][1] >= MAX_BLOCKS):
+            return shard[0], section
+        number = shard[1] + 1 if shard else 1
+        stem = os.path.splitext(tf_file)[0]
+        suffix = f"_{number}" if number > 1 else ""
+        if MODULES:
+            if section not in self.modules:
+                self.modules.append(section)
+                os.makedirs(os.path.join(self.out_dir, section), exist_ok=True)
+            name = os.path.join(section, stem + suffix + ".tf")
+        else:
+            name = "_".join(p for p in (stem, section) if p) + suffix + ".tf"
+        self.shards[key] = [self._open(name), number]
+        return self.shards[key][0], section
+
+    def add(self, block, address=None, rid=None, tf_file=None, section=None):
+        """Write one resource block (or Row) and queue its import."""
+        if block.__class__ is Row:
+            if FOR_EACH or block.template.each_key:
+                return self.add_row(block, address, rid, tf_file, section)
+            block = block.render()
+        tf_file = tf_file or self.tf_file
+        if self.drift:
+            if MODULES and address:
+                address = f"module.{self._section(address, section)}.{address}"
+            self.blocks += 1
+            if address:
+                self.cache.record(address, rid, block)
+            return
+        if SHARD or MAX_BLOCKS:
+            entry, section = self._shard(tf_file, address, section)
+            if MODULES and address:
+                address = f"module.{section}.{address}"
+        else:
+            entry = self.files.get(tf_file) or self._open(tf_file)
+        f, count, _ = entry
+        f.write(self.separator + block if count else block)
+        entry[1] += 1
+        self.blocks += 1
+        if address:
+            self.cache.record(address, rid, block)
+        if address and rid is not None:
+            self.add_import(address, rid)
+
+    def add_import(self, address, rid, collection=None, key=None):
+        """Queue one import: an import block, or the entry of key (JSON-quoted) in the collection's map of ids."""
+        if not pending_imports([(address, rid)], self.out_dir, quiet=True):
+            self.skipped += 1
+            return
+        if collection is None:
+            f, count, _ = self.imports
+            if count:
+                f.write("\n")
+            f.write(import_block(address, rid))
+            self.imports[1] += 1
+        else:
+            ids = collection[3] or self._start_ids(collection)
+            ids[0].write(f"{',' if ids[1] else ''}\n{key}: {json.dumps(rid)}")
+            ids[1] += 1
+        if self.script:
+            self.script[0].write(f"imp '{address}' '{rid}'\n" if collection else f"imp {address} '{rid}'\n")
+        self.imported += 1
+
+    def _collection(self, tf_file, tf_type, name, template):
+        """Start the for_each resource of a collection: its block and its JSON data file."""
+        address = f"{tf_type}.{name}"
+        # Keys of each_key rows are unique already (e.g. the addresses of one address list), so
+        # they are not tracked; the JSON would not decode in Terraform if one repeated
+        keys = None if template.each_key else {}
+        collection = self.collections[tf_file, tf_type, name] = [None, keys, address, None]
+        if MODULES:
+            collection[2] = f"module.{name}.{address}"
+        if self.drift:
+            return collection
+        if SHARD or MAX_BLOCKS:
+            entry, _ = self._shard(tf_file, address, name)
+        else:
+            entry = self.files.get(tf_file) or self._open(tf_file)
+        source = f"{os.path.splitext(tf_file)[0]}_{name}.json"
+        collection[0] = self._start(os.path.join(name, source) if MODULES else source, "{", COLLECTION_BUFFER_SIZE)
+        block = template.each(name, source)
+        entry[0].write(self.separator + block if entry[1] else block)
+        entry[1] += 1
+        return collection
+
+    def _start_ids(self, collection):
+        """The JSON map of ids a collection is imported from, next to the import blocks."""
+        stem = os.path.splitext(os.path.basename(self.imports[2]))[0]
+        collection[3] = self._start(f"{stem}_{collection[2].rsplit('.', 1)[1]}.json", "{", COLLECTION_BUFFER_SIZE)
+        return collection[3]
+
+    def add_row(self, row, address, rid=None, tf_file=None, section=None):
+        """Add one Row to the for_each resource of its collection (the section).
+
+        The row is addressed by its key in the collection, <type>.<collection>["<name>"], not by
+        the address it would have as a block of its own.
+        """
+        tf_file = tf_file or self.tf_file
+        tf_type = row.template.resource_type
+        collection = self.sections.get((tf_file, tf_type, section))
+        if collection is None:
+            name = collection_name(section or tf_type.replace("routeros_", "", 1))
+            collection = self.collections.get((tf_file, tf_type, name))
+            if collection is None:
+                collection = self._collection(tf_file, tf_type, name, row.template)
+            self.sections[tf_file, tf_type, section] = collection
+        data, keys, base, _ = collection
+        key = row.name
+        if keys is None:
+            if key is None or key == "":
+                raise ValueError(f"{tf_type} row without {row.template.each_key}: {row.record}")
+        elif key in keys:
+            # Same name as an earlier row: the first free <name>_<n>
+            n = keys[key]
+            while f"{key}_{n}" in keys:
+                n += 1
+            keys[row.name] = n + 1
+            key = f"{key}_{n}"
+            keys[key] = 2
+        else:
+            keys[key] = 2
+        key = json.dumps(key)
+        address = f"{base}[{key}]"
+        values = json.dumps(row.values())
+        self.blocks += 1
+        self.cache.record(address, rid, values)
+        if self.drift:
+            return
+        data[0].write(f"{',' if data[1] else ''}\n{key}: {values}")
+        data[1] += 1
+        if rid is not None:
+            self.add_import(address, rid, collection, key)
+
+    def _finish_collections(self, commit):
+        """Close the JSON files of every collection and write their for_each import blocks."""
+        for data, _, address, ids in self.collections.values():
+            data[0].write("\n}\n")
+            self._finish(data, commit)
+            if ids is None:
+                continue
+            ids[0].write("\n}\n")
+            self._finish(ids, commit)
+            f, count, _ = self.imports
+            if count:
+                f.write("\n")
+            f.write(import_each(address, os.path.basename(ids[2])))
+            self.imports[1] += 1
+            if commit:
+                print(f"✅ {ids[1]} imports of {address} written to {ids[2]}")
+
+    def write_all(self, resources):
+        """Consume a collector's (block, address, id[, tf_file[, section]]) generator.
+
+        Time spent in the generator is split into fetch (reading from the router, as counted
+        by the session's FetchStats) and render; time spent here is the write stage.
+        """
+        stats = metrics.current().stats
+        fetched = stats.fetch_seconds() if stats else 0.0
+        generating = writing = 0.0
+        resources = iter(resources)
+        blocks = self.blocks
+        while True:
+            start = time.monotonic()
+            item = next(resources, None)
+            now = time.monotonic()
+            generating += now - start
+            if item is None:
+                break
+            block, address, rid, *where = item
+            if block.__class__ is Row and not (FOR_EACH or block.template.each_key):
+                # Rendering a row is still the collector's render stage
+                block = block.render()
+                rendered = time.monotonic()
+                generating += rendered - now
+                now = rendered
+            self.add(block, address, rid, *where)
+            writing += time.monotonic() - now
+        fetched = stats.fetch_seconds() - fetched if stats else 0.0
+        router = metrics.current()
+        router.add_stage("fetch", fetched, file=self.tf_file)
+        router.add_stage("render", max(0.0, generating - fetched), file=self.tf_file, blocks=self.blocks - blocks)
+        self.write_seconds += writing
+        return self
+
+    def _write_modules(self):
+        """modules.tf in the root and the provider requirements of every child module."""
+        entry = self._start(MODULES_FILE, self.header and self.header + "\n\n")
+        entry[0].write("\n".join(f'module "{m}" {{\n  source = "./{m}"\n}}\n' for m in self.modules))
+        self._finish(entry)
+        for m in self.modules:
+            entry = self._start(os.path.join(m, "versions.tf"))
+            entry[0].write(VERSIONS_TF)
+            self._finish(entry)
+        print(f"✅ {len(self.modules)} modules listed in {os.path.join(self.out_dir, MODULES_FILE)}")
+
+    def _previous_files(self):
+        """Files the previous run wrote, from its manifest."""
+        try:
+            with open(os.path.join(self.out_dir, MANIFEST_FILE)) as f:
+                return set(f.read().split("\n")) - {""}
+        except OSError:
+            return set()
+
+    def _remove_stale(self):
+        """Drop files of the previous run (or the unsharded layout) that this run did not write."""
+        manifest = os.path.join(self.out_dir, MANIFEST_FILE)
+        previous = self._previous_files()
+        for name in sorted((previous | set(self.tf_files)) - self.written):
+            path = os.path.join(self.out_dir, name)
+            if os.path.isfile(path):
+                os.remove(path)
+                print(f"🧹 Removed {path} (no longer generated)")
+        with open(manifest, "w") as f:
+            f.write("\n".join(sorted(self.written)) + "\n")
+
+    def close(self, commit=True):
+        """Finish every file; with commit=False (the collector failed) the previous files stay."""
+        if self.drift:
+            if commit:
+                drift.report(self.out_dir, self.cache, sorted(self._previous_files()))
+            return
+        start = time.monotonic()
+        for entry in self.files.values():
+            f, count, path = entry
+            if count:
+                f.write(self.trailer)
+            changed = self._finish(entry, commit)
+            if commit:
+                print(f"✅ Terraform resources written to {path} ({count} blocks{'' if changed else ', unchanged'})")
+        self._finish_collections(commit)
+        self._finish(self.imports, commit)
+        if self.script:
+            self._finish(self.script, commit)
+        if not commit:
+            return
+        if self.skipped:
+            print(f"⏭️ Skipped {self.skipped} resources already in Terraform state or the import journal")
+        if self.collections:
+            print(f"✅ {self.imported} imports in {self.imports[1]} import blocks written to {self.imports[2]}")
+        else:
+            print(f"✅ {self.imported} import blocks written to {self.imports[2]}")
+        if self.script:
+            print(f"✅ Terraform import script written to {self.script[2]}")
+        if self.modules:
+            self._write_modules()
+        self._remove_stale()
+        self.cache.save()
+        written = sum(os.path.getsize(os.path.join(self.out_dir, name)) for name in self.written
+                      if os.path.exists(os.path.join(self.out_dir, name)))
+        metrics.current().add_stage("write", self.write_seconds + time.monotonic() - start, file=self.tf_file,
+                                    bytes_written=written)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        self.close(commit=exc_type is None)
@@ -1,19 +1,79 @@
 #!/usr/bin/env python3
+import argparse
+from functools import partial
 import os
-import re
 import sys
-import subprocess
 import socket
 from librouteros import connect
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.aioclient import add_backend_arguments, configure_backend  # noqa: E402
+from common.drift import add_drift_arguments, configure_drift  # noqa: E402
+from common.fleet import add_fleet_arguments, load_inventory, run_fleet  # noqa: E402
+from common.hcl import FALSY, Template, sanitize  # noqa: E402
+from common.metrics import add_metrics_arguments, configure_metrics, stage, write_report  # noqa: E402
+from common.profiling import add_profile_arguments, configure_profile, profiled  # noqa: E402
+from common.query import iter_select  # noqa: E402
+from common.session import RouterSession  # noqa: E402
+from common.snapshot import add_snapshot_arguments, configure_snapshot, with_snapshots  # noqa: E402
+from common.tfimport import add_import_arguments, configure_imports, run_import_script, run_terraform_plan  # noqa: E402
+from common.writer import TfWriter, add_output_arguments, configure_output  # noqa: E402
+
 HOST = "192.168.62.1"
 USER = "terraform"
 PASS = "terraform"
 PORT = 8728
 
 TF_FILE = "firewall.tf"
+IMPORT_TF_FILE = "firewall_imports.tf"
 IMPORT_FILE = "firewall_imports.sh"
 
+# Rule properties written to Terraform (and the only ones requested from the router)
+INCLUDE_KEYS = [
+    "chain",
+    "action",
+    "protocol",
+    "src-address",
+    "dst-address",
+    "in-interface",
+    "out-interface",
+    "src-port",
+    "dst-port",
+    "to-addresses",
+    "to-ports",
+    "log",
+    "log-prefix",
+]
+# ... plus the address-list matchers (raw) and the marks (mangle)
+RAW_KEYS = [*INCLUDE_KEYS, "src-address-list", "dst-address-list"]
+MANGLE_KEYS = [
+    *RAW_KEYS,
+    "connection-state",
+    "connection-mark",
+    "packet-mark",
+    "routing-mark",
+    "new-connection-mark",
+    "new-packet-mark",
+    "new-routing-mark",
+    "passthrough",
+]
+RULE_KEYS = {
+    "routeros_ip_firewall_filter": INCLUDE_KEYS,
+    "routeros_ip_firewall_nat": INCLUDE_KEYS,
+    "routeros_ip_firewall_mangle": MANGLE_KEYS,
+    "routeros_ip_firewall_raw": RAW_KEYS,
+}
+# Empty values are left out of the blocks
+TEMPLATES = {
+    resource_type: Template(resource_type, [*keys, "comment"], typed=("passthrough",))
+    for resource_type, keys in RULE_KEYS.items()
+}
+
+# Address lists are always written compactly: one for_each resource per list, keyed by address
+ADDRESS_LIST_PROPS = [".id", "list", "address", "disabled", "comment"]
+ADDRESS_LIST = Template("routeros_ip_firewall_addr_list", ADDRESS_LIST_PROPS[1:], typed=("disabled",), skip=FALSY,
+                        each_key="address")
+
 
 def connect_mikrotik(host, user, password, port):
     """Connect to MikroTik RouterOS via API."""
@@ -28,105 +88,109 @@ def connect_mikrotik(host, user, password, port):
 
 def sanitize_name(name):
     """Make Terraform-safe resource names."""
-    return re.sub(r"[^a-zA-Z0-9_]", "_", name.lower().strip()) or "rule"
+    return sanitize(name.lower().strip()) or "rule"
 
 
-def fetch_rules(api, path, exclude_dynamic=True):
-    """Fetch rules from MikroTik path, skipping dynamic ones if requested."""
-    rules = []
-    for rule in api.path(path):
-        if exclude_dynamic and rule.get("dynamic") == "true":
-            continue
-        rules.append(rule)
-    return rules
+def fetch_rules(api, path, exclude_dynamic=True, keys=INCLUDE_KEYS):
+    """Stream rules from MikroTik path; the router drops dynamic ones if requested."""
+    return iter_select(api, path, [".id", "comment", *keys], exclude_dynamic)
 
 
 def generate_tf_block(resource_type, rule):
-    """Convert a MikroTik rule to Terraform syntax."""
+    """Convert a MikroTik rule to a Terraform row (a block, or an entry of a for_each resource)."""
     comment = rule.get("comment", "")
     name = sanitize_name(comment or f"{resource_type}_{rule.get('.id', 'rule')}")
-    attrs = []
-
-    include_keys = [
-        "chain",
-        "action",
-        "protocol",
-        "src-address",
-        "dst-address",
-        "in-interface",
-        "out-interface",
-        "src-port",
-        "dst-port",
-        "to-addresses",
-        "to-ports",
-        "log",
-        "log-prefix",
-    ]
-
-    for k in include_keys:
-        if k in rule:
-            attrs.append(f'  {k.replace("-", "_")} = "{rule[k]}"')
-
-    if comment:
-        attrs.append(f'  comment = "{comment}"')
-
-    body = "\n".join(attrs)
-    return name, f'resource "{resource_type}" "{name}" {{\n{body}\n}}\n'
+    return name, TEMPLATES[resource_type].row(name, rule)
 
 
-def main():
-    api = connect_mikrotik(HOST, USER, PASS, PORT)
+def import_firewall(api):
+    """Yield (block, address, id, tf_file, section) for every rule and address-list entry, as the router sends them.
 
+    The section (used by --shard and --for-each) is the table and chain, e.g. filter_input or
+    nat_srcnat, and address_list_<list> for address lists.
+    """
     print("📥 Fetching firewall filter rules (non-dynamic)...")
-    filters = fetch_rules(api, "ip/firewall/filter", exclude_dynamic=True)
-    print(f"✅ Found {len(filters)} filter rules")
+    for rule in fetch_rules(api, "ip/firewall/filter", exclude_dynamic=True):
+        name, block = generate_tf_block("routeros_ip_firewall_filter", rule)
+        yield block, f"routeros_ip_firewall_filter.{name}", rule[".id"], None, f"filter_{rule.get('chain')}"
 
     print("📥 Fetching firewall NAT rules...")
-    nats = fetch_rules(api, "ip/firewall/nat", exclude_dynamic=False)
-    print(f"✅ Found {len(nats)} NAT rules")
-
-    tf_blocks = []
-    import_cmds = []
+    for rule in fetch_rules(api, "ip/firewall/nat", exclude_dynamic=False):
+        name, block = generate_tf_block("routeros_ip_firewall_nat", rule)
+        yield block, f"routeros_ip_firewall_nat.{name}", rule[".id"], None, f"nat_{rule.get('chain')}"
+
+    for table in ("mangle", "raw"):
+        print(f"📥 Fetching firewall {table} rules (non-dynamic)...")
+        resource_type = f"routeros_ip_firewall_{table}"
+        for rule in fetch_rules(api, f"ip/firewall/{table}", exclude_dynamic=True, keys=RULE_KEYS[resource_type]):
+            name, block = generate_tf_block(resource_type, rule)
+            yield block, f"{resource_type}.{name}", rule[".id"], None, f"{table}_{rule.get('chain')}"
+
+    # One streamed print for all lists, dynamic entries (timeouts, DNS-resolved) dropped by the
+    # router; the writer sorts the entries into one data file per list as they arrive
+    print("📥 Fetching firewall address lists (non-dynamic)...")
+    for entry in iter_select(api, "ip/firewall/address-list", ADDRESS_LIST_PROPS, exclude_dynamic=True):
+        address = entry.get("address")
+        yield (ADDRESS_LIST.row(address, entry), f"routeros_ip_firewall_addr_list.{sanitize_name(address)}",
+               entry[".id"], None, f"address_list_{entry.get('list')}")
+
+
+def export_router(api, out_dir=".", import_script=False):
+    """Stream the firewall resources of one router into out_dir."""
+    with TfWriter(
+        out_dir,
+        TF_FILE,
+        IMPORT_TF_FILE,
+        header="# Generated automatically by import_firewall.py",
+        import_header="# Generated by import_firewall.py",
+        import_script=import_script and IMPORT_FILE,
+    ) as writer:
+        writer.write_all(import_firewall(api))
+    return writer.imported
 
-    # Filters
-    for rule in filters:
-        name, block = generate_tf_block("routeros_ip_firewall_filter", rule)
-        tf_blocks.append(block)
-        import_cmds.append(f"terraform import routeros_ip_firewall_filter.{name} '{rule['.id']}'")
 
-    # NATs
-    for rule in nats:
-        name, block = generate_tf_block("routeros_ip_firewall_nat", rule)
-        tf_blocks.append(block)
-        import_cmds.append(f"terraform import routeros_ip_firewall_nat.{name} '{rule['.id']}'")
-
-    # Write Terraform configuration
-    with open(TF_FILE, "w") as f:
-        f.write("# Generated automatically by import_firewall.py\n\n")
-        f.write("\n".join(tf_blocks))
-    print(f"✅ Terraform configuration written to {TF_FILE}")
-
-    # Write import commands
-    with open(IMPORT_FILE, "w") as f:
-        f.write("#!/bin/bash\n")
-        f.write("# Generated by import_firewall.py\n\n")
-        for cmd in import_cmds:
-            f.write(cmd + "\n")
-    os.chmod(IMPORT_FILE, 0o755)
-    print(f"✅ Terraform import commands written to {IMPORT_FILE}")
-
-    # Execute terraform imports if terraform is available
-    print("🚀 Running terraform import commands...\n")
-    for cmd in import_cmds:
-        print("🔗", cmd)
-        try:
-            subprocess.run(cmd.split(), check=False)
-        except FileNotFoundError:
-            print("⚠️ Terraform not found in PATH. Skipping execution.")
-
-    print("\n🎉 All rules exported and imported into Terraform state (if terraform was available).")
+def main():
+    parser = argparse.ArgumentParser(
+        description="Export firewall filter, NAT, mangle and raw rules and address lists to Terraform."
+    )
+    add_fleet_arguments(parser)
+    add_backend_arguments(parser)
+    add_import_arguments(parser)
+    add_output_arguments(parser)
+    add_drift_arguments(parser)
+    add_snapshot_arguments(parser)
+    add_metrics_arguments(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    configure_backend(args)
+    configure_imports(args)
+    configure_output(args)
+    configure_drift(args)
+    configure_snapshot(args)
+    configure_metrics(args)
+    configure_profile(args)
+    export = partial(export_router, import_script=args.import_script)
+
+    if args.inventory:
+        routers = load_inventory(args.inventory, USER, PASS, PORT)
+        failures = run_fleet(routers, connect_mikrotik, export, args.workers, args.out_dir, args.skip_unchanged)
+        sys.exit(1 if failures else 0)
+
+    connect_router = with_snapshots(partial(connect_mikrotik, HOST, USER, PASS, PORT))
+    with profiled():
+        with stage("connect", host=HOST):
+            api = RouterSession(connect_router())
+        export(api)
+
+    # Plan the imports (or run the legacy import script) if terraform is available
+    if args.import_script:
+        run_import_script(IMPORT_FILE)
+    else:
+        run_terraform_plan()
+
+    print("\n🎉 All rules exported; apply the import blocks to bring them into Terraform state.")
+    write_report()
 
 
 if __name__ == "__main__":
     main()
-
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+import_all.py
+- Logs in to the router once and runs every collector (routes, firewall, VPN, OSPF,
+  interfaces, interface lists, bridges, misc) over that single API session.
+- Each RouterOS path is fetched at most once per run and shared between collectors.
+- Writes each collector's files into its own sub-directory (routes/, firewall/, ...),
+  so running it from the repository root updates the same files as the single scripts.
+"""
+from librouteros import connect
+from functools import partial
+import argparse
+import importlib.util
+import os
+import socket
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT)
+from common.aioclient import add_backend_arguments, configure_backend  # noqa: E402
+from common.drift import add_drift_arguments, configure_drift  # noqa: E402
+from common.fleet import add_fleet_arguments, load_inventory, run_fleet  # noqa: E402
+from common.metrics import add_metrics_arguments, configure_metrics, stage, write_report  # noqa: E402
+from common.profiling import add_profile_arguments, configure_profile, profiled  # noqa: E402
+from common.session import RouterSession  # noqa: E402
+from common.snapshot import add_snapshot_arguments, configure_snapshot, with_snapshots  # noqa: E402
+from common.tfimport import add_import_arguments, configure_imports  # noqa: E402
+from common.writer import add_output_arguments, configure_output  # noqa: E402
+
+# ---- Connection settings ----
+HOST = "192.168.62.1"
+USER = "terraform"
+PASS = "terraform"
+PORT = 8728
+
+# ---- Collectors: output sub-directory -> script ----
+# misc runs before bridge: its full interface/bridge prints also serve bridge's narrower ones.
+COLLECTORS = {
+    "routes": "routes/import_route.py",
+    "firewall": "firewall/import_firewall.py",
+    "vpn": "vpn/import.vpn.py",
+    "ospf": "ospf/import_ospf.py",
+    "interfaces": "interfaces/import_interface.py",
+    "interface_list": "interface_list/import_list_member.py",
+    "misc": "misc/import_misc.py",
+    "bridge": "bridge/import_bridge.py",
+}
+
+
+def connect_mikrotik(host, user, password, port):
+    """Connect with fallback to API-SSL (8729)."""
+    try:
+        api = connect(username=user, password=password, host=host, port=port, timeout=10)
+        print(f"✅ Connected to {host}:{port}")
+        return api
+    except (socket.timeout, OSError) as e:
+        print(f"⚠️ API plain failed ({e}), trying API-SSL on 8729...")
+        api = connect(username=user, password=password, host=host, port=8729, plaintext_login=True, timeout=10)
+        print("✅ Connected via API-SSL (8729)")
+        return api
+
+
+_modules = {}
+
+
+def load_collector(name):
+    """Load a collector script as a module (file names are not importable, e.g. import.vpn.py)."""
+    if name not in _modules:
+        spec = importlib.util.spec_from_file_location(f"collector_{name}", os.path.join(ROOT, COLLECTORS[name]))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        _modules[name] = module
+    return _modules[name]
+
+
+def export_router(api, out_dir=".", collectors=tuple(COLLECTORS), import_script=False):
+    """Run the selected collectors over one cached session, each into out_dir/<collector>."""
+    session = api if isinstance(api, RouterSession) else RouterSession(api)
+    failed = []
+    for name in collectors:
+        print(f"\n==== {name} ====")
+        collector_dir = os.path.join(out_dir, name)
+        os.makedirs(collector_dir, exist_ok=True)
+        start = time.monotonic()
+        try:
+            with stage("collector", collector=name):
+                load_collector(name).export_router(session, collector_dir, import_script=import_script)
+            print(f"✅ {name} done in {time.monotonic() - start:.1f}s")
+        except Exception as e:
+            print(f"❌ {name} failed: {e!r}")
+            failed.append(name)
+    print(f"\n📊 {session.fetches} paths fetched, {session.reused} served from the session cache")
+    session.stats.report()
+    if failed:
+        raise RuntimeError(f"collectors failed: {', '.join(failed)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run every importer over one API session.")
+    parser.add_argument(
+        "--only",
+        default=",".join(COLLECTORS),
+        help="comma-separated collectors to run (default: all of %(default)s)",
+    )
+    add_fleet_arguments(parser)
+    add_backend_arguments(parser)
+    add_import_arguments(parser)
+    add_output_arguments(parser)
+    add_drift_arguments(parser)
+    add_snapshot_arguments(parser)
+    add_metrics_arguments(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    configure_backend(args)
+    configure_imports(args)
+    configure_output(args)
+    configure_drift(args)
+    configure_snapshot(args)
+    configure_metrics(args)
+    configure_profile(args)
+
+    collectors = [c.strip() for c in args.only.split(",") if c.strip()]
+    unknown = [c for c in collectors if c not in COLLECTORS]
+    if unknown:
+        parser.error(f"unknown collectors: {', '.join(unknown)}")
+    export = partial(export_router, collectors=collectors, import_script=args.import_script)
+
+    if args.inventory:
+        routers = load_inventory(args.inventory, USER, PASS, PORT)
+        failures = run_fleet(routers, connect_mikrotik, export, args.workers, args.out_dir, args.skip_unchanged)
+        sys.exit(1 if failures else 0)
+
+    connect_router = with_snapshots(partial(connect_mikrotik, HOST, USER, PASS, PORT), ROOT)
+    with profiled(ROOT):
+        with stage("connect", host=HOST):
+            api = RouterSession(connect_router())
+        try:
+            export(api, ROOT)
+        except RuntimeError as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+        finally:
+            api.close()
+            write_report()
+
+    print("\n🎉 Done. Run `terraform plan && terraform apply` in each directory to import.")
+
+
+if __name__ == "__main__":
+    main()
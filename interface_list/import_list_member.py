@@ -1,47 +1,74 @@
 #!/usr/bin/env python3
 from librouteros import connect
-import re
+from functools import partial
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.aioclient import add_backend_arguments, configure_backend  # noqa: E402
+from common.drift import add_drift_arguments, configure_drift  # noqa: E402
+from common.fleet import add_fleet_arguments, load_inventory, run_fleet  # noqa: E402
+from common.hcl import Template, resource, sanitize  # noqa: E402
+from common.metrics import add_metrics_arguments, configure_metrics, stage, write_report  # noqa: E402
+from common.profiling import add_profile_arguments, configure_profile, profiled  # noqa: E402
+from common.query import iter_select, select  # noqa: E402
+from common.refs import INTERFACE, INTERFACE_LIST, SymbolTable  # noqa: E402
+from common.session import RouterSession  # noqa: E402
+from common.snapshot import add_snapshot_arguments, configure_snapshot, with_snapshots  # noqa: E402
+from common.tfimport import add_import_arguments, configure_imports  # noqa: E402
+from common.writer import TfWriter, add_output_arguments, configure_output  # noqa: E402
 
 HOST = "192.168.62.1"
 USER = "terraform"
 PASS = "terraform"
 PORT = 8728
 
+TF_FILE = "interface_list_import.tf"
+IMPORT_TF_FILE = "interface_list_imports.tf"
+IMPORT_FILE = "interface_list_import.sh"
+
+LIST = Template("routeros_interface_list", ["name"])
+MEMBER = Template("routeros_interface_list_member", ["list", "interface"])
+# Member attributes naming a list or interface exported here become references
+MEMBER_LINKS = {"list": INTERFACE_LIST, "interface": INTERFACE}
+
+
+def connect_mikrotik(host=HOST, user=USER, password=PASS, port=PORT):
+    print(f"✅ Connecting to {host}:{port}")
+    return connect(username=user, password=password, host=host, port=port)
+
 
 def sanitize_name(name: str) -> str:
     """Make safe Terraform resource names."""
-    return re.sub(r"[^a-zA-Z0-9_]", "_", name)
+    return sanitize(name)
 
 
 def import_resources(api):
-    tf_blocks = []
-    import_cmds = []
+    """Yield (block, address, id) for interface lists, their members and ROMON."""
+    symbols = SymbolTable()
 
     # --- interface list ---
     print("📥 Fetching /interface/list ...")
-    lists = list(api(cmd="/interface/list/print"))
+    lists = select(api, "/interface/list", [".id", "name"])
     print(f"✅ Found {len(lists)} interface lists")
 
     for r in lists:
         name = sanitize_name(r.get("name", "unnamed"))
-        tf_blocks.append(f'resource "routeros_interface_list" "{name}" {{\n  name = "{r["name"]}"\n}}\n')
-        if ".id" in r:
-            import_cmds.append(f"terraform import routeros_interface_list.{name} '{r['.id']}'")
+        block = LIST.render(name, r)
+        address = f"routeros_interface_list.{name}"
+        symbols.define(INTERFACE_LIST, r.get("name"), address)
+        yield block, address, r.get(".id")
 
     # --- interface list members ---
     print("📥 Fetching /interface/list/member ...")
-    members = list(api(cmd="/interface/list/member/print"))
-    print(f"✅ Found {len(members)} interface list members")
+    members = iter_select(api, "/interface/list/member", [".id", "list", "interface"], exclude_dynamic=True)
 
     for r in members:
         name = sanitize_name(f"{r.get('list','list')}_{r.get('interface','iface')}")
-        tf_blocks.append(
-            f'resource "routeros_interface_list_member" "{name}" {{\n'
-            f'  list      = "{r.get("list", "")}"\n'
-            f'  interface = "{r.get("interface", "")}"\n}}\n'
-        )
-        if ".id" in r:
-            import_cmds.append(f"terraform import routeros_interface_list_member.{name} '{r['.id']}'")
+        address = f"routeros_interface_list_member.{name}"
+        block = MEMBER.row(name, symbols.link(r, MEMBER_LINKS, address))
+        yield block, address, r.get(".id")
 
     # --- romon ---
     print("📥 Fetching /tool/romon ...")
@@ -50,31 +77,49 @@ def import_resources(api):
 
     for r in romon:
         name = sanitize_name(r.get("id", "romon"))
-        tf_blocks.append(
-            f'resource "routeros_tool_romon" "{name}" {{\n'
-            f'  enabled = {str(r.get("enabled", "no")).lower() == "yes"}\n'
-            f'}}\n'
-        )
-        if ".id" in r:
-            import_cmds.append(f"terraform import routeros_tool_romon.{name} '{r['.id']}'")
+        block = resource("routeros_tool_romon", name, {"enabled": r.get("enabled", False)}, typed=True)
+        yield block, f"routeros_tool_romon.{name}", r.get(".id")
 
-    return tf_blocks, import_cmds
 
+def export_router(api, out_dir=".", import_script=False):
+    """Stream the interface lists, members and ROMON of one router into out_dir."""
+    with TfWriter(out_dir, TF_FILE, IMPORT_TF_FILE, import_script=import_script and IMPORT_FILE) as writer:
+        writer.write_all(import_resources(api))
+    return writer.imported
 
-def main():
-    print(f"✅ Connecting to {HOST}:{PORT}")
-    api = connect(username=USER, password=PASS, host=HOST, port=PORT)
-    tf_blocks, import_cmds = import_resources(api)
-
-    with open("interface_list_import.tf", "w") as f:
-        f.write("\n".join(tf_blocks))
-    with open("interface_list_import.sh", "w") as f:
-        f.write("\n".join(import_cmds))
 
-    print("✅ Terraform definitions written to interface_list_import.tf")
-    print("✅ Import commands written to interface_list_import.sh")
+def main():
+    parser = argparse.ArgumentParser(description="Export interface lists, list members and ROMON to Terraform.")
+    add_fleet_arguments(parser)
+    add_backend_arguments(parser)
+    add_import_arguments(parser)
+    add_output_arguments(parser)
+    add_drift_arguments(parser)
+    add_snapshot_arguments(parser)
+    add_metrics_arguments(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    configure_backend(args)
+    configure_imports(args)
+    configure_output(args)
+    configure_drift(args)
+    configure_snapshot(args)
+    configure_metrics(args)
+    configure_profile(args)
+    export = partial(export_router, import_script=args.import_script)
+
+    if args.inventory:
+        routers = load_inventory(args.inventory, USER, PASS, PORT)
+        failures = run_fleet(routers, connect_mikrotik, export, args.workers, args.out_dir, args.skip_unchanged)
+        sys.exit(1 if failures else 0)
+
+    connect_router = with_snapshots(connect_mikrotik)
+    with profiled():
+        with stage("connect", host=HOST):
+            api = RouterSession(connect_router())
+        export(api)
+    write_report()
 
 
 if __name__ == "__main__":
     main()
-
@@ -1,6 +1,23 @@
 #!/usr/bin/env python3
 from librouteros import connect
+from functools import partial
+import argparse
 import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.aioclient import add_backend_arguments, configure_backend  # noqa: E402
+from common.drift import add_drift_arguments, configure_drift  # noqa: E402
+from common.fleet import add_fleet_arguments, load_inventory, run_fleet  # noqa: E402
+from common.hcl import Template  # noqa: E402
+from common.metrics import add_metrics_arguments, configure_metrics, stage, write_report  # noqa: E402
+from common.profiling import add_profile_arguments, configure_profile, profiled  # noqa: E402
+from common.query import select  # noqa: E402
+from common.refs import INTERFACE, SymbolTable  # noqa: E402
+from common.session import RouterSession, prefetch  # noqa: E402
+from common.snapshot import add_snapshot_arguments, configure_snapshot, with_snapshots  # noqa: E402
+from common.tfimport import add_import_arguments, configure_imports  # noqa: E402
+from common.writer import TfWriter, add_output_arguments, configure_output  # noqa: E402
 
 # ======= CONFIGURATION =======
 HOST = "192.168.62.1"
@@ -8,69 +25,165 @@ USER = "terraform"
 PASS = "terraform"
 PORT = 8728
 
-# ======= CONNECT TO MIKROTIK =======
-api = connect(username=USER, password=PASS, host=HOST, port=PORT)
-print(f"✅ Connected to {HOST}")
+TF_FILE = "interfaces.tf"
+IMPORT_TF_FILE = "import_interfaces.tf"
+IMPORT_FILE = "import_interfaces.sh"
+
+# ======= PROPERTIES REQUESTED FROM THE ROUTER =======
+INTERFACE_PROPS = [".id", "name", "type", "disabled", "mtu", "mac-address", "comment"]
 
-# ======= FETCH INTERFACES =======
-interfaces = list(api(cmd="/interface/print"))
-print(f"🔍 Found {len(interfaces)} interfaces")
+# ======= TYPE-SPECIFIC DETAILS =======
+# /interface type -> (Terraform resource, detail table, properties read from it and joined by name)
+INTERFACE_TYPES = {
+    "ether": ("routeros_interface_ethernet", "/interface/ethernet",
+              ["arp", "l2mtu", "advertise", "auto-negotiation", "speed", "full-duplex", "rx-flow-control",
+               "tx-flow-control"]),
+    "bridge": ("routeros_interface_bridge", "/interface/bridge",
+               ["arp", "admin-mac", "auto-mac", "protocol-mode", "vlan-filtering", "pvid", "frame-types",
+                "igmp-snooping"]),
+    "vlan": ("routeros_interface_vlan", "/interface/vlan", ["arp", "interface", "vlan-id", "use-service-tag"]),
+    "bond": ("routeros_interface_bonding", "/interface/bonding",
+             ["arp", "slaves", "mode", "lacp-rate", "transmit-hash-policy", "mii-interval", "min-links"]),
+    "wg": ("routeros_interface_wireguard", "/interface/wireguard", ["listen-port"]),
+    "macvlan": ("routeros_interface_macvlan", "/interface/macvlan", ["arp", "interface", "mode"]),
+    "eoip": ("routeros_interface_eoip", "/interface/eoip",
+             ["arp", "local-address", "remote-address", "tunnel-id", "keepalive"]),
+    "gre": ("routeros_interface_gre", "/interface/gre", ["local-address", "remote-address", "keepalive"]),
+    "vrrp": ("routeros_interface_vrrp", "/interface/vrrp", ["arp", "interface", "vrid", "priority", "interval"]),
+    "veth": ("routeros_interface_veth", "/interface/veth", ["address", "gateway"]),
+}
+# Older code matched "bonding"; RouterOS reports "bond"
+INTERFACE_TYPES["bonding"] = INTERFACE_TYPES["bond"]
+GENERIC_TYPE = "routeros_interface"
+# Comma-separated properties the provider takes as a list of strings
+LIST_PROPS = ("slaves",)
+# Attributes naming another interface exported here (a VLAN's parent) become references
+LINKS = {"interface": INTERFACE}
 
-# ======= PREPARE OUTPUT FILES =======
-tf_file = open("interfaces.tf", "w")
-import_file = open("import_interfaces.sh", "w")
+# ======= BLOCKS PER TERRAFORM RESOURCE (numbers and booleans unquoted) =======
+TYPED = ("mtu", "l2mtu", "disabled", "auto-negotiation", "full-duplex", "vlan-filtering", "pvid", "igmp-snooping",
+         "vlan-id", "use-service-tag", "min-links", "listen-port", "tunnel-id", "vrid", "priority")
+TEMPLATES = {
+    tf_type: Template(tf_type, ["name", "mtu", "mac-address", *props, "disabled", "comment"], typed=TYPED,
+                      defaults={"disabled": False})
+    for tf_type, _, props in [*INTERFACE_TYPES.values(), (GENERIC_TYPE, None, [])]
+}
+
+# ======= CONNECT TO MIKROTIK =======
+def connect_mikrotik(host=HOST, user=USER, password=PASS, port=PORT):
+    api = connect(username=user, password=password, host=host, port=port)
+    print(f"✅ Connected to {host}")
+    return api
 
 def safe_name(name):
     """Make Terraform-safe name"""
     return name.replace("-", "_").replace(" ", "_").replace(".", "_")
 
-# ======= PROCESS EACH INTERFACE =======
-for iface in interfaces:
-    name = iface.get("name")
-    if not name:
-        continue
-
-    iface_id = iface.get(".id")
-    iface_type = iface.get("type", "ethernet")
-    disabled = str(iface.get("disabled", "false")).lower()
-    mtu = iface.get("mtu")
-    mac = iface.get("mac-address", "")
-    comment = iface.get("comment", "")
-    resource_name = safe_name(name)
-
-    # Map MikroTik type to Terraform resource
-    if iface_type == "ether":
-        tf_type = "routeros_interface_ethernet"
-    elif iface_type == "bridge":
-        tf_type = "routeros_interface_bridge"
-    elif iface_type == "vlan":
-        tf_type = "routeros_interface_vlan"
-    elif iface_type == "bonding":
-        tf_type = "routeros_interface_bonding"
-    else:
-        tf_type = "routeros_interface"
-
-    # ======= WRITE .TF RESOURCE =======
-    tf_file.write(f'resource "{tf_type}" "{resource_name}" {{\n')
-    tf_file.write(f'  name     = "{name}"\n')
-    if mtu:
-        tf_file.write(f'  mtu      = {mtu}\n')
-    if mac:
-        tf_file.write(f'  mac_address = "{mac}"\n')
-    tf_file.write(f'  disabled = {disabled}\n')
-    if comment:
-        tf_file.write(f'  comment  = "{comment}"\n')
-    tf_file.write("}\n\n")
-
-    # ======= WRITE IMPORT COMMAND =======
-    import_file.write(f'terraform import {tf_type}.{resource_name} "*{iface_id}"\n')
-
-tf_file.close()
-import_file.close()
-
-print("✅ Generated:")
-print("  - interfaces.tf")
-print("  - import_interfaces.sh")
-print("Run:")
-print("  chmod +x import_interfaces.sh && ./import_interfaces.sh")
+def detail_index(api, path, props):
+    """name -> type-specific properties of every interface in one detail table, from one print.
+
+    The table is read whole and without dynamic entries, as misc and bridge read it, so
+    under import_all one cached print serves all three.
+    """
+    try:
+        return {entry["name"]: {k: entry[k] for k in props if k in entry}
+                for entry in select(api, path, exclude_dynamic=True) if "name" in entry}
+    except Exception as e:
+        # a missing package: its interfaces keep the base properties
+        print(f"⚠️ Failed to fetch {path}: {e}")
+        return {}
+
+def split_list(value):
+    """A comma-separated property as a tuple, so it renders as an HCL list: "ether1,ether2" -> ("ether1", "ether2")."""
+    return tuple(p for p in value.split(",") if p)
+
+def interface_resources(api):
+    """Yield (block, address, id) for every interface."""
+    # ======= BASE LISTING (dynamic interfaces cannot be imported) =======
+    interfaces = select(api, "/interface", INTERFACE_PROPS, exclude_dynamic=True)
+
+    # ======= ONE DETAIL FETCH PER TYPE PRESENT =======
+    present = {}  # detail path -> properties, in the order the types first appear
+    for iface in interfaces:
+        known = INTERFACE_TYPES.get(iface.get("type", "ether"))
+        if known:
+            present[known[1]] = known[2]
+    prefetch(api, list(present), exclude_dynamic=True)
+    details = {path: detail_index(api, path, props) for path, props in present.items()}
+
+    # ======= MAP EACH INTERFACE TO ITS RESOURCE, JOINED WITH ITS DETAILS BY NAME =======
+    resources = []
+    symbols = SymbolTable()
+    for iface in interfaces:
+        name = iface.get("name")
+        if not name:
+            continue
+
+        resource_name = safe_name(name)
+
+        known = INTERFACE_TYPES.get(iface.get("type", "ether"))
+        if known:
+            tf_type, path, _ = known
+            iface = {**details[path].get(name, {}), **iface}
+            for key in LIST_PROPS:
+                if iface.get(key).__class__ is str:
+                    iface[key] = split_list(iface[key])
+        else:
+            tf_type = GENERIC_TYPE
+        address = f"{tf_type}.{resource_name}"
+        symbols.define(INTERFACE, name, address)
+        resources.append((tf_type, resource_name, address, iface))
+
+    # ======= WRITE .TF RESOURCES =======
+    for tf_type, resource_name, address, iface in resources:
+        block = TEMPLATES[tf_type].render(resource_name, symbols.link(iface, LINKS, address))
+
+        yield block, address, iface.get(".id")
+
+def export_router(api, out_dir=".", import_script=False):
+    """Stream every interface and its import block into out_dir."""
+    with TfWriter(out_dir, TF_FILE, IMPORT_TF_FILE, trailer="\n",
+                  import_script=import_script and IMPORT_FILE) as writer:
+        writer.write_all(interface_resources(api))
+    return writer.imported
+
+def main():
+    parser = argparse.ArgumentParser(description="Export every interface to Terraform.")
+    add_fleet_arguments(parser)
+    add_backend_arguments(parser)
+    add_import_arguments(parser)
+    add_output_arguments(parser)
+    add_drift_arguments(parser)
+    add_snapshot_arguments(parser)
+    add_metrics_arguments(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    configure_backend(args)
+    configure_imports(args)
+    configure_output(args)
+    configure_drift(args)
+    configure_snapshot(args)
+    configure_metrics(args)
+    configure_profile(args)
+    export = partial(export_router, import_script=args.import_script)
+
+    if args.inventory:
+        routers = load_inventory(args.inventory, USER, PASS, PORT)
+        failures = run_fleet(routers, connect_mikrotik, export, args.workers, args.out_dir, args.skip_unchanged)
+        sys.exit(1 if failures else 0)
+
+    connect_router = with_snapshots(connect_mikrotik)
+    with profiled():
+        with stage("connect", host=HOST):
+            api = RouterSession(connect_router())
+        export(api)
+
+    print("✅ Generated:")
+    print("  - interfaces.tf")
+    print("  - import_interfaces.tf")
+    print("Run:")
+    print("  terraform plan && terraform apply")
+    write_report()
 
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,25 @@
 #!/usr/bin/env python3
+import argparse
+from functools import partial
 import os
-import re
 import sys
 import subprocess
 from librouteros import connect
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.aioclient import add_backend_arguments, configure_backend  # noqa: E402
+from common.drift import add_drift_arguments, configure_drift  # noqa: E402
+from common.fleet import add_fleet_arguments, load_inventory, run_fleet  # noqa: E402
+from common.hcl import Template, sanitize  # noqa: E402
+from common.metrics import add_metrics_arguments, configure_metrics, stage, write_report  # noqa: E402
+from common.profiling import add_profile_arguments, configure_profile, profiled  # noqa: E402
+from common.query import select  # noqa: E402
+from common.refs import INTERFACE, SymbolTable  # noqa: E402
+from common.session import RouterSession, prefetch  # noqa: E402
+from common.snapshot import add_snapshot_arguments, configure_snapshot, with_snapshots  # noqa: E402
+from common.tfimport import add_import_arguments, configure_imports  # noqa: E402
+from common.writer import TfWriter, add_output_arguments, configure_output  # noqa: E402
+
 # --- MikroTik API credentials ---
 HOST = "192.168.62.1"
 USER = "terraform"
@@ -13,14 +28,30 @@ PORT = 8728
 
 # --- Output files ---
 TF_FILE = "interfaces.tf"
+IMPORT_TF_FILE = "interfaces_imports.tf"
 IMPORT_FILE = "interfaces_imports.sh"
 
+# --- Properties requested for the resources with a fixed field list ---
+DHCP_CLIENT_PROPS = [".id", "interface", "use-peer-dns", "use-peer-ntp", "add-default-route",
+                     "default-route-distance", "comment"]
+PPP_PROFILE_PROPS = [".id", "name", "local-address", "remote-address", "use-mpls", "only-one",
+                     "rate-limit", "dns-server", "comment"]
+IP_POOL_PROPS = [".id", "name", "ranges", "next-pool", "comment"]
+
+# --- Blocks of the resources with a fixed field list ---
+DHCP_CLIENT = Template("routeros_ip_dhcp_client", DHCP_CLIENT_PROPS[1:])
+PPP_PROFILE = Template("routeros_ppp_profile", PPP_PROFILE_PROPS[2:])
+IP_POOL = Template("routeros_ip_pool", IP_POOL_PROPS[2:])
+
+# Attributes naming an interface exported here become references
+LINKS = {"interface": INTERFACE, "bridge": INTERFACE}
+
 
-def connect_mikrotik():
+def connect_mikrotik(host=HOST, user=USER, password=PASS, port=PORT):
     """Connect to MikroTik RouterOS via API."""
     try:
-        api = connect(username=USER, password=PASS, host=HOST, port=PORT, timeout=10)
-        print(f"✅ Connected to {HOST}:{PORT}")
+        api = connect(username=user, password=password, host=host, port=port, timeout=10)
+        print(f"✅ Connected to {host}:{port}")
         return api
     except Exception as e:
         print(f"❌ Failed to connect: {e}")
@@ -29,52 +60,20 @@ def connect_mikrotik():
 
 def sanitize_name(name):
     """Convert any name into Terraform-safe format."""
-    return re.sub(r"[^a-zA-Z0-9_]", "_", str(name).lower().strip() or "entry")
+    return sanitize(str(name).lower().strip() or "entry")
 
 
-def make_tf_block(resource, name, fields):
-    """Generate a Terraform resource block."""
-    lines = [f'resource "{resource}" "{name}" {{']
-    for k, v in fields.items():
-        if v not in (None, "", [], {}):
-            lines.append(f'  {k} = "{v}"')
-    lines.append("}\n")
-    return "\n".join(lines)
-
-
-def fetch(api, path, exclude_dynamic=True):
-    """Fetch RouterOS entries via API."""
+def fetch(api, path, exclude_dynamic=True, proplist=None):
+    """Fetch RouterOS entries via API; dynamic ones are filtered by the router."""
     try:
-        result = []
-        for entry in api.path(path):
-            if exclude_dynamic and entry.get("dynamic") == "true":
-                continue
-            result.append(entry)
-        return result
+        return select(api, path, proplist, exclude_dynamic)
     except Exception as e:
         print(f"⚠️ Failed to fetch {path}: {e}")
         return []
 
 
-def write_files(tf_blocks, import_cmds):
-    """Write Terraform and import scripts."""
-    with open(TF_FILE, "w") as f:
-        f.write("# Generated by import_pppoe_full.py\n\n")
-        f.write("\n".join(tf_blocks))
-    print(f"✅ Terraform definitions written to {TF_FILE}")
-
-    with open(IMPORT_FILE, "w") as f:
-        f.write("#!/bin/bash\n# Generated by import_pppoe_full.py\n\n")
-        for cmd in import_cmds:
-            f.write(cmd + "\n")
-    os.chmod(IMPORT_FILE, 0o755)
-    print(f"✅ Import commands written to {IMPORT_FILE}")
-
-
 def import_resources(api):
-    tf_blocks = []
-    import_cmds = []
-
+    """Yield (block, address, id) for every interface, DHCP client, PPP profile and IP pool."""
     mappings = {
         "interface/ethernet": "routeros_interface_ethernet",
         "interface/vlan": "routeros_interface_vlan",
@@ -85,81 +84,101 @@ def import_resources(api):
         "interface/pppoe-client": "routeros_interface_pppoe_client",
         "interface/pppoe-server/server": "routeros_interface_pppoe_server",
     }
+    interface_paths = ["interface/ethernet", "interface/vlan", "interface/bridge", "interface/bonding",
+                       "interface/macvlan", "interface/pppoe-client"]
+
+    prefetch(api, [*mappings, ("ip/dhcp-client", DHCP_CLIENT_PROPS), ("ppp/profile", PPP_PROFILE_PROPS),
+                   ("ip/pool", IP_POOL_PROPS)], exclude_dynamic=True)
+
+    # Every interface is known before any block is rendered, so a VLAN can refer to the
+    # bridge exported after it
+    sections = {path: fetch(api, path) for path in mappings}
+    symbols = SymbolTable()
+    for path in interface_paths:
+        for e in sections[path]:
+            symbols.define(INTERFACE, e.get("name"), f"{mappings[path]}.{sanitize_name(e.get('name') or e.get('.id'))}")
 
     for path, tf_resource in mappings.items():
         print(f"📥 Fetching {path}...")
-        entries = fetch(api, path)
+        entries = sections[path]
+        template = Template(tf_resource)
         for e in entries:
             name = sanitize_name(e.get("name") or e.get(".id"))
-            fields = {k.replace("-", "_"): v for k, v in e.items() if not k.startswith(".")}
-            tf_blocks.append(make_tf_block(tf_resource, name, fields))
-            import_cmds.append(f"terraform import {tf_resource}.{name} '{e['.id']}'")
+            address = f"{tf_resource}.{name}"
+            yield template.render(name, symbols.link(e, LINKS, address)), address, e[".id"]
         print(f"✅ Found {len(entries)} entries in {path}")
 
     # DHCP clients
     print("📥 Fetching DHCP clients...")
-    dhcp_clients = fetch(api, "ip/dhcp-client")
+    dhcp_clients = fetch(api, "ip/dhcp-client", proplist=DHCP_CLIENT_PROPS)
     for d in dhcp_clients:
         name = sanitize_name(d.get("interface") or d.get(".id"))
-        fields = {
-            "interface": d.get("interface"),
-            "use_peer_dns": d.get("use-peer-dns"),
-            "use_peer_ntp": d.get("use-peer-ntp"),
-            "add_default_route": d.get("add-default-route"),
-            "default_route_distance": d.get("default-route-distance"),
-            "comment": d.get("comment"),
-        }
-        tf_blocks.append(make_tf_block("routeros_ip_dhcp_client", name, fields))
-        import_cmds.append(f"terraform import routeros_ip_dhcp_client.{name} '{d['.id']}'")
+        address = f"routeros_ip_dhcp_client.{name}"
+        yield DHCP_CLIENT.render(name, symbols.link(d, LINKS, address)), address, d[".id"]
     print(f"✅ Found {len(dhcp_clients)} DHCP clients")
 
     # PPP profiles
     print("📥 Fetching PPP profiles...")
-    ppp_profiles = fetch(api, "ppp/profile")
+    ppp_profiles = fetch(api, "ppp/profile", proplist=PPP_PROFILE_PROPS)
     for p in ppp_profiles:
         name = sanitize_name(p.get("name") or p.get(".id"))
-        fields = {
-            "local_address": p.get("local-address"),
-            "remote_address": p.get("remote-address"),
-            "use_mpls": p.get("use-mpls"),
-            "only_one": p.get("only-one"),
-            "rate_limit": p.get("rate-limit"),
-            "dns_server": p.get("dns-server"),
-            "comment": p.get("comment"),
-        }
-        tf_blocks.append(make_tf_block("routeros_ppp_profile", name, fields))
-        import_cmds.append(f"terraform import routeros_ppp_profile.{name} '{p['.id']}'")
+        yield PPP_PROFILE.render(name, p), f"routeros_ppp_profile.{name}", p[".id"]
     print(f"✅ Found {len(ppp_profiles)} PPP profiles")
 
     # IP pools
     print("📥 Fetching IP pools...")
-    ip_pools = fetch(api, "ip/pool")
+    ip_pools = fetch(api, "ip/pool", proplist=IP_POOL_PROPS)
     for pool in ip_pools:
         name = sanitize_name(pool.get("name") or pool.get(".id"))
-        fields = {
-            "ranges": pool.get("ranges"),
-            "next_pool": pool.get("next-pool"),
-            "comment": pool.get("comment"),
-        }
-        tf_blocks.append(make_tf_block("routeros_ip_pool", name, fields))
-        import_cmds.append(f"terraform import routeros_ip_pool.{name} '{pool['.id']}'")
+        yield IP_POOL.render(name, pool), f"routeros_ip_pool.{name}", pool[".id"]
     print(f"✅ Found {len(ip_pools)} IP pools")
 
-    return tf_blocks, import_cmds
 
+def export_router(api, out_dir=".", import_script=False):
+    """Stream the interface resources of one router into out_dir."""
+    with TfWriter(out_dir, TF_FILE, IMPORT_TF_FILE, header="# Generated by import_pppoe_full.py",
+                  import_script=import_script and IMPORT_FILE) as writer:
+        writer.write_all(import_resources(api))
+    return writer.imported
 
-def main():
-    api = connect_mikrotik()
-    tf_blocks, import_cmds = import_resources(api)
-    write_files(tf_blocks, import_cmds)
 
-    print("\n🚀 Ready to import:")
-    for cmd in import_cmds:
-        print("  " + cmd)
+def main():
+    parser = argparse.ArgumentParser(description="Export interfaces, DHCP clients, PPP profiles and IP pools to Terraform.")
+    add_fleet_arguments(parser)
+    add_backend_arguments(parser)
+    add_import_arguments(parser)
+    add_output_arguments(parser)
+    add_drift_arguments(parser)
+    add_snapshot_arguments(parser)
+    add_metrics_arguments(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    configure_backend(args)
+    configure_imports(args)
+    configure_output(args)
+    configure_drift(args)
+    configure_snapshot(args)
+    configure_metrics(args)
+    configure_profile(args)
+    export = partial(export_router, import_script=args.import_script)
+
+    if args.inventory:
+        routers = load_inventory(args.inventory, USER, PASS, PORT)
+        failures = run_fleet(routers, connect_mikrotik, export, args.workers, args.out_dir, args.skip_unchanged)
+        sys.exit(1 if failures else 0)
+
+    connect_router = with_snapshots(connect_mikrotik)
+    with profiled():
+        with stage("connect", host=HOST):
+            api = RouterSession(connect_router())
+        imported = export(api)
+
+    print(f"\n🚀 Ready to import {imported} resources.")
 
     print("\nRun:")
-    print("  ./interfaces_imports.sh")
-    print("to execute all Terraform imports.")
+    print("  terraform plan && terraform apply")
+    print("to import everything in one Terraform run.")
+    write_report()
 
 
 if __name__ == "__main__":
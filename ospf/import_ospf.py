@@ -1,9 +1,23 @@
 #!/usr/bin/env python3
+import argparse
+from functools import partial
 import os
-import re
 import sys
 from librouteros import connect
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.aioclient import add_backend_arguments, configure_backend  # noqa: E402
+from common.drift import add_drift_arguments, configure_drift  # noqa: E402
+from common.fleet import add_fleet_arguments, load_inventory, run_fleet  # noqa: E402
+from common.hcl import FALSY, Template, sanitize  # noqa: E402
+from common.metrics import add_metrics_arguments, configure_metrics, stage, write_report  # noqa: E402
+from common.profiling import add_profile_arguments, configure_profile, profiled  # noqa: E402
+from common.query import select  # noqa: E402
+from common.session import RouterSession, prefetch  # noqa: E402
+from common.snapshot import add_snapshot_arguments, configure_snapshot, with_snapshots  # noqa: E402
+from common.tfimport import add_import_arguments, configure_imports  # noqa: E402
+from common.writer import TfWriter, add_output_arguments, configure_output  # noqa: E402
+
 # --- MikroTik credentials ---
 HOST = "192.168.62.1"
 USER = "terraform"
@@ -12,13 +26,14 @@ PORT = 8728
 
 # --- Output files ---
 TF_FILE = "ospf.tf"
+IMPORT_TF_FILE = "ospf_imports.tf"
 IMPORT_FILE = "ospf_imports.sh"
 
 
-def connect_mikrotik():
+def connect_mikrotik(host=HOST, user=USER, password=PASS, port=PORT):
     try:
-        api = connect(username=USER, password=PASS, host=HOST, port=PORT, timeout=10)
-        print(f"✅ Connected to {HOST}:{PORT}")
+        api = connect(username=user, password=password, host=host, port=port, timeout=10)
+        print(f"✅ Connected to {host}:{port}")
         return api
     except Exception as e:
         print(f"❌ Failed to connect: {e}")
@@ -27,49 +42,19 @@ def connect_mikrotik():
 
 def sanitize_name(name):
     """Make Terraform-safe names."""
-    return re.sub(r"[^a-zA-Z0-9_]", "_", str(name or "unnamed").lower())
-
-
-def make_tf_block(resource, name, fields):
-    lines = [f'resource "{resource}" "{name}" {{']
-    for k, v in fields.items():
-        if v not in (None, "", [], {}, "false", False):
-            lines.append(f'  {k.replace("-", "_")} = "{v}"')
-    lines.append("}\n")
-    return "\n".join(lines)
+    return sanitize(str(name or "unnamed").lower())
 
 
 def fetch(api, path, exclude_dynamic=True):
     try:
-        entries = []
-        for e in api.path(path):
-            if exclude_dynamic and e.get("dynamic") == "true":
-                continue
-            entries.append(e)
-        return entries
+        return select(api, path, exclude_dynamic=exclude_dynamic)
     except Exception as e:
         print(f"⚠️ Failed to fetch {path}: {e}")
         return []
 
 
-def write_files(tf_blocks, import_cmds):
-    with open(TF_FILE, "w") as f:
-        f.write("# Generated by import_ospf.py\n\n")
-        f.write("\n".join(tf_blocks))
-    print(f"✅ Terraform configuration written to {TF_FILE}")
-
-    with open(IMPORT_FILE, "w") as f:
-        f.write("#!/bin/bash\n# Generated by import_ospf.py\n\n")
-        for cmd in import_cmds:
-            f.write(cmd + "\n")
-    os.chmod(IMPORT_FILE, 0o755)
-    print(f"✅ Terraform import commands written to {IMPORT_FILE}")
-
-
 def import_ospf(api):
-    tf_blocks = []
-    import_cmds = []
-
+    """Yield (block, address, id) for every OSPF instance, area, interface template and neighbor."""
     sections = {
         "routing/ospf/instance": "routeros_routing_ospf_instance",
         "routing/ospf/area": "routeros_routing_ospf_area",
@@ -77,31 +62,64 @@ def import_ospf(api):
         "routing/ospf/neighbor": "routeros_routing_ospf_neighbor",
     }
 
+    prefetch(api, sections, exclude_dynamic=True)
+
     for path, tf_resource in sections.items():
         print(f"📥 Fetching {path} ...")
         entries = fetch(api, path)
+        # disabled features ("false") are left out as well
+        template = Template(tf_resource, skip=FALSY | {"false"})
         for e in entries:
             name = sanitize_name(e.get("name") or e.get("interface") or e.get(".id"))
-            fields = {k.replace("-", "_"): v for k, v in e.items() if not k.startswith(".")}
-            tf_blocks.append(make_tf_block(tf_resource, name, fields))
-            import_cmds.append(f"terraform import {tf_resource}.{name} '{e['.id']}'")
+            yield template.render(name, e), f"{tf_resource}.{name}", e[".id"]
         print(f"✅ Imported {len(entries)} entries from {path}")
 
-    return tf_blocks, import_cmds
 
+def export_router(api, out_dir=".", import_script=False):
+    """Stream the OSPF resources of one router into out_dir."""
+    with TfWriter(out_dir, TF_FILE, IMPORT_TF_FILE, header="# Generated by import_ospf.py",
+                  import_script=import_script and IMPORT_FILE) as writer:
+        writer.write_all(import_ospf(api))
+    return writer.imported
 
-def main():
-    api = connect_mikrotik()
-    tf_blocks, import_cmds = import_ospf(api)
-    write_files(tf_blocks, import_cmds)
 
-    print("\n🚀 Ready to import:")
-    for cmd in import_cmds:
-        print("  " + cmd)
+def main():
+    parser = argparse.ArgumentParser(description="Export OSPF instances, areas, templates and neighbors to Terraform.")
+    add_fleet_arguments(parser)
+    add_backend_arguments(parser)
+    add_import_arguments(parser)
+    add_output_arguments(parser)
+    add_drift_arguments(parser)
+    add_snapshot_arguments(parser)
+    add_metrics_arguments(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    configure_backend(args)
+    configure_imports(args)
+    configure_output(args)
+    configure_drift(args)
+    configure_snapshot(args)
+    configure_metrics(args)
+    configure_profile(args)
+    export = partial(export_router, import_script=args.import_script)
+
+    if args.inventory:
+        routers = load_inventory(args.inventory, USER, PASS, PORT)
+        failures = run_fleet(routers, connect_mikrotik, export, args.workers, args.out_dir, args.skip_unchanged)
+        sys.exit(1 if failures else 0)
+
+    connect_router = with_snapshots(connect_mikrotik)
+    with profiled():
+        with stage("connect", host=HOST):
+            api = RouterSession(connect_router())
+        imported = export(api)
+
+    print(f"\n🚀 Ready to import {imported} resources.")
 
     print("\nRun:")
-    print("  ./ospf_imports.sh")
-    print("to execute all Terraform imports.")
+    print("  terraform plan && terraform apply")
+    print("to import everything in one Terraform run.")
+    write_report()
 
 
 if __name__ == "__main__":
@@ -2,15 +2,31 @@
 """
 import_routes_with_imports.py
 - Uses librouteros to read routing tables, routing rules, and static ip routes.
-- Writes routing_import.tf and routing_imports.sh (chmod +x).
-- Optionally executes terraform import commands if terraform is available in PATH.
+- Writes routing_import.tf and routing_imports.tf (Terraform import blocks).
+- With --import-script also writes routing_imports.sh (chmod +x) with one terraform import per resource.
+- Optionally runs terraform plan (or the import script) if terraform is available in PATH.
+- Routes are streamed from the router to disk one record at a time, so a full table
+  never has to fit in memory.
 """
 from librouteros import connect
-import re
+from functools import partial
+import argparse
 import socket
 import os
-import subprocess
-import shutil
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.aioclient import add_backend_arguments, configure_backend  # noqa: E402
+from common.drift import add_drift_arguments, configure_drift  # noqa: E402
+from common.fleet import add_fleet_arguments, load_inventory, run_fleet  # noqa: E402
+from common.hcl import Template, sanitize  # noqa: E402
+from common.metrics import add_metrics_arguments, configure_metrics, stage, write_report  # noqa: E402
+from common.profiling import add_profile_arguments, configure_profile, profiled  # noqa: E402
+from common.query import iter_select  # noqa: E402
+from common.session import RouterSession  # noqa: E402
+from common.snapshot import add_snapshot_arguments, configure_snapshot, with_snapshots  # noqa: E402
+from common.tfimport import add_import_arguments, configure_imports, run_import_script, run_terraform_plan  # noqa: E402
+from common.writer import TfWriter, add_output_arguments, configure_output  # noqa: E402
 
 # ---- Connection settings ----
 HOST = "192.168.62.1"
@@ -19,8 +35,17 @@ PASS = "terraform"
 PORT = 8728
 
 TF_OUT = "routing_import.tf"
+IMPORT_TF_OUT = "routing_imports.tf"
 IMPORT_OUT = "routing_imports.sh"
 
+# ---- Properties written to Terraform (and requested from the router), rendered as typed HCL ----
+TABLE_KEYS = ["name", "fib", "comment"]
+RULE_KEYS = ["action", "src-address", "dst-address", "table", "interface", "disabled", "comment"]
+ROUTE_KEYS = ["dst-address", "gateway", "distance", "routing-table", "disabled", "comment"]
+TABLE = Template("routeros_routing_table", TABLE_KEYS, typed=True, skip={None})
+RULE = Template("routeros_routing_rule", RULE_KEYS, typed=True, skip={None})
+ROUTE = Template("routeros_ip_route", ROUTE_KEYS, typed=True, skip={None})
+
 
 def connect_mikrotik(host, user, password, port):
     """Connect with fallback to API-SSL (8729)."""
@@ -39,7 +64,7 @@ def sanitize_name(s):
     """Terraform-safe resource names (letters, digits, underscore). Ensure not starting with digit."""
     if s is None:
         s = "unnamed"
-    s = re.sub(r"[^A-Za-z0-9_]", "_", str(s))
+    s = sanitize(str(s))
     if not s:
         s = "unnamed"
     if s[0].isdigit():
@@ -47,43 +72,14 @@ def sanitize_name(s):
     return s
 
 
-def fmt_value(v):
-    """Format a RouterOS value to HCL (string quoted unless boolean/number)."""
-    if v is None:
-        return None
-    # booleans (RouterOS often returns "true"/"false" as strings)
-    if isinstance(v, bool):
-        return "true" if v else "false"
-    s = str(v)
-    if s.lower() in ("true", "false"):
-        return s.lower()
-    # try integer
-    try:
-        if "." in s:
-            float(s)
-            return s
-        else:
-            int(s)
-            return s
-    except Exception:
-        # quote and escape
-        escaped = s.replace("\\", "\\\\").replace('"', '\\"')
-        return f'"{escaped}"'
-
-
 def build_routing_tf_and_imports(api):
-    tf_blocks = []
-    import_cmds = []
+    """Yield (block, address, id, tf_file, section) for every routing table, rule and static route."""
     seen_names = set()
 
-    # ---- routing tables (skip dynamic) ----
-    print("📥 Fetching /routing/table ...")
-    tables = list(api(cmd="/routing/table/print"))
-    print(f"✅ Found {len(tables)} routing table entries (including dynamic)")
+    # ---- routing tables (router skips dynamic ones like "main" that are not user-created) ----
+    print("📥 Fetching /routing/table ... (excluding dynamic)")
+    tables = iter_select(api, "/routing/table", [".id", *TABLE_KEYS], exclude_dynamic=True)
     for t in tables:
-        # Skip dynamic tables like "main" that are not user-created
-        if t.get("dynamic") in ("true", True):
-            continue
         raw_name = t.get("name", "unnamed")
         name = sanitize_name(raw_name)
         if name in seen_names:
@@ -91,23 +87,12 @@ def build_routing_tf_and_imports(api):
             name = f"{name}_{suffix}"
         seen_names.add(name)
 
-        lines = [f'resource "routeros_routing_table" "{name}" {{']
-        # name is a string
-        lines.append(f'  name = {fmt_value(raw_name)}')
-        if "fib" in t:
-            lines.append(f'  fib  = {fmt_value(t.get("fib"))}')
-        if "comment" in t:
-            lines.append(f'  comment = {fmt_value(t.get("comment"))}')
-        lines.append("}")
-        tf_blocks.append("\n".join(lines))
-
-        if ".id" in t:
-            import_cmds.append(f"terraform import routeros_routing_table.{name} '{t['.id']}'")
+        block = TABLE.render(name, t if "name" in t else {**t, "name": raw_name})
+        yield block, f"routeros_routing_table.{name}", t.get(".id"), None, "tables"
 
     # ---- routing rules ----
     print("📥 Fetching /routing/rule ...")
-    rules = list(api(cmd="/routing/rule/print"))
-    print(f"✅ Found {len(rules)} routing rules")
+    rules = iter_select(api, "/routing/rule", [".id", *RULE_KEYS])
     for r in rules:
         rid = r.get(".id", "").replace("*", "")
         # prefer comment for stable names, fallback to id
@@ -117,23 +102,14 @@ def build_routing_tf_and_imports(api):
             name = f"{name}_{rid}"
         seen_names.add(name)
 
-        lines = [f'resource "routeros_routing_rule" "{name}" {{']
         # include commonly used attributes if present
-        for key in ("action", "src-address", "dst-address", "table", "interface", "disabled", "comment"):
-            if key in r:
-                lines.append(f'  {key.replace("-", "_")} = {fmt_value(r.get(key))}')
-        lines.append("}")
-        tf_blocks.append("\n".join(lines))
-
-        if ".id" in r:
-            import_cmds.append(f"terraform import routeros_routing_rule.{name} '{r['.id']}'")
+        block = RULE.render(name, r)
+        yield block, f"routeros_routing_rule.{name}", r.get(".id"), None, "rules"
 
     # ---- static IP routes ----
     print("📥 Fetching /ip/route ... (excluding dynamic)")
-    routes_raw = list(api(cmd="/ip/route/print"))
-    # filter dynamic (RouterOS may return dynamic as "true" string or boolean)
-    routes = [rr for rr in routes_raw if not (rr.get("dynamic") in ("true", True))]
-    print(f"✅ Found {len(routes)} static routes (filtered from {len(routes_raw)})")
+    # the router filters dynamic routes, so a full BGP table never crosses the wire
+    routes = iter_select(api, "/ip/route", [".id", *ROUTE_KEYS], exclude_dynamic=True)
     for r in routes:
         rid = r.get(".id", "").replace("*", "")
         dst = r.get("dst-address") or ""
@@ -144,69 +120,69 @@ def build_routing_tf_and_imports(api):
             name = f"{name}_{rid}"
         seen_names.add(name)
 
-        lines = [f'resource "routeros_ip_route" "{name}" {{']
-        if "dst-address" in r:
-            lines.append(f'  dst_address = {fmt_value(r.get("dst-address"))}')
-        if "gateway" in r:
-            lines.append(f'  gateway = {fmt_value(r.get("gateway"))}')
-        if "distance" in r:
-            lines.append(f'  distance = {fmt_value(r.get("distance"))}')
-        if "routing-table" in r:
-            lines.append(f'  routing_table = {fmt_value(r.get("routing-table"))}')
-        if "disabled" in r:
-            lines.append(f'  disabled = {fmt_value(r.get("disabled"))}')
-        if "comment" in r:
-            lines.append(f'  comment = {fmt_value(r.get("comment"))}')
-        lines.append("}")
-        tf_blocks.append("\n".join(lines))
-
-        if ".id" in r:
-            import_cmds.append(f"terraform import routeros_ip_route.{name} '{r['.id']}'")
-
-    return tf_blocks, import_cmds
-
-
-def write_outputs(tf_blocks, import_cmds):
-    # write tf
-    with open(TF_OUT, "w") as f:
-        f.write("# Generated by import_routes_with_imports.py\n\n")
-        f.write("\n\n".join(tf_blocks))
-        f.write("\n")
-    print(f"✅ Terraform resources written to {TF_OUT}")
-
-    # write import script
-    with open(IMPORT_OUT, "w") as f:
-        f.write("#!/bin/bash\nset -e\n\n")
-        for cmd in import_cmds:
-            f.write(cmd + "\n")
-    os.chmod(IMPORT_OUT, 0o755)
-    print(f"✅ Terraform import script written to {IMPORT_OUT}")
-
-
-def maybe_execute_imports(import_cmds):
-    """Run terraform import commands if terraform exists in PATH."""
-    if not import_cmds:
+        block = ROUTE.row(name, r)
+        # with --shard (and --for-each), static routes are split by routing table
+        table = r.get("routing-table") or "main"
+        yield block, f"routeros_ip_route.{name}", r.get(".id"), None, f"routes_{table}"
+
+
+def export_router(api, out_dir=".", import_script=False):
+    """Stream the routing resources of one router into out_dir."""
+    with TfWriter(
+        out_dir,
+        TF_OUT,
+        IMPORT_TF_OUT,
+        header="# Generated by import_routes_with_imports.py",
+        import_script=import_script and IMPORT_OUT,
+    ) as writer:
+        writer.write_all(build_routing_tf_and_imports(api))
+    return writer.imported
+
+
+def maybe_execute_imports(imported, import_script=False):
+    """Run one terraform plan over the import blocks (or the legacy import script) if terraform exists in PATH."""
+    if not imported:
         print("ℹ️ No import commands to run.")
         return
-    terraform_path = shutil.which("terraform")
-    if not terraform_path:
-        print("⚠️ terraform not found in PATH — not executing imports. To run manually:")
-        print(f"    ./{IMPORT_OUT}")
-        return
-
-    print(f"🚀 Executing {len(import_cmds)} terraform import commands (terraform at {terraform_path})")
-    for cmd in import_cmds:
-        print("🔗", cmd)
-        # run via shell so we keep quoting as written
-        subprocess.run(cmd, shell=True)
+    if import_script:
+        run_import_script(os.path.join(".", IMPORT_OUT))
+    else:
+        run_terraform_plan()
 
 
 def main():
-    api = connect_mikrotik(HOST, USER, PASS, PORT)
-    tf_blocks, import_cmds = build_routing_tf_and_imports(api)
-    write_outputs(tf_blocks, import_cmds)
-    maybe_execute_imports(import_cmds)
+    parser = argparse.ArgumentParser(description="Export routing tables, rules and static routes to Terraform.")
+    add_fleet_arguments(parser)
+    add_backend_arguments(parser)
+    add_import_arguments(parser)
+    add_output_arguments(parser)
+    add_drift_arguments(parser)
+    add_snapshot_arguments(parser)
+    add_metrics_arguments(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    configure_backend(args)
+    configure_imports(args)
+    configure_output(args)
+    configure_drift(args)
+    configure_snapshot(args)
+    configure_metrics(args)
+    configure_profile(args)
+    export = partial(export_router, import_script=args.import_script)
+
+    if args.inventory:
+        routers = load_inventory(args.inventory, USER, PASS, PORT)
+        failures = run_fleet(routers, connect_mikrotik, export, args.workers, args.out_dir, args.skip_unchanged)
+        sys.exit(1 if failures else 0)
+
+    connect_router = with_snapshots(partial(connect_mikrotik, HOST, USER, PASS, PORT))
+    with profiled():
+        with stage("connect", host=HOST):
+            api = RouterSession(connect_router())
+        imported = export(api)
+    maybe_execute_imports(imported, args.import_script)
     print("🎉 Done.")
+    write_report()
 
 
 if __name__ == "__main__":
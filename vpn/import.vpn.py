@@ -1,25 +1,56 @@
 #!/usr/bin/env python3
+import argparse
+from functools import partial
 import os
-import re
 import sys
-import subprocess
 import socket
 from librouteros import connect
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.aioclient import add_backend_arguments, configure_backend  # noqa: E402
+from common.drift import add_drift_arguments, configure_drift  # noqa: E402
+from common.fleet import add_fleet_arguments, load_inventory, run_fleet  # noqa: E402
+from common.hcl import FALSY, Template, sanitize  # noqa: E402
+from common.metrics import add_metrics_arguments, configure_metrics, stage, write_report  # noqa: E402
+from common.profiling import add_profile_arguments, configure_profile, profiled  # noqa: E402
+from common.query import select  # noqa: E402
+from common.refs import INTERFACE, SymbolTable  # noqa: E402
+from common.session import RouterSession, prefetch  # noqa: E402
+from common.snapshot import add_snapshot_arguments, configure_snapshot, with_snapshots  # noqa: E402
+from common.tfimport import add_import_arguments, configure_imports, run_import_script, run_terraform_plan  # noqa: E402
+from common.writer import TfWriter, add_output_arguments, configure_output  # noqa: E402
+
 HOST = "192.168.62.1"
 USER = "terraform"
 PASS = "terraform"
 PORT = 8728
 
 TF_FILE = "vpn.tf"
+IMPORT_TF_FILE = "vpn_imports.tf"
 IMPORT_FILE = "vpn_imports.sh"
 
+# Properties requested from the router for the resources with a fixed field list
+SSTP_CLIENT_PROPS = [".id", "name", "connect-to", "user", "password", "certificate",
+                     "verify-server-certificate", "add-default-route", "profile", "comment"]
+WG_PEER_PROPS = [".id", "comment", "public-key", "allowed-address", "endpoint-address",
+                 "endpoint-port", "interface", "persistent-keepalive"]
+
+# Blocks; empty and false values are left out
+SSTP_SERVER = Template("routeros_interface_sstp_server",
+                       ["enabled", "certificate", "authentication", "default-profile", "port", "tls-version"],
+                       skip=FALSY)
+SSTP_CLIENT = Template("routeros_interface_sstp_client", SSTP_CLIENT_PROPS[2:], skip=FALSY)
+WIREGUARD = Template("routeros_interface_wireguard", ["listen-port", "private-key", "mtu", "comment"], skip=FALSY)
+WIREGUARD_PEER = Template("routeros_interface_wireguard_peer", [*WG_PEER_PROPS[2:], "comment"], skip=FALSY)
+# A peer's interface becomes a reference to the WireGuard interface exported here
+PEER_LINKS = {"interface": INTERFACE}
+
 
-def connect_mikrotik():
+def connect_mikrotik(host=HOST, user=USER, password=PASS, port=PORT):
     """Connect to MikroTik RouterOS."""
     try:
-        api = connect(username=USER, password=PASS, host=HOST, port=PORT, timeout=10)
-        print(f"✅ Connected to {HOST}:{PORT}")
+        api = connect(username=user, password=password, host=host, port=port, timeout=10)
+        print(f"✅ Connected to {host}:{port}")
         return api
     except (socket.timeout, OSError) as e:
         print(f"❌ Connection failed: {e}")
@@ -28,51 +59,37 @@ def connect_mikrotik():
 
 def sanitize_name(name):
     """Make Terraform-safe resource names."""
-    return re.sub(r"[^a-zA-Z0-9_]", "_", name.lower().strip()) or "entry"
+    return sanitize(name.lower().strip()) or "entry"
 
 
-def make_tf_block(resource, attrs):
-    """Generate Terraform block text."""
-    lines = [f'resource "{resource}" "{attrs["name"]}" {{']
-    for k, v in attrs["fields"].items():
-        if v:
-            lines.append(f'  {k} = "{v}"')
-    lines.append("}\n")
-    return "\n".join(lines)
+def fetch(api, path, exclude_dynamic=True, proplist=None):
+    """Fetch MikroTik path items; dynamic ones are filtered by the router."""
+    return select(api, path, proplist, exclude_dynamic)
 
 
-def fetch(api, path, exclude_dynamic=True):
-    """Fetch MikroTik path items."""
-    rules = []
-    for item in api.path(path):
-        if exclude_dynamic and item.get("dynamic") == "true":
-            continue
-        rules.append(item)
-    return rules
-
-
-def main():
-    api = connect_mikrotik()
-    tf_blocks = []
-    import_cmds = []
+def import_vpn(api):
+    """Yield (block, address, id) for the SSTP, WireGuard and IPsec resources."""
+    symbols = SymbolTable()
+    # --- IPsec sections (fetched together with the SSTP and WireGuard paths) ---
+    ipsec_sections = {
+        "ip/ipsec/profile": "routeros_ip_ipsec_profile",
+        "ip/ipsec/proposal": "routeros_ip_ipsec_proposal",
+        "ip/ipsec/peer": "routeros_ip_ipsec_peer",
+        "ip/ipsec/policy": "routeros_ip_ipsec_policy",
+        "ip/ipsec/identity": "routeros_ip_ipsec_identity",
+    }
+    prefetch(api, [("interface/sstp-client", SSTP_CLIENT_PROPS), "interface/wireguard",
+                   ("interface/wireguard/peers", WG_PEER_PROPS), *ipsec_sections], exclude_dynamic=True)
 
     # --- SSTP Server ---
     print("📥 Fetching SSTP server config...")
     try:
-        sstp_server = api.path("interface/sstp-server/server").get()
+        sstp_server = fetch(api, "interface/sstp-server/server", exclude_dynamic=False)
         if sstp_server:
             sstp = sstp_server[0]
             name = "sstp_server"
-            fields = {
-                "enabled": sstp.get("enabled"),
-                "certificate": sstp.get("certificate"),
-                "authentication": sstp.get("authentication"),
-                "default_profile": sstp.get("default-profile"),
-                "port": sstp.get("port"),
-                "tls_version": sstp.get("tls-version"),
-            }
-            tf_blocks.append(make_tf_block("routeros_interface_sstp_server", {"name": name, "fields": fields}))
-            import_cmds.append(f"terraform import routeros_interface_sstp_server.{name} '.'")
+            block = SSTP_SERVER.render(name, sstp)
+            yield block, f"routeros_interface_sstp_server.{name}", "."
             print("✅ SSTP server found.")
         else:
             print("⚠️ No SSTP server found.")
@@ -81,99 +98,100 @@ def main():
 
     # --- SSTP Clients ---
     print("📥 Fetching SSTP clients...")
-    sstp_clients = fetch(api, "interface/sstp-client")
+    sstp_clients = fetch(api, "interface/sstp-client", proplist=SSTP_CLIENT_PROPS)
     for c in sstp_clients:
         name = sanitize_name(c.get("name") or c.get(".id"))
-        fields = {
-            "connect_to": c.get("connect-to"),
-            "user": c.get("user"),
-            "password": c.get("password"),
-            "certificate": c.get("certificate"),
-            "verify_server_certificate": c.get("verify-server-certificate"),
-            "add_default_route": c.get("add-default-route"),
-            "profile": c.get("profile"),
-            "comment": c.get("comment"),
-        }
-        tf_blocks.append(make_tf_block("routeros_interface_sstp_client", {"name": name, "fields": fields}))
-        import_cmds.append(f"terraform import routeros_interface_sstp_client.{name} '{c['.id']}'")
+        block = SSTP_CLIENT.render(name, c)
+        yield block, f"routeros_interface_sstp_client.{name}", c[".id"]
     print(f"✅ Found {len(sstp_clients)} SSTP clients")
 
     # --- WireGuard Interfaces (server/client unified) ---
     print("📥 Fetching WireGuard interfaces...")
+    # Read whole, as the interfaces collector reads it, so import_all prints it once
     wg_intfs = fetch(api, "interface/wireguard")
     for wg in wg_intfs:
         name = sanitize_name(wg.get("name") or wg.get(".id", "wg"))
-        fields = {
-            "listen_port": wg.get("listen-port"),
-            "private_key": wg.get("private-key"),
-            "mtu": wg.get("mtu"),
-            "comment": wg.get("comment"),
-        }
-        tf_blocks.append(make_tf_block("routeros_interface_wireguard", {"name": name, "fields": fields}))
-        import_cmds.append(f"terraform import routeros_interface_wireguard.{name} '{wg['.id']}'")
+        block = WIREGUARD.render(name, wg)
+        address = f"routeros_interface_wireguard.{name}"
+        symbols.define(INTERFACE, wg.get("name"), address)
+        yield block, address, wg[".id"]
     print(f"✅ Found {len(wg_intfs)} WireGuard interfaces")
 
     # --- WireGuard Peers ---
     print("📥 Fetching WireGuard peers...")
-    wg_peers = fetch(api, "interface/wireguard/peers")
+    wg_peers = fetch(api, "interface/wireguard/peers", proplist=WG_PEER_PROPS)
     for peer in wg_peers:
         name = sanitize_name(peer.get("comment") or peer.get(".id", "peer"))
-        fields = {
-            "public_key": peer.get("public-key"),
-            "allowed_address": peer.get("allowed-address"),
-            "endpoint_address": peer.get("endpoint-address"),
-            "endpoint_port": peer.get("endpoint-port"),
-            "interface": peer.get("interface"),
-            "persistent_keepalive": peer.get("persistent-keepalive"),
-            "comment": peer.get("comment"),
-        }
-        tf_blocks.append(make_tf_block("routeros_interface_wireguard_peer", {"name": name, "fields": fields}))
-        import_cmds.append(f"terraform import routeros_interface_wireguard_peer.{name} '{peer['.id']}'")
+        address = f"routeros_interface_wireguard_peer.{name}"
+        block = WIREGUARD_PEER.render(name, symbols.link(peer, PEER_LINKS, address))
+        yield block, address, peer[".id"]
     print(f"✅ Found {len(wg_peers)} WireGuard peers")
 
     # --- IPsec Configurations ---
-    ipsec_sections = {
-        "ip/ipsec/profile": "routeros_ip_ipsec_profile",
-        "ip/ipsec/proposal": "routeros_ip_ipsec_proposal",
-        "ip/ipsec/peer": "routeros_ip_ipsec_peer",
-        "ip/ipsec/policy": "routeros_ip_ipsec_policy",
-        "ip/ipsec/identity": "routeros_ip_ipsec_identity",
-    }
-
     for path, tf_type in ipsec_sections.items():
         print(f"📥 Fetching {path}...")
         entries = fetch(api, path)
+        template = Template(tf_type, skip=FALSY)
         for item in entries:
             name = sanitize_name(item.get("name") or item.get(".id", "entry"))
-            fields = {k.replace("-", "_"): v for k, v in item.items() if not k.startswith(".")}
-            tf_blocks.append(make_tf_block(tf_type, {"name": name, "fields": fields}))
-            import_cmds.append(f"terraform import {tf_type}.{name} '{item['.id']}'")
+            block = template.render(name, item)
+            yield block, f"{tf_type}.{name}", item[".id"]
         print(f"✅ Found {len(entries)} entries in {path}")
 
-    # --- Write Files ---
-    with open(TF_FILE, "w") as f:
-        f.write("# Generated by import_vpn_full.py\n\n")
-        f.write("\n".join(tf_blocks))
-    print(f"✅ Terraform config written to {TF_FILE}")
-
-    with open(IMPORT_FILE, "w") as f:
-        f.write("#!/bin/bash\n# Generated by import_vpn_full.py\n\n")
-        for cmd in import_cmds:
-            f.write(cmd + "\n")
-    os.chmod(IMPORT_FILE, 0o755)
-    print(f"✅ Import commands written to {IMPORT_FILE}")
-
-    # Execute imports (optional)
-    print("🚀 Running terraform import commands...\n")
-    for cmd in import_cmds:
-        print("🔗", cmd)
-        try:
-            subprocess.run(cmd.split(), check=False)
-        except FileNotFoundError:
-            print("⚠️ Terraform not found. Skipping execution.")
-
-    print("\n🎉 All VPN (SSTP, WireGuard, IPsec) server/client resources exported and imported!")
 
+def export_router(api, out_dir=".", import_script=False):
+    """Stream the VPN resources of one router into out_dir."""
+    with TfWriter(
+        out_dir,
+        TF_FILE,
+        IMPORT_TF_FILE,
+        header="# Generated by import_vpn_full.py",
+        import_script=import_script and IMPORT_FILE,
+    ) as writer:
+        writer.write_all(import_vpn(api))
+    return writer.imported
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export SSTP, WireGuard and IPsec configuration to Terraform.")
+    add_fleet_arguments(parser)
+    add_backend_arguments(parser)
+    add_import_arguments(parser)
+    add_output_arguments(parser)
+    add_drift_arguments(parser)
+    add_snapshot_arguments(parser)
+    add_metrics_arguments(parser)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    configure_backend(args)
+    configure_imports(args)
+    configure_output(args)
+    configure_drift(args)
+    configure_snapshot(args)
+    configure_metrics(args)
+    configure_profile(args)
+    export = partial(export_router, import_script=args.import_script)
+
+    if args.inventory:
+        routers = load_inventory(args.inventory, USER, PASS, PORT)
+        failures = run_fleet(routers, connect_mikrotik, export, args.workers, args.out_dir, args.skip_unchanged)
+        sys.exit(1 if failures else 0)
+
+    connect_router = with_snapshots(connect_mikrotik)
+    with profiled():
+        with stage("connect", host=HOST):
+            api = RouterSession(connect_router())
+        export(api)
+
+    # Plan the imports (or run the legacy import script) if terraform is available
+    if args.import_script:
+        run_import_script(IMPORT_FILE)
+    else:
+        run_terraform_plan()
+
+    print("\n🎉 All VPN (SSTP, WireGuard, IPsec) server/client resources exported!")
+
+    write_report()
 
 if __name__ == "__main__":
     main()